@@ -4,13 +4,13 @@ Endpoints para integração web/mobile futura
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
-from app.db.session import get_db
-from app.db.models import Appointment, AppointmentStatus, User, UserRole
-from app.core.appointment_service import AppointmentService
+from app.db.session import get_async_db
+from app.core.appointment_service import SlotUnavailableError
+from app.core.async_appointment_service import AsyncAppointmentService
 from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/api/appointments", tags=["Appointments"])
@@ -41,6 +41,14 @@ class AvailableSlot(BaseModel):
     datetime: datetime
     is_peak: bool
 
+class ProfessionalSlot(AvailableSlot):
+    professional_id: int
+    professional_name: str
+
+class DayAvailability(BaseModel):
+    date: str
+    slots: List[AvailableSlot]
+
 class AppointmentCancel(BaseModel):
     reason: str
 
@@ -49,7 +57,7 @@ class AppointmentCancel(BaseModel):
 @router.post("/", response_model=AppointmentResponse, status_code=status.HTTP_201_CREATED)
 async def create_appointment(
     appointment_data: AppointmentCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cria novo agendamento
@@ -59,11 +67,13 @@ async def create_appointment(
     - **service_id**: ID do serviço
     - **scheduled_date**: Data e hora do agendamento
     - **notes**: Observações (opcional)
+    
+    Retorna 409 se o horário já estiver ocupado.
     """
-    service = AppointmentService(db)
+    service = AsyncAppointmentService(db)
     
     try:
-        appointment = service.create_appointment(
+        appointment = await service.create_appointment(
             client_id=appointment_data.client_id,
             professional_id=appointment_data.professional_id,
             service_id=appointment_data.service_id,
@@ -78,7 +88,14 @@ async def create_appointment(
             service_name=appointment.service.name,
             scheduled_date=appointment.scheduled_date,
             status=appointment.status.value,
-            price=appointment.service.price
+            price=appointment.service_price
+        )
+    except SlotUnavailableError as e:
+        # Conflito de horário: o cliente pode tentar outro horário
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Retry-After": "1"}
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -88,7 +105,8 @@ async def get_available_slots(
     professional_id: int,
     date: str,  # YYYY-MM-DD
     service_id: int,
-    db: Session = Depends(get_db)
+    slot_minutes: int | None = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Retorna horários disponíveis para agendamento
@@ -96,22 +114,100 @@ async def get_available_slots(
     - **professional_id**: ID do profissional
     - **date**: Data desejada (YYYY-MM-DD)
     - **service_id**: ID do serviço
+    - **slot_minutes**: Granularidade dos horários em minutos (opcional)
     """
     try:
         date_obj = datetime.strptime(date, "%Y-%m-%d")
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de data inválido. Use YYYY-MM-DD")
     
-    service = AppointmentService(db)
-    slots = service.get_available_slots(professional_id, date_obj, service_id)
+    if slot_minutes is not None and slot_minutes <= 0:
+        raise HTTPException(status_code=400, detail="Granularidade deve ser positiva")
+    
+    service = AsyncAppointmentService(db)
+    slots = await service.get_available_slots(professional_id, date_obj, service_id, slot_minutes)
     
     return slots
 
+@router.get("/available-slots/range", response_model=List[DayAvailability])
+async def get_available_slots_range(
+    professional_id: int,
+    start_date: str,  # YYYY-MM-DD
+    service_id: int,
+    days: int = 7,
+    slot_minutes: int | None = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retorna horários disponíveis dia a dia em um período
+    
+    - **professional_id**: ID do profissional
+    - **start_date**: Data inicial (YYYY-MM-DD)
+    - **service_id**: ID do serviço
+    - **days**: Quantidade de dias a partir da data inicial (1 a 31)
+    - **slot_minutes**: Granularidade dos horários em minutos (opcional)
+    """
+    try:
+        date_obj = datetime.strptime(start_date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de data inválido. Use YYYY-MM-DD")
+    
+    if not 1 <= days <= 31:
+        raise HTTPException(status_code=400, detail="Período deve ter entre 1 e 31 dias")
+    
+    if slot_minutes is not None and slot_minutes <= 0:
+        raise HTTPException(status_code=400, detail="Granularidade deve ser positiva")
+    
+    service = AsyncAppointmentService(db)
+    slots_by_day = await service.get_available_slots_range(
+        professional_id, date_obj, days, service_id, slot_minutes
+    )
+    
+    return [
+        DayAvailability(date=day.strftime("%Y-%m-%d"), slots=slots)
+        for day, slots in slots_by_day.items()
+    ]
+
+@router.get("/first-available", response_model=List[ProfessionalSlot])
+async def get_first_available_slots(
+    service_id: int,
+    start_date: str | None = None,  # YYYY-MM-DD
+    days: int = 7,
+    limit: int = 5,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retorna os primeiros horários livres com qualquer profissional do serviço
+    
+    - **service_id**: ID do serviço
+    - **start_date**: Data inicial (opcional, default: hoje)
+    - **days**: Tamanho da janela de busca em dias (1 a 31)
+    - **limit**: Quantidade máxima de horários (1 a 50)
+    """
+    if start_date:
+        try:
+            window_start = datetime.strptime(start_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Formato de data inválido. Use YYYY-MM-DD")
+    else:
+        window_start = datetime.now()
+    
+    if not 1 <= days <= 31:
+        raise HTTPException(status_code=400, detail="Período deve ter entre 1 e 31 dias")
+    
+    if not 1 <= limit <= 50:
+        raise HTTPException(status_code=400, detail="Limite deve estar entre 1 e 50")
+    
+    window_end = window_start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=days)
+    
+    service = AsyncAppointmentService(db)
+    return await service.find_earliest_slots(service_id, window_start, window_end, limit)
+
 @router.get("/client/{client_id}", response_model=List[AppointmentResponse])
 async def get_client_appointments(
     client_id: int,
     include_past: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Lista agendamentos de um cliente
@@ -119,8 +215,8 @@ async def get_client_appointments(
     - **client_id**: ID do cliente
     - **include_past**: Incluir agendamentos passados (default: False)
     """
-    service = AppointmentService(db)
-    appointments = service.get_client_appointments(client_id, include_past)
+    service = AsyncAppointmentService(db)
+    appointments = await service.get_client_appointments(client_id, include_past)
     
     return [
         AppointmentResponse(
@@ -130,7 +226,7 @@ async def get_client_appointments(
             service_name=apt.service.name,
             scheduled_date=apt.scheduled_date,
             status=apt.status.value,
-            price=apt.service.price
+            price=apt.service_price
         )
         for apt in appointments
     ]
@@ -139,7 +235,7 @@ async def get_client_appointments(
 async def get_professional_appointments(
     professional_id: int,
     date: str | None = None,  # YYYY-MM-DD
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Lista agendamentos de um profissional
@@ -154,8 +250,8 @@ async def get_professional_appointments(
         except ValueError:
             raise HTTPException(status_code=400, detail="Formato de data inválido")
     
-    service = AppointmentService(db)
-    appointments = service.get_professional_appointments(professional_id, date_obj)
+    service = AsyncAppointmentService(db)
+    appointments = await service.get_professional_appointments(professional_id, date_obj)
     
     return [
         AppointmentResponse(
@@ -165,7 +261,7 @@ async def get_professional_appointments(
             service_name=apt.service.name,
             scheduled_date=apt.scheduled_date,
             status=apt.status.value,
-            price=apt.service.price
+            price=apt.service_price
         )
         for apt in appointments
     ]
@@ -174,7 +270,7 @@ async def get_professional_appointments(
 async def cancel_appointment(
     appointment_id: int,
     cancel_data: AppointmentCancel,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cancela um agendamento
@@ -182,10 +278,10 @@ async def cancel_appointment(
     - **appointment_id**: ID do agendamento
     - **reason**: Motivo do cancelamento
     """
-    service = AppointmentService(db)
+    service = AsyncAppointmentService(db)
     
     try:
-        appointment = service.cancel_appointment(
+        appointment = await service.cancel_appointment(
             appointment_id=appointment_id,
             reason=cancel_data.reason,
             cancelled_by_client=True
@@ -198,7 +294,7 @@ async def cancel_appointment(
             service_name=appointment.service.name,
             scheduled_date=appointment.scheduled_date,
             status=appointment.status.value,
-            price=appointment.service.price
+            price=appointment.service_price
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -206,17 +302,17 @@ async def cancel_appointment(
 @router.patch("/{appointment_id}/complete", response_model=AppointmentResponse)
 async def complete_appointment(
     appointment_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Marca agendamento como completado
     
     - **appointment_id**: ID do agendamento
     """
-    service = AppointmentService(db)
+    service = AsyncAppointmentService(db)
     
     try:
-        appointment = service.complete_appointment(appointment_id)
+        appointment = await service.complete_appointment(appointment_id)
         
         return AppointmentResponse(
             id=appointment.id,
@@ -225,7 +321,7 @@ async def complete_appointment(
             service_name=appointment.service.name,
             scheduled_date=appointment.scheduled_date,
             status=appointment.status.value,
-            price=appointment.service.price
+            price=appointment.service_price
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -233,7 +329,7 @@ async def complete_appointment(
 @router.patch("/{appointment_id}/no-show", response_model=AppointmentResponse)
 async def mark_no_show(
     appointment_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Marca cliente como faltoso (no-show)
@@ -242,10 +338,10 @@ async def mark_no_show(
     
     Isso penaliza o nível de confiabilidade do cliente.
     """
-    service = AppointmentService(db)
+    service = AsyncAppointmentService(db)
     
     try:
-        appointment = service.mark_no_show(appointment_id)
+        appointment = await service.mark_no_show(appointment_id)
         
         return AppointmentResponse(
             id=appointment.id,
@@ -254,7 +350,7 @@ async def mark_no_show(
             service_name=appointment.service.name,
             scheduled_date=appointment.scheduled_date,
             status=appointment.status.value,
-            price=appointment.service.price
+            price=appointment.service_price
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -262,10 +358,10 @@ async def mark_no_show(
 @router.get("/statistics/daily")
 async def get_daily_statistics(
     date: str | None = None,  # YYYY-MM-DD
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Retorna estatísticas do dia
+    Retorna estatísticas do dia, calculadas ao vivo sobre os agendamentos
     
     - **date**: Data (opcional, default: hoje)
     """
@@ -277,33 +373,102 @@ async def get_daily_statistics(
     else:
         target_date = datetime.now()
     
-    start_of_day = target_date.replace(hour=0, minute=0, second=0)
-    end_of_day = target_date.replace(hour=23, minute=59, second=59)
-    
-    # Busca agendamentos do dia
-    appointments = db.query(Appointment).filter(
-        Appointment.scheduled_date >= start_of_day,
-        Appointment.scheduled_date <= end_of_day
-    ).all()
-    
-    total = len(appointments)
-    completed = len([a for a in appointments if a.status == AppointmentStatus.COMPLETED])
-    cancelled = len([a for a in appointments if a.status == AppointmentStatus.CANCELLED])
-    no_shows = len([a for a in appointments if a.status == AppointmentStatus.NO_SHOW])
-    scheduled = len([a for a in appointments if a.status == AppointmentStatus.SCHEDULED])
-    
-    revenue = sum([
-        a.service.price for a in appointments 
-        if a.status == AppointmentStatus.COMPLETED
-    ])
-    
-    return {
-        "date": target_date.strftime("%Y-%m-%d"),
-        "total_appointments": total,
-        "completed": completed,
-        "cancelled": cancelled,
-        "no_shows": no_shows,
-        "scheduled": scheduled,
-        "revenue": revenue,
-        "completion_rate": (completed / total * 100) if total > 0 else 0
-    }
\ No newline at end of file
+    service = AsyncAppointmentService(db)
+    return await service.get_daily_statistics(target_date)
+
+
+@router.get("/statistics")
+async def get_statistics(
+    start_date: str,  # YYYY-MM-DD
+    end_date: str,  # YYYY-MM-DD (inclusive)
+    professional_id: int | None = None,
+    by_professional: bool = False,
+    source: str = "rollup",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retorna estatísticas de um período
+    
+    Por padrão lidas do rollup diário, que só cobre o histórico anterior a
+    ele depois de scripts/rebuild_rollups.py. Com source=live, calculadas
+    ao vivo sobre os agendamentos, como em /statistics/daily (mais lento
+    em períodos longos).
+    
+    - **start_date**: Data inicial (YYYY-MM-DD)
+    - **end_date**: Data final, inclusive (YYYY-MM-DD)
+    - **professional_id**: Filtra por profissional (opcional)
+    - **by_professional**: Inclui quebra por profissional (default: False)
+    - **source**: "rollup" (default) ou "live"
+    """
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de data inválido")
+    
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Data final anterior à inicial")
+    
+    if source not in ("rollup", "live"):
+        raise HTTPException(status_code=400, detail='Fonte deve ser "rollup" ou "live"')
+    
+    service = AsyncAppointmentService(db)
+    if source == "live":
+        stats = await service.get_statistics(
+            datetime.combine(start, time.min),
+            datetime.combine(end, time.min),
+            professional_id,
+            by_professional
+        )
+    else:
+        stats = await service.get_period_statistics(start, end, professional_id, by_professional)
+    
+    return {"start_date": start_date, "end_date": end_date, **stats}
+
+
+@router.post("/financial/close-day")
+async def close_day(
+    date: str,  # YYYY-MM-DD
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Fecha o dia: gera os lançamentos dos atendimentos completados sem lançamento
+    
+    Idempotente: rodar de novo para o mesmo dia não duplica lançamentos.
+    """
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de data inválido")
+    
+    service = AsyncAppointmentService(db)
+    created = await service.close_day(day)
+    
+    return {"date": date, "records_created": created}
+
+
+@router.get("/financial/payouts")
+async def get_payouts(
+    start_date: str,  # YYYY-MM-DD
+    end_date: str,  # YYYY-MM-DD (inclusive)
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retorna o repasse de comissões por profissional no período
+    
+    - **start_date**: Data inicial (YYYY-MM-DD)
+    - **end_date**: Data final, inclusive (YYYY-MM-DD)
+    """
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de data inválido")
+    
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Data final anterior à inicial")
+    
+    service = AsyncAppointmentService(db)
+    payouts = await service.get_payouts(start, end)
+    
+    return {"start_date": start_date, "end_date": end_date, "payouts": payouts}
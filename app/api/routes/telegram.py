@@ -0,0 +1,43 @@
+"""
+Webhook do Telegram
+Recebe os updates do bot quando TELEGRAM_WEBHOOK_URL está configurada
+"""
+
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException, Request, status
+
+from app.config import settings
+from app.telegram.bot import BotSaturatedError
+
+router = APIRouter(tags=["Telegram"])
+
+
+@router.post(settings.TELEGRAM_WEBHOOK_PATH, status_code=status.HTTP_200_OK)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(default=None)
+):
+    """Entrega um update do Telegram ao bot desta instância"""
+    
+    # Sem segredo configurado nenhuma chamada é aceita
+    if not settings.TELEGRAM_WEBHOOK_SECRET or not hmac.compare_digest(
+        x_telegram_bot_api_secret_token or "", settings.TELEGRAM_WEBHOOK_SECRET
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token do webhook inválido")
+    
+    bot = getattr(request.app.state, "telegram_bot", None)
+    if bot is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Bot em modo polling")
+    
+    try:
+        await bot.process_update(await request.json())
+    except BotSaturatedError:
+        # Telegram reenvia o update depois: back-pressure sem perder mensagens
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Bot sobrecarregado",
+            headers={"Retry-After": "5"}
+        )
+    
+    return {"ok": True}
@@ -7,13 +7,57 @@ load_dotenv()
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./scheduling.db")
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")  # Vazio: derivada de DATABASE_URL
+    
+    # Pool de conexões
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # Segundos aguardando conexão livre
+    DB_POOL_RECYCLE: int = 1800  # Segundos até reciclar uma conexão
+    DB_POOL_PRE_PING: bool = True
+    
+    # Ajustes do SQLite
+    SQLITE_WAL: bool = True  # Leitores não bloqueiam o escritor
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # Espera pela trava antes de "database is locked"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # OFF, NORMAL, FULL ou EXTRA
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
     
     # Telegram
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    TELEGRAM_WEBHOOK_URL: str = os.getenv("TELEGRAM_WEBHOOK_URL", "")  # URL pública da API; vazio: polling
+    TELEGRAM_WEBHOOK_PATH: str = "/telegram/webhook"
+    TELEGRAM_WEBHOOK_SECRET: str = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")  # Conferido no header do Telegram; obrigatório no webhook
+    
+    # Estado das conversas do bot
+    CONVERSATION_STATE_BACKEND: str = os.getenv("CONVERSATION_STATE_BACKEND", "memory")  # "memory" ou "sql" (várias réplicas)
+    CONVERSATION_STATE_TTL_SECONDS: int = 3600  # Fluxos abandonados expiram
+    CONVERSATION_STATE_MAX_ENTRIES: int = 10000  # Limite do backend em memória
+    TELEGRAM_IDENTITY_TTL_SECONDS: int = 60  # Cache do usuário por telegram_id
+    TELEGRAM_IDENTITY_MAX_ENTRIES: int = 10000
+    
+    # Fila de saída do bot (limites do Telegram: ~30 msg/s no total, ~1 msg/s por chat)
+    TELEGRAM_GLOBAL_RATE: float = 28.0
+    TELEGRAM_PER_CHAT_RATE: float = 1.0
+    TELEGRAM_PER_CHAT_BURST: int = 3  # Respostas curtas seguidas saem sem espera
+    TELEGRAM_SEND_MAX_RETRIES: int = 3  # Novas tentativas após RetryAfter
+    
+    # Processamento de updates (usuários em paralelo, cada usuário em ordem)
+    TELEGRAM_MAX_CONCURRENT_UPDATES: int = 15  # Limitado a DB_POOL_SIZE + DB_MAX_OVERFLOW
+    TELEGRAM_MAX_PENDING_UPDATES: int = 256  # Acima disso o webhook responde 503 e o Telegram reenvia
     
     # Anthropic Claude API
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
     CLAUDE_MODEL: str = "claude-sonnet-4-20250514"
+    AI_BACKEND: str = os.getenv("AI_BACKEND", "anthropic")  # "anthropic" ou "stub" (testes, sem rede)
+    AI_TIMEOUT_SECONDS: float = 20.0  # Tempo máximo por chamada, incluindo espera na fila
+    AI_MAX_CONCURRENCY: int = 8  # Chamadas simultâneas à API
+    AI_MAX_RETRIES: int = 1  # Repetições após falha transitória, dentro de AI_TIMEOUT_SECONDS
+    AI_INTENT_CACHE_SIZE: int = 2048  # Análises de intenção em memória
+    AI_INTENT_CACHE_TTL_SECONDS: int = 6 * 3600
+    AI_INTENT_CACHE_PATH: str = os.getenv("AI_INTENT_CACHE_PATH", "")  # Arquivo SQLite; vazio: só memória
+    AI_INTENT_CACHE_TIMEOUT_SECONDS: float = 0.2  # Espera pela trava do arquivo; depois, falta de cache
+    AI_PROMPT_CACHE_MIN_TOKENS: int = 1024  # Menor prefixo que a API guarda em cache
+    SERVICE_CATALOG_TTL_SECONDS: int = 60  # Alterações feitas por outros workers
     
     # App Settings
     APP_NAME: str = "Sistema de Agendamento Inteligente"
@@ -25,9 +69,20 @@ class Settings(BaseSettings):
     ALERT_BEFORE_APPOINTMENT_HOURS: int = 24  # Alerta 24h antes
     REMINDER_BEFORE_APPOINTMENT_MINUTES: int = 60  # Lembrete 1h antes
     
+    # Agendador de lembretes
+    REMINDERS_ENABLED: bool = os.getenv("REMINDERS_ENABLED", "True").lower() == "true"
+    REMINDER_POLL_SECONDS: int = 60  # Intervalo máximo entre verificações
+    REMINDER_BATCH_SIZE: int = 200  # Lembretes lidos por consulta
+    REMINDER_SEND_RATE: int = 25  # Mensagens por segundo (limite do Telegram: 30)
+    REMINDER_LEASE_SECONDS: int = 180  # Validade da liderança entre instâncias
+    REMINDER_QUEUE_HORIZON_HOURS: int = 6  # Prazos carregados na fila em memória
+    REMINDER_QUEUE_RESYNC_SECONDS: int = 900  # Recarga completa da fila (mudanças de outras instâncias)
+    
     # Horários de funcionamento
     BUSINESS_HOURS_START: str = "08:00"
     BUSINESS_HOURS_END: str = "20:00"
+    SLOT_INTERVAL_MINUTES: int = 30  # Granularidade dos horários oferecidos
+    WORKING_HOURS_TTL_SECONDS: int = 300  # Expediente em cache (alterações de outros processos)
     
     class Config:
         env_file = ".env"
@@ -1,12 +1,94 @@
 import anthropic
+import asyncio
+from types import SimpleNamespace
 from app.config import settings
-from typing import List, Dict, Optional
+from app.core.intent_cache import intent_cache
+from app.core.intent_classifier import intent_classifier
+from typing import List, Dict, Optional, Tuple
 import json
 
-class AIService:
+# Estimativa conservadora de caracteres por token (texto em português)
+CHARS_PER_TOKEN = 4
+
+# Falhas transitórias que valem nova tentativa: rede/timeout, 429 e 5xx
+RETRYABLE_ERRORS = (
+    anthropic.APIConnectionError,
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+)
+
+# Pausa antes de repetir uma chamada que falhou
+RETRY_DELAY_SECONDS = 0.5
+
+class StubMessages:
+    """Backend local (AI_BACKEND=stub): respostas fixas, sem chamadas à API"""
+    
+    async def create(self, messages: List[Dict], **kwargs):
+        prompt = messages[-1]["content"]
+        
+        if "Responda APENAS com um JSON" in prompt:
+            text = json.dumps({
+                "intent": "other",
+                "service_mentioned": None,
+                "professional_mentioned": None,
+                "date_mentioned": None,
+                "time_mentioned": None
+            })
+        else:
+            text = "Olá! Como posso ajudar com o seu agendamento?"
+        
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)])
+
+class StubClient:
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self.messages = StubMessages()
+
+class AIService:
+    def __init__(self, backend: Optional[str] = None):
+        backend = backend or settings.AI_BACKEND
+        if backend == "stub":
+            self.client = StubClient()
+        elif backend == "anthropic":
+            # As repetições ficam em _create_message, dentro do prazo total:
+            # as do SDK (backoff, Retry-After) poderiam estourá-lo
+            self.client = anthropic.AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                timeout=settings.AI_TIMEOUT_SECONDS,
+                max_retries=0
+            )
+        else:
+            raise ValueError(f"Backend de IA desconhecido: {backend}")
+        
         self.model = settings.CLAUDE_MODEL
+        # Limita chamadas simultâneas à API; as demais aguardam sem bloquear o event loop
+        self._semaphore = asyncio.BoundedSemaphore(settings.AI_MAX_CONCURRENCY)
+        # (versão do catálogo, prefixo do prompt do sistema)
+        self._prompt_cache = (None, "")
+    
+    async def _create_message(self, **kwargs):
+        """
+        Chama a API respeitando o limite de concorrência e o timeout total
+        
+        AI_TIMEOUT_SECONDS cobre a espera na fila e todas as tentativas: o
+        tempo que resta é dividido entre as tentativas que faltam, então
+        uma repetição após timeout ainda termina dentro do prazo.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.AI_TIMEOUT_SECONDS
+        
+        async def call():
+            async with self._semaphore:
+                attempts = settings.AI_MAX_RETRIES + 1
+                for attempt in range(attempts):
+                    timeout = (deadline - loop.time()) / (attempts - attempt)
+                    try:
+                        return await self.client.messages.create(timeout=timeout, **kwargs)
+                    except RETRYABLE_ERRORS:
+                        if attempt == attempts - 1:
+                            raise
+                    await asyncio.sleep(min(RETRY_DELAY_SECONDS, timeout / 2))
+        
+        return await asyncio.wait_for(call(), timeout=settings.AI_TIMEOUT_SECONDS)
         
     async def chat(self, user_message: str, context: Optional[Dict] = None, conversation_history: Optional[List[Dict]] = None) -> str:
         """
@@ -23,7 +105,7 @@ class AIService:
         messages.append({"role": "user", "content": user_message})
         
         try:
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=self.model,
                 max_tokens=1000,
                 system=system_prompt,
@@ -34,9 +116,67 @@ class AIService:
         except Exception as e:
             return f"Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente."
     
-    def _build_system_prompt(self, context: Optional[Dict] = None) -> str:
-        """Constrói o prompt do sistema com contexto"""
-        base_prompt = f"""Você é um assistente virtual elegante e educado para um sistema de agendamento de clínicas, salões e barbearias.
+    async def chat_with_intent(self, user_message: str, context: Optional[Dict] = None) -> Tuple[str, Dict]:
+        """
+        Gera a resposta e a análise de intenção da mesma mensagem
+        
+        As duas chamadas são independentes e rodam em paralelo: a latência
+        é a da mais lenta, não a soma das duas. Mensagens óbvias são
+        classificadas localmente e só a resposta vai para a IA.
+        """
+        service_names = [s["name"] for s in (context or {}).get("available_services", [])]
+        intent_data = intent_classifier.classify(user_message, service_names)
+        if intent_data is not None:
+            return await self.chat(user_message, context=context), intent_data
+        
+        response, intent_data = await asyncio.gather(
+            self.chat(user_message, context=context),
+            self.analyze_appointment_request(user_message)
+        )
+        
+        return response, intent_data
+    
+    def _build_system_prompt(self, context: Optional[Dict] = None) -> List[Dict]:
+        """
+        Constrói o prompt do sistema com contexto
+        
+        Retorna blocos de texto: o prefixo fixo (estabelecimento e catálogo
+        de serviços) e, em um bloco separado, os dados do cliente. A API só
+        guarda em cache prefixos a partir de AI_PROMPT_CACHE_MIN_TOKENS; o
+        prefixo recebe cache_control apenas quando um catálogo grande o leva
+        a esse tamanho (com poucos serviços ele tem ~300 tokens).
+        """
+        context = context or {}
+        static_prompt = self._static_prompt(
+            context.get("catalog_version"),
+            context.get("available_services") or ()
+        )
+        static_block = {"type": "text", "text": static_prompt}
+        if len(static_prompt) / CHARS_PER_TOKEN >= settings.AI_PROMPT_CACHE_MIN_TOKENS:
+            static_block["cache_control"] = {"type": "ephemeral"}
+        blocks = [static_block]
+        
+        client_prompt = ""
+        if context.get("user_name"):
+            client_prompt += f"Cliente atual: {context['user_name']}"
+        
+        if context.get("user_appointments"):
+            client_prompt += f"\n\nO cliente possui {context['user_appointments']} agendamento(s) ativo(s)."
+        
+        if context.get("reliability_level"):
+            client_prompt += f"\n\nNível de confiabilidade do cliente: {context['reliability_level']}"
+        
+        if client_prompt:
+            blocks.append({"type": "text", "text": client_prompt.strip()})
+        
+        return blocks
+    
+    def _static_prompt(self, catalog_version: Optional[int], services) -> str:
+        """Prefixo fixo do prompt, montado uma vez por versão do catálogo de serviços"""
+        if catalog_version is not None and self._prompt_cache[0] == catalog_version:
+            return self._prompt_cache[1]
+        
+        prompt = f"""Você é um assistente virtual elegante e educado para um sistema de agendamento de clínicas, salões e barbearias.
 
 DIRETRIZES DE COMPORTAMENTO:
 - Seja sempre educado, cordial e profissional
@@ -57,27 +197,20 @@ Nome do estabelecimento: {settings.APP_NAME}
 Horário de funcionamento: {settings.BUSINESS_HOURS_START} às {settings.BUSINESS_HOURS_END}
 """
         
-        if context:
-            if context.get("user_name"):
-                base_prompt += f"\n\nCliente atual: {context['user_name']}"
-            
-            if context.get("available_services"):
-                services = "\n".join([f"- {s['name']}: R$ {s['price']:.2f} ({s['duration_minutes']} min)" 
-                                     for s in context['available_services']])
-                base_prompt += f"\n\nServiços disponíveis:\n{services}"
-            
-            if context.get("user_appointments"):
-                base_prompt += f"\n\nO cliente possui {len(context['user_appointments'])} agendamento(s) ativo(s)."
-            
-            if context.get("reliability_level"):
-                base_prompt += f"\n\nNível de confiabilidade do cliente: {context['reliability_level']}"
+        if services:
+            catalog = "\n".join([f"- {s['name']}: R$ {s['price']:.2f} ({s['duration_minutes']} min)" 
+                                  for s in services])
+            prompt += f"\n\nServiços disponíveis:\n{catalog}"
         
-        return base_prompt
+        if catalog_version is not None:
+            self._prompt_cache = (catalog_version, prompt)
+        
+        return prompt
     
     async def analyze_appointment_request(self, message: str) -> Dict:
         """
         Analisa uma mensagem para extrair intenção de agendamento
-        Retorna estrutura JSON com os dados extraídos
+        Retorna estrutura JSON com os dados extraídos (em cache por texto normalizado)
         """
         prompt = f"""Analise a seguinte mensagem de um cliente e extraia as informações de agendamento:
 
@@ -92,8 +225,12 @@ Responda APENAS com um JSON válido contendo:
     "time_mentioned": "horário se mencionado (formato HH:MM)"
 }}"""
 
+        cached = await intent_cache.aget(message)
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=self.model,
                 max_tokens=500,
                 messages=[{"role": "user", "content": prompt}]
@@ -106,7 +243,9 @@ Responda APENAS com um JSON válido contendo:
             elif result_text.startswith("```"):
                 result_text = result_text[3:-3].strip()
                 
-            return json.loads(result_text)
+            result = json.loads(result_text)
+            await intent_cache.aset(message, result)
+            return result
         except Exception as e:
             return {"intent": "other", "error": str(e)}
     
@@ -124,7 +263,7 @@ Dados:
 Crie uma mensagem motivadora e informativa em até 200 palavras."""
 
         try:
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=self.model,
                 max_tokens=500,
                 messages=[{"role": "user", "content": prompt}]
@@ -149,7 +288,7 @@ Período: {business_data.get('period')}
 Forneça insights e recomendações em até 300 palavras."""
 
         try:
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=self.model,
                 max_tokens=800,
                 messages=[{"role": "user", "content": prompt}]
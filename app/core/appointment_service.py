@@ -1,13 +1,52 @@
+import heapq
+from collections import defaultdict
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional, Dict
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Dict, Tuple
 from app.db.models import (
     Appointment, AppointmentStatus, ClientProfile, 
-    ProfessionalProfile, Service, ReliabilityLevel
+    ProfessionalProfile, ProfessionalService, Service, ReliabilityLevel, User
 )
+from app.core.booking_lock import booking_lock
+from app.core.financial_service import FinancialService
+from app.core.rollup_service import RollupService, build_statistics
+from app.core.availability import AvailabilityIndex, start_of_day, to_minutes
+from app.core.working_hours import WeeklyHours, working_hours_cache
 from app.config import settings
 
+# Status que ocupam a agenda do profissional
+ACTIVE_STATUSES = [AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED]
+
+# Perfis de carregamento: relacionamentos (muitos-para-um) trazidos via JOIN
+# na mesma consulta da listagem, evitando um SELECT extra por linha
+LOAD_PROFILES = {
+    # Telas do cliente: serviço e nome do profissional
+    "summary": (
+        joinedload(Appointment.service),
+        joinedload(Appointment.professional).joinedload(ProfessionalProfile.user),
+    ),
+    # Respostas da API: também o nome do cliente
+    "detail": (
+        joinedload(Appointment.service),
+        joinedload(Appointment.professional).joinedload(ProfessionalProfile.user),
+        joinedload(Appointment.client).joinedload(ClientProfile.user),
+    ),
+}
+
+# SQLSTATE do PostgreSQL para violação de constraint de exclusão
+EXCLUSION_VIOLATION = "23P01"
+
+class SlotUnavailableError(ValueError):
+    """Horário já ocupado; a operação pode ser repetida com outro horário"""
+
+def _is_overlap_violation(error: IntegrityError) -> bool:
+    """Verifica se o erro veio da constraint de sobreposição de agendamentos"""
+    orig = error.orig
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    return code == EXCLUSION_VIOLATION
+
 class AppointmentService:
     """Serviço para gerenciamento de agendamentos"""
     
@@ -22,32 +61,63 @@ class AppointmentService:
         scheduled_date: datetime,
         notes: Optional[str] = None
     ) -> Appointment:
-        """Cria novo agendamento"""
+        """
+        Cria novo agendamento
         
-        # Verifica se horário está disponível
-        if not self.is_time_slot_available(professional_id, scheduled_date):
-            raise ValueError("Horário não disponível")
+        A checagem de disponibilidade e a inserção rodam sob a trava de
+        reserva do profissional; conflitos levantam SlotUnavailableError.
+        """
+        
+        service = self.db.query(Service).filter_by(id=service_id).first()
+        if not service:
+            raise ValueError("Serviço não encontrado")
         
-        # Verifica confiabilidade do cliente para horários de pico
         client = self.db.query(ClientProfile).filter_by(id=client_id).first()
+        if not client:
+            raise ValueError("Cliente não encontrado")
+        
+        # Verifica confiabilidade do cliente para horários de pico
         if self._is_peak_time(scheduled_date) and client.reliability_level == ReliabilityLevel.LOW:
             raise ValueError("Cliente com baixa confiabilidade não pode agendar em horários de pico")
         
-        appointment = Appointment(
-            client_id=client_id,
-            professional_id=professional_id,
-            service_id=service_id,
-            scheduled_date=scheduled_date,
-            notes=notes,
-            status=AppointmentStatus.SCHEDULED
-        )
-        
-        self.db.add(appointment)
-        
-        # Atualiza contadores do cliente
-        client.total_appointments += 1
+        with booking_lock(self.db, professional_id):
+            try:
+                # Verifica se horário está disponível pela duração real do serviço
+                if not self.is_time_slot_available(
+                    professional_id, scheduled_date, service.duration_minutes
+                ):
+                    raise SlotUnavailableError("Horário não disponível")
+                
+                appointment = Appointment(
+                    client_id=client_id,
+                    professional_id=professional_id,
+                    service_id=service_id,
+                    scheduled_date=scheduled_date,
+                    scheduled_end=scheduled_date + timedelta(minutes=service.duration_minutes),
+                    service_price=service.price,
+                    notes=notes,
+                    status=AppointmentStatus.SCHEDULED
+                )
+                
+                self.db.add(appointment)
+                
+                # Atualiza contadores do cliente
+                client.total_appointments += 1
+                
+                RollupService(self.db).record_transition(
+                    appointment, None, AppointmentStatus.SCHEDULED
+                )
+                
+                self.db.commit()
+            except IntegrityError as e:
+                self.db.rollback()
+                if _is_overlap_violation(e):
+                    raise SlotUnavailableError("Horário não disponível") from e
+                raise
+            except Exception:
+                self.db.rollback()
+                raise
         
-        self.db.commit()
         self.db.refresh(appointment)
         
         return appointment
@@ -76,6 +146,10 @@ class AppointmentService:
             client.late_cancellation_count += 1
             self._update_reliability(client)
         
+        RollupService(self.db).record_transition(
+            appointment, appointment.status, AppointmentStatus.CANCELLED
+        )
+        
         appointment.status = AppointmentStatus.CANCELLED
         appointment.cancellation_reason = reason
         appointment.cancelled_at = datetime.now()
@@ -92,6 +166,10 @@ class AppointmentService:
         if not appointment:
             raise ValueError("Agendamento não encontrado")
         
+        RollupService(self.db).record_transition(
+            appointment, appointment.status, AppointmentStatus.NO_SHOW
+        )
+        
         appointment.status = AppointmentStatus.NO_SHOW
         
         # Penaliza cliente
@@ -111,9 +189,20 @@ class AppointmentService:
         if not appointment:
             raise ValueError("Agendamento não encontrado")
         
+        # Cancelados e faltas não geram atendimento (nem comissão)
+        if appointment.status not in ACTIVE_STATUSES:
+            raise ValueError("Só agendamentos ativos podem ser completados")
+        
+        RollupService(self.db).record_transition(
+            appointment, appointment.status, AppointmentStatus.COMPLETED
+        )
+        
         appointment.status = AppointmentStatus.COMPLETED
         appointment.completed_at = datetime.now()
         
+        # Gera o lançamento financeiro (comissão do profissional e receita)
+        FinancialService(self.db).record_completion(appointment)
+        
         self.db.commit()
         self.db.refresh(appointment)
         
@@ -123,68 +212,125 @@ class AppointmentService:
         self,
         professional_id: int,
         date: datetime,
-        service_id: int
+        service_id: int,
+        slot_minutes: Optional[int] = None
     ) -> List[Dict]:
         """Retorna horários disponíveis para um profissional em uma data"""
         
+        slots_by_day = self.get_available_slots_range(
+            professional_id, date, 1, service_id, slot_minutes
+        )
+        
+        return slots_by_day.get(start_of_day(date), [])
+    
+    def get_available_slots_range(
+        self,
+        professional_id: int,
+        start_date: datetime,
+        days: int,
+        service_id: int,
+        slot_minutes: Optional[int] = None
+    ) -> Dict[datetime, List[Dict]]:
+        """
+        Retorna horários disponíveis de um profissional em vários dias
+        
+        Todos os agendamentos do período são carregados em uma única consulta.
+        O resultado é indexado pela meia-noite de cada dia, em ordem.
+        """
+        
         service = self.db.query(Service).filter_by(id=service_id).first()
         if not service:
-            return []
+            return {}
         
-        # Busca agendamentos existentes do profissional nesta data
-        start_of_day = date.replace(hour=0, minute=0, second=0)
-        end_of_day = date.replace(hour=23, minute=59, second=59)
+        first_day = start_of_day(start_date)
+        indexes = self._build_availability_indexes(
+            [professional_id], first_day, first_day + timedelta(days=days)
+        )
         
-        existing = self.db.query(Appointment).filter(
-            and_(
-                Appointment.professional_id == professional_id,
-                Appointment.scheduled_date >= start_of_day,
-                Appointment.scheduled_date <= end_of_day,
-                Appointment.status.in_([AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED])
+        hours = working_hours_cache.get(self.db, professional_id)
+        
+        slots_by_day = {}
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            index = indexes.get((professional_id, day)) or AvailabilityIndex(day)
+            slots_by_day[day] = self._free_slots_for_day(
+                index, service.duration_minutes, hours, slot_minutes
             )
+        
+        return slots_by_day
+    
+    def find_earliest_slots(
+        self,
+        service_id: int,
+        window_start: datetime,
+        window_end: datetime,
+        limit: int = 5,
+        slot_minutes: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Retorna os primeiros horários livres com qualquer profissional do serviço
+        
+        Considera todos os profissionais disponíveis vinculados ao serviço via
+        ProfessionalService e carrega os agendamentos de todos eles em uma
+        única consulta. Resultado ordenado por horário.
+        """
+        
+        service = self.db.query(Service).filter_by(id=service_id).first()
+        if not service or limit <= 0:
+            return []
+        
+        professionals = self.db.query(
+            ProfessionalProfile.id,
+            User.name
+        ).join(
+            ProfessionalService, ProfessionalService.professional_id == ProfessionalProfile.id
+        ).join(
+            User, ProfessionalProfile.user_id == User.id
+        ).filter(
+            ProfessionalService.service_id == service_id,
+            ProfessionalProfile.is_available == True
         ).all()
         
-        # Gera slots possíveis
-        business_start = datetime.strptime(settings.BUSINESS_HOURS_START, "%H:%M")
-        business_end = datetime.strptime(settings.BUSINESS_HOURS_END, "%H:%M")
+        if not professionals:
+            return []
         
-        available_slots = []
-        current_time = date.replace(
-            hour=business_start.hour,
-            minute=business_start.minute,
-            second=0
+        first_day = start_of_day(window_start)
+        last_day = start_of_day(window_end - timedelta(microseconds=1))
+        professional_ids = [prof_id for prof_id, _ in professionals]
+        indexes = self._build_availability_indexes(
+            professional_ids,
+            first_day,
+            last_day + timedelta(days=1)
         )
-        
-        while current_time.hour < business_end.hour or \
-              (current_time.hour == business_end.hour and current_time.minute < business_end.minute):
-            
-            # Verifica se slot está livre
-            is_available = True
-            for apt in existing:
-                apt_service = apt.service
-                apt_end = apt.scheduled_date + timedelta(minutes=apt_service.duration_minutes)
-                service_end = current_time + timedelta(minutes=service.duration_minutes)
-                
-                # Verifica sobreposição
-                if not (service_end <= apt.scheduled_date or current_time >= apt_end):
-                    is_available = False
-                    break
-            
-            # Não permite agendamento no passado
-            if current_time <= datetime.now():
-                is_available = False
+        weekly_hours = working_hours_cache.get_many(self.db, professional_ids)
+        
+        results = []
+        day = first_day
+        while day <= last_day and len(results) < limit:
+            # Intercala os slots do dia de todos os profissionais por horário
+            per_professional = []
+            for prof_id, prof_name in professionals:
+                index = indexes.get((prof_id, day)) or AvailabilityIndex(day)
+                per_professional.append([
+                    (slot["datetime"], prof_id, prof_name, slot)
+                    for slot in self._free_slots_for_day(
+                        index, service.duration_minutes, weekly_hours[prof_id], slot_minutes
+                    )
+                    if window_start <= slot["datetime"] < window_end
+                ])
             
-            if is_available:
-                available_slots.append({
-                    "time": current_time.strftime("%H:%M"),
-                    "datetime": current_time,
-                    "is_peak": self._is_peak_time(current_time)
+            for slot_dt, prof_id, prof_name, slot in heapq.merge(*per_professional):
+                results.append({
+                    "professional_id": prof_id,
+                    "professional_name": prof_name,
+                    **slot
                 })
+                if len(results) >= limit:
+                    break
             
-            # Próximo slot (incrementa em 30 minutos)
-            current_time += timedelta(minutes=30)
+            day += timedelta(days=1)
         
-        return available_slots
+        return results
     
     def is_time_slot_available(
         self,
@@ -196,33 +342,130 @@ class AppointmentService:
         
         end_time = scheduled_date + timedelta(minutes=service_duration)
         
-        conflicts = self.db.query(Appointment).filter(
+        # Nenhum agendamento dura mais que o serviço mais longo: quem começa
+        # antes disso já terminou. Sem esse limite inferior, a varredura do
+        # índice passaria por todo o histórico ativo do profissional
+        longest = self.db.query(func.max(Service.duration_minutes)).scalar() or service_duration
+        earliest_start = scheduled_date - timedelta(minutes=max(longest, service_duration))
+        
+        # Sobreposição de intervalos [início, fim): resolvida apenas pelo
+        # índice (professional_id, status, scheduled_date, scheduled_end)
+        conflict = self.db.query(Appointment.id).filter(
             and_(
                 Appointment.professional_id == professional_id,
-                Appointment.status.in_([AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED]),
-                or_(
-                    and_(
-                        Appointment.scheduled_date <= scheduled_date,
-                        Appointment.scheduled_date + timedelta(minutes=60) > scheduled_date
-                    ),
-                    and_(
-                        Appointment.scheduled_date < end_time,
-                        Appointment.scheduled_date >= scheduled_date
-                    )
-                )
+                Appointment.status.in_(ACTIVE_STATUSES),
+                Appointment.scheduled_date > earliest_start,
+                Appointment.scheduled_date < end_time,
+                Appointment.scheduled_end > scheduled_date
             )
-        ).count()
+        ).first()
         
-        return conflicts == 0
+        return conflict is None
+    
+    def _free_slots_for_day(
+        self,
+        index: AvailabilityIndex,
+        duration: int,
+        hours: WeeklyHours,
+        slot_minutes: Optional[int] = None
+    ) -> List[Dict]:
+        """Calcula slots livres de um dia a partir do índice de ocupação"""
+        
+        # Não permite agendamento no passado
+        now = datetime.now()
+        not_before = None
+        if index.day == start_of_day(now):
+            not_before = to_minutes(now) + 1
+        elif index.day < start_of_day(now):
+            return []
+        
+        # Expediente do profissional no dia da semana, já em minutos
+        minutes = []
+        for open_start, open_end in hours.get(index.day.weekday(), ()):
+            minutes.extend(index.free_slots(
+                open_start=open_start,
+                open_end=open_end,
+                duration=duration,
+                step=slot_minutes or settings.SLOT_INTERVAL_MINUTES,
+                not_before=not_before
+            ))
+        
+        return [
+            {
+                "time": slot.strftime("%H:%M"),
+                "datetime": slot,
+                "is_peak": self._is_peak_time(slot)
+            }
+            for slot in index.slot_datetimes(minutes)
+        ]
+    
+    def _build_availability_indexes(
+        self,
+        professional_ids: List[int],
+        start: datetime,
+        end: datetime
+    ) -> Dict[Tuple[int, datetime], AvailabilityIndex]:
+        """
+        Monta índices de blocos ocupados por (profissional, dia) no período
+        
+        Uma única consulta respondida pelo índice composto de agendamentos,
+        sem join com serviços. Dias sem agendamentos não aparecem no resultado.
+        """
+        
+        rows = self.db.query(
+            Appointment.professional_id,
+            Appointment.scheduled_date,
+            Appointment.scheduled_end
+        ).filter(
+            and_(
+                Appointment.professional_id.in_(professional_ids),
+                Appointment.scheduled_date >= start,
+                Appointment.scheduled_date < end,
+                Appointment.status.in_(ACTIVE_STATUSES)
+            )
+        ).all()
+        
+        # Agrupa agendamentos por profissional e dia
+        bookings = defaultdict(list)
+        for professional_id, scheduled_date, scheduled_end in rows:
+            bookings[(professional_id, start_of_day(scheduled_date))].append(
+                (scheduled_date, scheduled_end)
+            )
+        
+        return {
+            key: AvailabilityIndex.from_bookings(key[1], day_bookings)
+            for key, day_bookings in bookings.items()
+        }
+    
+    def get_appointment(
+        self,
+        appointment_id: int,
+        profile: Optional[str] = None
+    ) -> Optional[Appointment]:
+        """Retorna um agendamento, recarregando os relacionamentos do perfil"""
+        
+        query = self._with_profile(
+            self.db.query(Appointment).filter_by(id=appointment_id), profile
+        )
+        
+        return query.populate_existing().first()
     
     def get_client_appointments(
         self,
         client_id: int,
-        include_past: bool = False
+        include_past: bool = False,
+        profile: Optional[str] = None
     ) -> List[Appointment]:
-        """Retorna agendamentos de um cliente"""
+        """
+        Retorna agendamentos de um cliente
+        
+        profile: perfil de carregamento (ver LOAD_PROFILES) para trazer os
+        relacionamentos na mesma consulta
+        """
         
-        query = self.db.query(Appointment).filter_by(client_id=client_id)
+        query = self._with_profile(
+            self.db.query(Appointment).filter_by(client_id=client_id), profile
+        )
         
         if not include_past:
             query = query.filter(Appointment.scheduled_date >= datetime.now())
@@ -232,11 +475,19 @@ class AppointmentService:
     def get_professional_appointments(
         self,
         professional_id: int,
-        date: Optional[datetime] = None
+        date: Optional[datetime] = None,
+        profile: Optional[str] = None
     ) -> List[Appointment]:
-        """Retorna agendamentos de um profissional"""
+        """
+        Retorna agendamentos de um profissional
         
-        query = self.db.query(Appointment).filter_by(professional_id=professional_id)
+        profile: perfil de carregamento (ver LOAD_PROFILES) para trazer os
+        relacionamentos na mesma consulta
+        """
+        
+        query = self._with_profile(
+            self.db.query(Appointment).filter_by(professional_id=professional_id), profile
+        )
         
         if date:
             start_of_day = date.replace(hour=0, minute=0, second=0)
@@ -252,6 +503,67 @@ class AppointmentService:
         
         return query.order_by(Appointment.scheduled_date).all()
     
+    def get_daily_statistics(self, target_date: datetime) -> Dict:
+        """Retorna estatísticas de agendamentos de um dia"""
+        
+        day_start = start_of_day(target_date)
+        stats = self.get_statistics(day_start, day_start + timedelta(days=1))
+        
+        return {"date": day_start.strftime("%Y-%m-%d"), **stats}
+    
+    def get_statistics(
+        self,
+        start: datetime,
+        end: datetime,
+        professional_id: Optional[int] = None,
+        by_professional: bool = False
+    ) -> Dict:
+        """
+        Retorna estatísticas de agendamentos no período [start, end)
+        
+        Calculadas no banco com GROUP BY status e SUM(preço da reserva), sem
+        carregar os agendamentos. Com by_professional, inclui a quebra por profissional
+        em "professionals" (mesma consulta, agrupada também por profissional).
+        """
+        
+        columns = [
+            Appointment.status,
+            func.count(Appointment.id),
+            func.coalesce(func.sum(Appointment.service_price), 0.0)
+        ]
+        if by_professional:
+            columns = [Appointment.professional_id, User.name] + columns
+        
+        query = self.db.query(*columns).filter(
+            Appointment.scheduled_date >= start,
+            Appointment.scheduled_date < end
+        )
+        
+        if professional_id is not None:
+            query = query.filter(Appointment.professional_id == professional_id)
+        
+        if by_professional:
+            query = query.join(
+                ProfessionalProfile, Appointment.professional_id == ProfessionalProfile.id
+            ).join(
+                User, ProfessionalProfile.user_id == User.id
+            ).group_by(Appointment.professional_id, User.name, Appointment.status)
+        else:
+            query = query.group_by(Appointment.status)
+        
+        return build_statistics(query.all(), by_professional)
+    
+    def _with_profile(self, query, profile: Optional[str]):
+        """Aplica um perfil de carregamento a uma consulta de agendamentos"""
+        
+        if profile is None:
+            return query
+        
+        if profile not in LOAD_PROFILES:
+            raise ValueError(f"Perfil de carregamento desconhecido: {profile}")
+        
+        return query.options(*LOAD_PROFILES[profile])
+    
     def _update_reliability(self, client: ClientProfile):
         """Atualiza nível de confiabilidade do cliente"""
         
@@ -281,14 +593,15 @@ class AppointmentService:
         
         alternatives = []
         
-        # Tenta encontrar horários nos próximos 7 dias
-        for days_offset in range(7):
-            check_date = preferred_date + timedelta(days=days_offset)
-            slots = self.get_available_slots(professional_id, check_date, service_id)
-            
+        # Busca os próximos 7 dias de uma vez
+        slots_by_day = self.get_available_slots_range(
+            professional_id, preferred_date, 7, service_id
+        )
+        
+        for days_offset, slots in enumerate(slots_by_day.values()):
             if slots:
                 alternatives.append({
-                    "date": check_date,
+                    "date": preferred_date + timedelta(days=days_offset),
                     "slots": slots[:5]  # Máximo 5 sugestões por dia
                 })
             
@@ -0,0 +1,178 @@
+"""
+Variante assíncrona do AppointmentService
+
+Executa as mesmas regras de negócio do serviço síncrono sobre uma
+AsyncSession via run_sync: o código roda em um greenlet e cada consulta
+aguarda o driver assíncrono (aiosqlite / asyncpg) sem bloquear o event loop.
+"""
+
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.appointment_service import AppointmentService
+from app.core.booking_lock import async_booking_guard
+from app.core.financial_service import FinancialService
+from app.core.rollup_service import RollupService
+from app.db.models import Appointment
+
+T = TypeVar("T")
+
+# Perfil de carregamento das respostas da API
+API_PROFILE = "detail"
+
+
+class AsyncAppointmentService:
+    """Serviço assíncrono para gerenciamento de agendamentos"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, operation: Callable[[AppointmentService], T]) -> T:
+        """Executa uma operação do serviço síncrono sobre a sessão assíncrona"""
+        return await self.db.run_sync(
+            lambda session: operation(AppointmentService(session))
+        )
+
+    async def _run_and_load(
+        self,
+        operation: Callable[[AppointmentService], Appointment]
+    ) -> Appointment:
+        """Executa a operação e recarrega o agendamento com os dados da resposta"""
+        def run(service: AppointmentService) -> Appointment:
+            appointment = operation(service)
+            return service.get_appointment(appointment.id, profile=API_PROFILE)
+
+        return await self._run(run)
+
+    async def create_appointment(
+        self,
+        client_id: int,
+        professional_id: int,
+        service_id: int,
+        scheduled_date: datetime,
+        notes: Optional[str] = None
+    ) -> Appointment:
+        """Cria novo agendamento"""
+        async with async_booking_guard(self.db, professional_id):
+            return await self._run_and_load(lambda service: service.create_appointment(
+                client_id=client_id,
+                professional_id=professional_id,
+                service_id=service_id,
+                scheduled_date=scheduled_date,
+                notes=notes
+            ))
+
+    async def cancel_appointment(
+        self,
+        appointment_id: int,
+        reason: str,
+        cancelled_by_client: bool = True
+    ) -> Appointment:
+        """Cancela agendamento"""
+        return await self._run_and_load(lambda service: service.cancel_appointment(
+            appointment_id, reason, cancelled_by_client
+        ))
+
+    async def mark_no_show(self, appointment_id: int) -> Appointment:
+        """Marca cliente como faltoso"""
+        return await self._run_and_load(lambda service: service.mark_no_show(appointment_id))
+
+    async def complete_appointment(self, appointment_id: int) -> Appointment:
+        """Marca agendamento como completado"""
+        return await self._run_and_load(lambda service: service.complete_appointment(appointment_id))
+
+    async def get_available_slots(
+        self,
+        professional_id: int,
+        date: datetime,
+        service_id: int,
+        slot_minutes: Optional[int] = None
+    ) -> List[Dict]:
+        """Retorna horários disponíveis para um profissional em uma data"""
+        return await self._run(lambda service: service.get_available_slots(
+            professional_id, date, service_id, slot_minutes
+        ))
+
+    async def get_available_slots_range(
+        self,
+        professional_id: int,
+        start_date: datetime,
+        days: int,
+        service_id: int,
+        slot_minutes: Optional[int] = None
+    ) -> Dict[datetime, List[Dict]]:
+        """Retorna horários disponíveis de um profissional em vários dias"""
+        return await self._run(lambda service: service.get_available_slots_range(
+            professional_id, start_date, days, service_id, slot_minutes
+        ))
+
+    async def find_earliest_slots(
+        self,
+        service_id: int,
+        window_start: datetime,
+        window_end: datetime,
+        limit: int = 5,
+        slot_minutes: Optional[int] = None
+    ) -> List[Dict]:
+        """Retorna os primeiros horários livres com qualquer profissional do serviço"""
+        return await self._run(lambda service: service.find_earliest_slots(
+            service_id, window_start, window_end, limit, slot_minutes
+        ))
+
+    async def get_client_appointments(
+        self,
+        client_id: int,
+        include_past: bool = False
+    ) -> List[Appointment]:
+        """Retorna agendamentos de um cliente"""
+        return await self._run(lambda service: service.get_client_appointments(
+            client_id, include_past, profile=API_PROFILE
+        ))
+
+    async def get_professional_appointments(
+        self,
+        professional_id: int,
+        date: Optional[datetime] = None
+    ) -> List[Appointment]:
+        """Retorna agendamentos de um profissional"""
+        return await self._run(lambda service: service.get_professional_appointments(
+            professional_id, date, profile=API_PROFILE
+        ))
+
+    async def get_daily_statistics(self, target_date: datetime) -> Dict:
+        """Retorna estatísticas de agendamentos de um dia"""
+        return await self._run(lambda service: service.get_daily_statistics(target_date))
+
+    async def get_statistics(
+        self,
+        start: datetime,
+        end: datetime,
+        professional_id: Optional[int] = None,
+        by_professional: bool = False
+    ) -> Dict:
+        """Retorna estatísticas de agendamentos no período"""
+        return await self._run(lambda service: service.get_statistics(
+            start, end, professional_id, by_professional
+        ))
+
+    async def get_period_statistics(
+        self,
+        start: date,
+        end: date,
+        professional_id: Optional[int] = None,
+        by_professional: bool = False
+    ) -> Dict:
+        """Retorna estatísticas dos dias em [start, end) a partir do rollup diário"""
+        return await self.db.run_sync(lambda session: RollupService(session).get_statistics(
+            start, end, professional_id, by_professional
+        ))
+
+    async def close_day(self, day: date) -> int:
+        """Gera os lançamentos financeiros pendentes do dia"""
+        return await self.db.run_sync(lambda session: FinancialService(session).close_day(day))
+
+    async def get_payouts(self, start: date, end: date) -> List[Dict]:
+        """Retorna o repasse por profissional dos dias em [start, end)"""
+        return await self.db.run_sync(lambda session: FinancialService(session).get_payouts(start, end))
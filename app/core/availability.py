@@ -0,0 +1,112 @@
+"""
+Motor de disponibilidade de agenda
+
+Mantém, para um profissional em um dia, um índice ordenado de blocos
+ocupados (em minutos desde a meia-noite) e calcula horários livres com
+uma única passagem de merge entre os slots candidatos e os blocos.
+"""
+
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+Interval = Tuple[int, int]
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_minutes(dt: datetime) -> int:
+    """Converte horário de um datetime em minutos desde a meia-noite"""
+    return dt.hour * 60 + dt.minute
+
+
+def start_of_day(dt: datetime) -> datetime:
+    """Retorna a meia-noite do dia de um datetime"""
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class AvailabilityIndex:
+    """Índice ordenado de blocos ocupados de um profissional em um dia"""
+
+    __slots__ = ("day", "_starts", "_ends")
+
+    def __init__(self, day: datetime, busy: Iterable[Interval] = ()):
+        self.day = start_of_day(day)
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+
+        # Ordena e funde blocos sobrepostos ou encostados
+        for start, end in sorted(busy):
+            if end <= start:
+                continue
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    @classmethod
+    def from_bookings(
+        cls,
+        day: datetime,
+        bookings: Iterable[Tuple[datetime, datetime]]
+    ) -> "AvailabilityIndex":
+        """Cria índice a partir de pares (início, fim) de agendamentos"""
+        base = start_of_day(day)
+        busy = []
+
+        for start, end in bookings:
+            start_min = int((start - base).total_seconds() // 60)
+            end_min = -int(-(end - base).total_seconds() // 60)  # arredonda para cima
+
+            # Recorta blocos que atravessam a meia-noite
+            busy.append((max(start_min, 0), min(end_min, MINUTES_PER_DAY)))
+
+        return cls(base, busy)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def free_slots(
+        self,
+        open_start: int,
+        open_end: int,
+        duration: int,
+        step: int,
+        not_before: Optional[int] = None
+    ) -> List[int]:
+        """
+        Retorna inícios (em minutos) de slots livres dentro do expediente
+
+        Args:
+            open_start: Início do expediente em minutos
+            open_end: Fim do expediente em minutos
+            duration: Duração do serviço em minutos
+            step: Granularidade dos slots em minutos
+            not_before: Descarta slots que começam antes deste minuto
+        """
+        slots: List[int] = []
+        starts, ends = self._starts, self._ends
+        total = len(starts)
+        i = 0
+
+        current = open_start
+        if not_before is not None and not_before > current:
+            current = open_start + -(-(not_before - open_start) // step) * step
+
+        while current + duration <= open_end:
+            # Avança blocos que já terminaram antes do slot
+            while i < total and ends[i] <= current:
+                i += 1
+
+            if i == total or starts[i] >= current + duration:
+                slots.append(current)
+                current += step
+            else:
+                # Pula direto para o primeiro slot alinhado após o bloco
+                current = open_start + -(-(ends[i] - open_start) // step) * step
+
+        return slots
+
+    def slot_datetimes(self, minutes: Iterable[int]) -> List[datetime]:
+        """Converte minutos do dia em datetimes"""
+        return [self.day + timedelta(minutes=m) for m in minutes]
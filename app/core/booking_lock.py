@@ -0,0 +1,125 @@
+"""
+Trava de reserva por profissional
+
+Garante que a checagem de disponibilidade e a inserção do agendamento
+aconteçam de forma atômica, mesmo com vários usuários do bot e clientes
+da API reservando o mesmo horário ao mesmo tempo.
+
+- PostgreSQL: bloqueia a linha do profissional (SELECT ... FOR UPDATE)
+  até o fim da transação; a constraint de exclusão em appointments é a
+  garantia final.
+- SQLite: serializa as reservas do profissional no processo e adquire a
+  trava de escrita do banco antes da checagem, o que também serializa
+  processos diferentes usando o mesmo arquivo.
+
+Código assíncrono deve envolver a reserva com async_booking_guard: a trava
+de thread não pode ser disputada por duas corrotinas do mesmo event loop,
+nem esperada no event loop enquanto uma reserva do bot (numa thread) a
+segura aguardando a trava de escrita do SQLite, que pode estar com uma
+transação do aiosqlite que só termina se o loop andar. O guard adquire a
+trava de thread numa thread auxiliar e booking_lock, dentro dele, não a
+adquire de novo.
+"""
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, FrozenSet
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.models import ProfessionalProfile
+
+_locks: Dict[int, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_async_locks: Dict[int, asyncio.Lock] = {}
+
+# Profissionais cuja trava de thread já foi adquirida por async_booking_guard
+# na tarefa atual (visível dentro de run_sync)
+_held_locks: ContextVar[FrozenSet[int]] = ContextVar("held_booking_locks", default=frozenset())
+
+
+def _process_lock(professional_id: int) -> threading.Lock:
+    """Retorna a trava local do profissional, criando se necessário"""
+    with _locks_guard:
+        lock = _locks.get(professional_id)
+        if lock is None:
+            lock = _locks[professional_id] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def booking_lock(db: Session, professional_id: int):
+    """
+    Serializa reservas de um profissional
+
+    O commit (ou rollback) da sessão deve acontecer dentro do bloco para
+    que a trava cubra a transação inteira.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        if professional_id in _held_locks.get():
+            # Já adquirida por async_booking_guard, fora do event loop
+            _begin_write(db, professional_id)
+            yield
+            return
+
+        with _process_lock(professional_id):
+            _begin_write(db, professional_id)
+            yield
+    else:
+        db.query(ProfessionalProfile.id).filter(
+            ProfessionalProfile.id == professional_id
+        ).with_for_update().first()
+        yield
+
+
+def _begin_write(db: Session, professional_id: int):
+    """
+    UPDATE inócuo: abre a transação de escrita já com a trava RESERVED do
+    SQLite, antes de qualquer leitura de conflitos
+    """
+    db.execute(
+        update(ProfessionalProfile)
+        .where(ProfessionalProfile.id == professional_id)
+        .values(id=ProfessionalProfile.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _acquire_off_loop(lock: threading.Lock):
+    """Adquire a trava de thread numa thread auxiliar, sem bloquear o event loop"""
+    acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # A thread continua esperando: libera a trava assim que ela for obtida
+        def release(task: asyncio.Future):
+            if not task.cancelled() and task.exception() is None:
+                lock.release()
+
+        acquiring.add_done_callback(release)
+        raise
+
+
+@asynccontextmanager
+async def async_booking_guard(db: AsyncSession, professional_id: int):
+    """Serializa, no event loop, reservas assíncronas de um profissional"""
+    lock = _async_locks.get(professional_id)
+    if lock is None:
+        lock = _async_locks[professional_id] = asyncio.Lock()
+    async with lock:
+        if db.get_bind().dialect.name != "sqlite":
+            yield
+            return
+
+        process_lock = _process_lock(professional_id)
+        await _acquire_off_loop(process_lock)
+        token = _held_locks.set(_held_locks.get() | {professional_id})
+        try:
+            yield
+        finally:
+            _held_locks.reset(token)
+            process_lock.release()
@@ -0,0 +1,149 @@
+"""
+Lançamentos financeiros dos atendimentos
+
+Cada atendimento completado gera um FinancialRecord com o preço
+gravado na reserva (Appointment.service_price) dividido entre a comissão do profissional
+(ProfessionalProfile.commission_percentage) e a receita do negócio.
+O fechamento do dia liquida em lote, com um único INSERT ... SELECT,
+todos os atendimentos completados que ainda não têm lançamento.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List
+
+from sqlalchemy import Numeric, and_, cast, exists, func, insert, literal
+from sqlalchemy.orm import Session
+
+from app.db.models import (
+    Appointment, AppointmentStatus, FinancialRecord,
+    ProfessionalProfile, User
+)
+
+# Mesmo padrão de ProfessionalProfile.commission_percentage
+DEFAULT_COMMISSION_PERCENTAGE = 50.0
+
+SETTLEMENT_NOTE = "Fechamento do dia"
+
+
+class FinancialService:
+    """Serviço para lançamentos financeiros e repasses"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_completion(self, appointment: Appointment) -> FinancialRecord:
+        """
+        Gera o lançamento de um atendimento completado
+
+        Idempotente: se o atendimento já tem lançamento, retorna o existente.
+        Não faz commit: roda na transação de quem completou o atendimento.
+        """
+        record = self.db.query(FinancialRecord).filter_by(
+            appointment_id=appointment.id
+        ).first()
+        if record:
+            return record
+
+        price = appointment.service_price
+        percentage = appointment.professional.commission_percentage
+        if percentage is None:
+            percentage = DEFAULT_COMMISSION_PERCENTAGE
+
+        commission = round(price * percentage / 100, 2)
+
+        record = FinancialRecord(
+            appointment_id=appointment.id,
+            professional_id=appointment.professional_id,
+            service_price=price,
+            professional_commission=commission,
+            business_revenue=round(price - commission, 2),
+            date=appointment.scheduled_date
+        )
+        self.db.add(record)
+
+        return record
+
+    def close_day(self, day: date) -> int:
+        """
+        Liquida todos os atendimentos completados do dia sem lançamento
+
+        Um único INSERT ... SELECT calcula comissão e receita no banco.
+        Faz commit e retorna a quantidade de lançamentos criados.
+        """
+        day_start = datetime.combine(day, time.min)
+        day_end = day_start + timedelta(days=1)
+
+        percentage = func.coalesce(
+            ProfessionalProfile.commission_percentage, DEFAULT_COMMISSION_PERCENTAGE
+        )
+        # round(x, casas) só existe para numeric no PostgreSQL (não para double precision)
+        commission = func.round(cast(Appointment.service_price * percentage / 100, Numeric), 2)
+        revenue = func.round(cast(Appointment.service_price - commission, Numeric), 2)
+
+        already_settled = exists().where(FinancialRecord.appointment_id == Appointment.id)
+
+        select_query = self.db.query(
+            Appointment.id,
+            Appointment.professional_id,
+            Appointment.service_price,
+            commission,
+            revenue,
+            Appointment.scheduled_date,
+            literal(SETTLEMENT_NOTE)
+        ).join(
+            ProfessionalProfile, Appointment.professional_id == ProfessionalProfile.id
+        ).filter(
+            and_(
+                Appointment.status == AppointmentStatus.COMPLETED,
+                Appointment.scheduled_date >= day_start,
+                Appointment.scheduled_date < day_end,
+                ~already_settled
+            )
+        )
+
+        result = self.db.execute(
+            insert(FinancialRecord).from_select(
+                [
+                    "appointment_id", "professional_id", "service_price",
+                    "professional_commission", "business_revenue", "date", "notes"
+                ],
+                select_query.statement
+            )
+        )
+        self.db.commit()
+
+        return result.rowcount
+
+    def get_payouts(self, start: date, end: date) -> List[Dict]:
+        """Retorna o total a repassar por profissional nos dias em [start, end)"""
+        rows = self.db.query(
+            FinancialRecord.professional_id,
+            User.name,
+            func.count(FinancialRecord.id),
+            func.sum(FinancialRecord.service_price),
+            func.sum(FinancialRecord.professional_commission),
+            func.sum(FinancialRecord.business_revenue)
+        ).join(
+            ProfessionalProfile, FinancialRecord.professional_id == ProfessionalProfile.id
+        ).join(
+            User, ProfessionalProfile.user_id == User.id
+        ).filter(
+            FinancialRecord.date >= datetime.combine(start, time.min),
+            FinancialRecord.date < datetime.combine(end, time.min)
+        ).group_by(
+            FinancialRecord.professional_id, User.name
+        ).order_by(
+            FinancialRecord.professional_id
+        ).all()
+
+        return [
+            {
+                "professional_id": prof_id,
+                "professional_name": name,
+                "appointments": count,
+                "gross_revenue": float(gross),
+                "professional_commission": float(commission),
+                "business_revenue": float(revenue)
+            }
+            for prof_id, name, count, gross, commission, revenue in rows
+        ]
@@ -0,0 +1,188 @@
+"""
+Cache da análise de intenção
+
+A análise de intenção depende apenas do texto da mensagem: mensagens
+repetidas ("quero marcar um horário") reaproveitam a resposta da IA.
+
+- chave: texto normalizado (minúsculas, sem acentos nem pontuação) e a
+  data do dia, pois "amanhã" vira uma data absoluta na resposta;
+- memória: LRU limitada a AI_INTENT_CACHE_SIZE entradas, com validade de
+  AI_INTENT_CACHE_TTL_SECONDS;
+- persistência opcional em SQLite (AI_INTENT_CACHE_PATH), que sobrevive a
+  reinícios e é compartilhada pelos workers da mesma máquina.
+
+No event loop use aget/aset: a leitura e a gravação no SQLite (com fsync
+no commit) rodam numa thread. A espera pela trava do arquivo, disputado
+pelos workers, é curta (AI_INTENT_CACHE_TIMEOUT_SECONDS); se estourar, a
+leitura conta como falta e a gravação é descartada.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.core.intent_classifier import normalize
+
+logger = logging.getLogger(__name__)
+
+# Gravações entre limpezas das entradas vencidas no SQLite
+PURGE_EVERY = 200
+
+
+def cache_key(message: str, today: Optional[date] = None) -> str:
+    """Chave da mensagem: texto normalizado e sem pontuação, mais a data do dia"""
+    text = " ".join(re.sub(r"[^\w\s/:]", " ", normalize(message)).split())
+    return f"{(today or date.today()).isoformat()}|{text}"
+
+
+class IntentCache:
+    """LRU com validade para análises de intenção, opcionalmente persistida em SQLite"""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        path: Optional[str] = None
+    ):
+        self.max_entries = max_entries or settings.AI_INTENT_CACHE_SIZE
+        self.ttl_seconds = ttl_seconds or settings.AI_INTENT_CACHE_TTL_SECONDS
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()  # A conexão é usada por threads diferentes
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+
+        path = settings.AI_INTENT_CACHE_PATH if path is None else path
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(
+                path,
+                timeout=settings.AI_INTENT_CACHE_TIMEOUT_SECONDS,
+                check_same_thread=False
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS intent_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, message: str) -> Optional[Dict]:
+        """Retorna a análise em cache da mensagem, se ainda válida"""
+        key = cache_key(message)
+        entry = self._memory_entry(key)
+        if entry is None and self._db is not None:
+            entry = self._load(key)
+        return self._account(key, entry)
+
+    async def aget(self, message: str) -> Optional[Dict]:
+        """Como get, com a leitura do SQLite numa thread"""
+        key = cache_key(message)
+        entry = self._memory_entry(key)
+        if entry is None and self._db is not None:
+            entry = await asyncio.to_thread(self._load, key)
+        return self._account(key, entry)
+
+    def set(self, message: str, result: Dict):
+        """Guarda a análise da mensagem"""
+        key, entry = self._remember(message, result)
+        if self._db is not None:
+            self._persist(key, entry)
+
+    async def aset(self, message: str, result: Dict):
+        """Como set, com a gravação no SQLite numa thread"""
+        key, entry = self._remember(message, result)
+        if self._db is not None:
+            await asyncio.to_thread(self._persist, key, entry)
+
+    def stats(self) -> Dict:
+        """Acertos, falhas, taxa de acerto e tamanho do cache em memória"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0,
+                "size": len(self._entries)
+            }
+
+    def clear(self):
+        """Descarta todas as entradas (memória e SQLite)"""
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM intent_cache")
+                self._db.commit()
+
+    def _memory_entry(self, key: str) -> Optional[Tuple[float, Dict]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def _account(self, key: str, entry: Optional[Tuple[float, Dict]]) -> Optional[Dict]:
+        """Conta acerto ou falta; entradas válidas (também as do SQLite) ficam na memória"""
+        with self._lock:
+            if entry is None or entry[0] <= time.time():
+                if entry is not None and self._entries.get(key) is entry:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+
+            self._store(key, entry)
+            self._hits += 1
+            return dict(entry[1])
+
+    def _remember(self, message: str, result: Dict) -> Tuple[str, Tuple[float, Dict]]:
+        key = cache_key(message)
+        entry = (time.time() + self.ttl_seconds, dict(result))
+        with self._lock:
+            self._store(key, entry)
+        return key, entry
+
+    def _store(self, key: str, entry: Tuple[float, Dict]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _persist(self, key: str, entry: Tuple[float, Dict]):
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO intent_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(entry[1]), entry[0])
+                )
+                # Limpa as vencidas de tempos em tempos, não a cada gravação
+                self._writes += 1
+                if self._writes % PURGE_EVERY == 0:
+                    self._db.execute("DELETE FROM intent_cache WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.warning(f"Falha ao gravar cache de intenções: {e}")
+
+    def _load(self, key: str) -> Optional[Tuple[float, Dict]]:
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM intent_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Falha ao ler cache de intenções: {e}")
+            return None
+
+        if row is None:
+            return None
+        return row[1], json.loads(row[0])
+
+
+# Instância global do cache de intenções
+intent_cache = IntentCache()
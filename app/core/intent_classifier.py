@@ -0,0 +1,231 @@
+"""
+Pré-classificador local de intenção
+
+Resolve mensagens óbvias ("cancelar", "oi", "quero agendar corte amanhã
+às 15h") com palavras-chave e expressões regulares, sem chamar a IA. O
+resultado tem o mesmo formato de AIService.analyze_appointment_request;
+quando a mensagem é ambígua, classify retorna None e a análise segue
+para a IA. Os contadores de acertos ficam disponíveis em stats().
+"""
+
+import logging
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Mensagens maiores costumam misturar pedidos: ficam com a IA
+MAX_WORDS = 14
+
+# Frequência do log de taxa de acerto
+LOG_EVERY = 500
+
+INTENT_KEYWORDS = {
+    "cancel": re.compile(r"\b(cancelar?|cancelamento|desmarcar?)\b"),
+    # Só verbos: "meu agendamento" fala de uma reserva que já existe.
+    # "agenda"/"marca"/"reserva" também são substantivos ("qual marca de
+    # shampoo"): só contam seguidos de um complemento de agendamento
+    "schedule": re.compile(
+        r"\b(agendar|agendo|agende|agendamos|marcar|reservar|horarios? (livres?|disponive(l|is)))\b|"
+        r"\b(agenda|marca|marque|reserva|reserve) (um|uma|pra|para|meu|minha|horario|hora)\b"
+    ),
+    "info": re.compile(
+        r"\b(precos?|quanto custa|valor(es)?|endereco|onde fica|"
+        r"funcionamento|que horas (abre|fecha)|quais servicos|servicos)\b"
+    ),
+}
+
+# Pedidos que a regra não distingue com segurança (ex.: remarcar = cancelar + agendar)
+AMBIGUOUS = re.compile(r"\b(nao|remarcar?|reagendar?|trocar|mudar|outro|outra)\b")
+
+GREETING = re.compile(
+    r"^(oi+|ola|opa|e ai|bom dia|boa tarde|boa noite|tudo bem|obrigad[oa]|valeu|ok|blz)"
+    r"( (tudo bem|td bem|obrigad[oa]))?$"
+)
+
+WEEKDAYS = {
+    "segunda": 0, "terca": 1, "quarta": 2, "quinta": 3,
+    "sexta": 4, "sabado": 5, "domingo": 6,
+}
+
+DATE_PATTERN = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b")
+WEEKDAY_PATTERN = re.compile(r"\b(" + "|".join(WEEKDAYS) + r")(?:-feira)?\b")
+TIME_PATTERN = re.compile(
+    r"\b(\d{1,2})(?:h|:)(\d{2})?(?:min)?\b|\bas (\d{1,2})\b(?!:)|\b(\d{1,2}) da (?:manha|tarde|noite)\b"
+)
+AFTERNOON = re.compile(r"\bda (tarde|noite)\b")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.split())
+
+
+def parse_date(text: str, now: datetime) -> Optional[str]:
+    """Extrai uma data (YYYY-MM-DD) de texto normalizado"""
+    if "depois de amanha" in text:
+        return (now + timedelta(days=2)).strftime("%Y-%m-%d")
+    if re.search(r"\bamanha\b", text):
+        return (now + timedelta(days=1)).strftime("%Y-%m-%d")
+    if re.search(r"\bhoje\b", text):
+        return now.strftime("%Y-%m-%d")
+
+    match = DATE_PATTERN.search(text)
+    if match:
+        day, month, year = match.groups()
+        year = int(year) if year else now.year
+        if year < 100:
+            year += 2000
+        try:
+            parsed = datetime(year, int(month), int(day))
+        except ValueError:
+            return None
+        # Sem ano e já passou: próximo ano
+        if not match.group(3) and parsed.date() < now.date():
+            parsed = parsed.replace(year=year + 1)
+        return parsed.strftime("%Y-%m-%d")
+
+    match = WEEKDAY_PATTERN.search(text)
+    if match:
+        days_ahead = (WEEKDAYS[match.group(1)] - now.weekday()) % 7 or 7
+        return (now + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
+
+    return None
+
+
+def parse_time(text: str) -> Optional[str]:
+    """Extrai um horário (HH:MM) de texto normalizado"""
+    for match in TIME_PATTERN.finditer(text):
+        hour = int(match.group(1) or match.group(3) or match.group(4))
+        minute = int(match.group(2) or 0)
+
+        # "3 da tarde" -> 15h
+        if hour < 12 and AFTERNOON.search(text):
+            hour += 12
+
+        if hour <= 23 and minute <= 59:
+            return f"{hour:02d}:{minute:02d}"
+
+    return None
+
+
+def within_business_hours(hhmm: str) -> bool:
+    """Horário (HH:MM) dentro do expediente do estabelecimento"""
+    return settings.BUSINESS_HOURS_START <= hhmm < settings.BUSINESS_HOURS_END
+
+
+class IntentClassifier:
+    """Classificação de intenção por regras, com contadores de acerto"""
+
+    def __init__(self):
+        self._hits: Dict[str, int] = {}
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def classify(
+        self,
+        message: str,
+        service_names: Iterable[str] = (),
+        now: Optional[datetime] = None
+    ) -> Optional[Dict]:
+        """
+        Classifica a mensagem se houver alta confiança
+
+        Retorna o dicionário da análise de intenção ou None para delegar à IA.
+        """
+        result = self._classify(normalize(message), list(service_names), now or datetime.now())
+        self._record(result)
+        return result
+
+    def stats(self) -> Dict:
+        """Acertos por intenção, mensagens delegadas à IA e taxa de acerto"""
+        with self._lock:
+            hits = sum(self._hits.values())
+            total = hits + self._misses
+            return {
+                "total": total,
+                "hits": dict(self._hits),
+                "misses": self._misses,
+                "hit_rate": hits / total if total else 0.0
+            }
+
+    def _classify(self, text: str, service_names: List[str], now: datetime) -> Optional[Dict]:
+        if not text or len(text.split()) > MAX_WORDS or AMBIGUOUS.search(text):
+            return None
+
+        if GREETING.match(re.sub(r"[^\w\s]", "", text).strip()):
+            return self._result("other")
+
+        intents = [intent for intent, pattern in INTENT_KEYWORDS.items() if pattern.search(text)]
+        service = self._match_service(text, service_names)
+
+        # Só um serviço com "quero ..." também é pedido de agendamento
+        if not intents and service and re.match(r"^(quero|queria|gostaria de|preciso de?)\b", text):
+            intents = ["schedule"]
+
+        # Agendar + serviços: "quais serviços posso agendar?" é pedido de informação
+        if set(intents) == {"schedule", "info"} and not (service or parse_date(text, now)):
+            intents = ["info"]
+
+        if len(intents) != 1:
+            return None
+
+        intent = intents[0]
+        if intent != "schedule":
+            return self._result(intent)
+
+        time_mentioned = parse_time(text)
+        # "às 3" fora do expediente: 3h ou 15h? A IA decide pelo contexto
+        if time_mentioned and not within_business_hours(time_mentioned):
+            return None
+
+        return self._result(
+            intent,
+            service_mentioned=service,
+            date_mentioned=parse_date(text, now),
+            time_mentioned=time_mentioned
+        )
+
+    def _match_service(self, text: str, service_names: List[str]) -> Optional[str]:
+        """Serviço citado na mensagem; o nome mais longo vence ("corte e barba" > "corte")"""
+        found = [
+            name for name in service_names
+            if re.search(r"\b" + re.escape(normalize(name)) + r"\b", text)
+        ]
+        return max(found, key=len) if found else None
+
+    def _result(self, intent: str, **entities) -> Dict:
+        return {
+            "intent": intent,
+            "service_mentioned": entities.get("service_mentioned"),
+            "professional_mentioned": None,
+            "date_mentioned": entities.get("date_mentioned"),
+            "time_mentioned": entities.get("time_mentioned"),
+            "source": "rules"
+        }
+
+    def _record(self, result: Optional[Dict]):
+        with self._lock:
+            if result is None:
+                self._misses += 1
+            else:
+                self._hits[result["intent"]] = self._hits.get(result["intent"], 0) + 1
+            total = sum(self._hits.values()) + self._misses
+
+        if total % LOG_EVERY == 0:
+            stats = self.stats()
+            logger.info(
+                f"🧭 Pré-classificador: {stats['hit_rate']:.0%} de acertos "
+                f"em {stats['total']} mensagens"
+            )
+
+
+# Instância global do pré-classificador
+intent_classifier = IntentClassifier()
@@ -0,0 +1,276 @@
+"""
+Fila de prazos de lembretes
+
+Heap em memória com os prazos (data do agendamento - antecedência) dos
+lembretes ainda não enviados, carregado sob demanda apenas para os
+agendamentos das próximas REMINDER_QUEUE_HORIZON_HOURS horas de prazos:
+
+- refill estende o horizonte de forma incremental, lendo só as datas
+  ainda não carregadas e os agendamentos criados por outras instâncias;
+- pop_due retira apenas os prazos vencidos, então cada verificação custa
+  O(lembretes vencidos) e não O(tabela);
+- criações, cancelamentos e reagendamentos feitos por qualquer sessão do
+  processo atualizam a fila no commit, pelos eventos do ORM.
+
+Remoções são preguiçosas: a entrada fica no heap e é descartada ao sair
+se não corresponder mais ao prazo registrado do agendamento.
+"""
+
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.db.models import Appointment, AppointmentStatus
+from app.core.reminder_service import reminder_kinds
+
+# Status que recebem lembretes (mesmos que ocupam a agenda)
+REMINDER_STATUSES = (AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED)
+
+# (id, data, status, alert_24h_sent, alert_1h_sent)
+AppointmentRow = Tuple[int, datetime, AppointmentStatus, Optional[bool], Optional[bool]]
+
+
+class ReminderQueue:
+    """Prazos de lembretes pendentes, ordenados em um heap"""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._deadlines: Dict[Tuple[int, str], datetime] = {}
+        self._scheduled: Dict[int, datetime] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._max_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_until is not None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def horizon(self, now: datetime) -> datetime:
+        """Data limite dos agendamentos mantidos na fila"""
+        longest_lead = max(lead for _, _, lead in reminder_kinds())
+        return now + longest_lead + timedelta(hours=settings.REMINDER_QUEUE_HORIZON_HOURS)
+
+    def reset(self):
+        """Esvazia a fila; o próximo refill recarrega o horizonte inteiro"""
+        with self._lock:
+            self._heap.clear()
+            self._deadlines.clear()
+            self._scheduled.clear()
+            self._loaded_until = None
+            self._max_id = 0
+
+    def refill(self, db: Session, now: datetime):
+        """
+        Estende o horizonte até horizon(now)
+
+        Na primeira carga lê os agendamentos de agora até o horizonte; depois,
+        apenas a faixa de datas nova e os ids acima do maior já visto
+        (agendamentos criados por outras instâncias).
+        """
+        until = self.horizon(now)
+        start = self._loaded_until or now
+
+        rows = []
+        if until > start:
+            rows.extend(self._query(db).filter(
+                Appointment.scheduled_date > start,
+                Appointment.scheduled_date <= until
+            ).all())
+
+        if self.loaded:
+            rows.extend(self._query(db).filter(
+                Appointment.id > self._max_id,
+                Appointment.scheduled_date > now,
+                Appointment.scheduled_date <= until
+            ).all())
+
+        with self._lock:
+            self._loaded_until = max(until, self._loaded_until or until)
+            for row in rows:
+                self._apply(row)
+                self._max_id = max(self._max_id, row[0])
+
+    def apply_changes(self, rows: Iterable[AppointmentRow]):
+        """Atualiza a fila com o estado de agendamentos gravados"""
+        if not self.loaded:
+            return
+
+        with self._lock:
+            for row in rows:
+                self._apply(row)
+            self._compact()
+
+    def discard(self, appointment_ids: Iterable[int]):
+        """Remove todos os lembretes dos agendamentos"""
+        with self._lock:
+            for appointment_id in appointment_ids:
+                self._remove(appointment_id)
+
+    def pop_due(self, now: datetime, limit: int) -> Dict[str, List[int]]:
+        """
+        Retira até limit lembretes vencidos, agrupados por tipo
+
+        Lembretes cuja janela já passou (o próximo tipo já venceu) são
+        descartados: quem agenda em cima da hora recebe só o mais próximo.
+        """
+        floors = self._floors()
+        due: Dict[str, List[int]] = {}
+        count = 0
+
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and count < limit:
+                deadline, appointment_id, kind = heapq.heappop(self._heap)
+                if self._deadlines.get((appointment_id, kind)) != deadline:
+                    continue  # Entrada obsoleta
+
+                del self._deadlines[(appointment_id, kind)]
+                if self._scheduled[appointment_id] <= now + floors[kind]:
+                    continue
+
+                due.setdefault(kind, []).append(appointment_id)
+                count += 1
+
+            self._compact()
+
+        return due
+
+    def retry(self, kind: str, appointments: Iterable[Tuple[int, datetime]], at: datetime):
+        """Recoloca lembretes (id, data do agendamento) não entregues para nova tentativa em at"""
+        with self._lock:
+            for appointment_id, scheduled_date in appointments:
+                self._scheduled[appointment_id] = scheduled_date
+                self._push(appointment_id, kind, at)
+
+    def next_deadline(self) -> Optional[datetime]:
+        """Prazo mais próximo na fila (pode ser de uma entrada obsoleta)"""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def _query(self, db: Session):
+        return db.query(
+            Appointment.id,
+            Appointment.scheduled_date,
+            Appointment.status,
+            Appointment.alert_24h_sent,
+            Appointment.alert_1h_sent
+        ).filter(
+            Appointment.status.in_(REMINDER_STATUSES)
+        )
+
+    def _apply(self, row: AppointmentRow):
+        """Substitui os lembretes de um agendamento pelo seu estado atual"""
+        appointment_id, scheduled_date, status, *sent_flags = row
+        self._remove(appointment_id)
+
+        if status not in REMINDER_STATUSES or scheduled_date > self._loaded_until:
+            return
+
+        sent = dict(zip(("alert_24h_sent", "alert_1h_sent"), sent_flags))
+        pending = [
+            (kind, scheduled_date - lead)
+            for kind, flag, lead in reminder_kinds()
+            if not sent.get(flag)
+        ]
+        if not pending:
+            return
+
+        self._scheduled[appointment_id] = scheduled_date
+        for kind, deadline in pending:
+            self._push(appointment_id, kind, deadline)
+
+    def _push(self, appointment_id: int, kind: str, deadline: datetime):
+        self._deadlines[(appointment_id, kind)] = deadline
+        heapq.heappush(self._heap, (deadline, appointment_id, kind))
+
+    def _remove(self, appointment_id: int):
+        for key in self._pending_keys(appointment_id):
+            del self._deadlines[key]
+        self._scheduled.pop(appointment_id, None)
+
+    def _pending_keys(self, appointment_id: int) -> List[Tuple[int, str]]:
+        return [
+            (appointment_id, kind)
+            for kind, _, _ in reminder_kinds()
+            if (appointment_id, kind) in self._deadlines
+        ]
+
+    def _compact(self):
+        """Reconstrói o heap quando as entradas obsoletas passam das válidas"""
+        if len(self._heap) <= 2 * len(self._deadlines) + 64:
+            return
+
+        self._heap = [
+            (deadline, appointment_id, kind)
+            for (appointment_id, kind), deadline in self._deadlines.items()
+        ]
+        heapq.heapify(self._heap)
+
+        pending = {appointment_id for appointment_id, _ in self._deadlines}
+        self._scheduled = {
+            appointment_id: scheduled_date
+            for appointment_id, scheduled_date in self._scheduled.items()
+            if appointment_id in pending
+        }
+
+    def _floors(self) -> Dict[str, timedelta]:
+        """Antecedência do lembrete seguinte de cada tipo"""
+        kinds = reminder_kinds()
+        return {
+            name: kinds[position + 1][2] if position + 1 < len(kinds) else timedelta(0)
+            for position, (name, _, _) in enumerate(kinds)
+        }
+
+
+# Instância global da fila de lembretes
+reminder_queue = ReminderQueue()
+
+
+def _appointment_changed(mapper, connection, target: Appointment):
+    """Guarda o estado gravado do agendamento para aplicar após o commit"""
+    session = object_session(target)
+    if session is None or not reminder_queue.loaded:
+        return
+
+    session.info.setdefault("reminder_queue_changed", {})[target.id] = (
+        target.id,
+        target.scheduled_date,
+        target.status,
+        target.alert_24h_sent,
+        target.alert_1h_sent
+    )
+
+
+def _appointment_deleted(mapper, connection, target: Appointment):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("reminder_queue_deleted", set()).add(target.id)
+
+
+for _event in ("after_insert", "after_update"):
+    event.listen(Appointment, _event, _appointment_changed)
+event.listen(Appointment, "after_delete", _appointment_deleted)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session):
+    changed = session.info.pop("reminder_queue_changed", None)
+    if changed:
+        reminder_queue.apply_changes(changed.values())
+
+    deleted = session.info.pop("reminder_queue_deleted", None)
+    if deleted:
+        reminder_queue.discard(deleted)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop("reminder_queue_changed", None)
+    session.info.pop("reminder_queue_deleted", None)
@@ -0,0 +1,204 @@
+"""
+Lembretes de agendamento
+
+Consultas e atualizações usadas pelo agendador de lembretes:
+
+- get_due_reminders lê, pelo índice (status, scheduled_date) ou pelos ids
+  vindos da fila de prazos, os agendamentos ativos dentro da janela de
+  cada lembrete ainda não enviado;
+- claim reivindica os lembretes antes do envio com um UPDATE condicional
+  (flag ainda não marcada): só uma instância consegue cada linha, mesmo
+  que a lease expire no meio de um lote;
+- release devolve os reivindicados que falharam temporariamente;
+- acquire_lease / release_lease implementam a liderança entre instâncias:
+  apenas quem detém a lease "reminders" procura lembretes vencidos.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, true, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from app.config import settings
+from app.core.appointment_service import ACTIVE_STATUSES
+from app.db.models import (
+    Appointment, ClientProfile, ProfessionalProfile,
+    SchedulerLease, Service, User
+)
+
+REMINDER_LEASE = "reminders"
+
+
+def reminder_kinds() -> List[Tuple[str, str, timedelta]]:
+    """Tipos de lembrete (nome, flag em Appointment, antecedência), do mais antecipado ao mais próximo"""
+    return [
+        ("24h", "alert_24h_sent", timedelta(hours=settings.ALERT_BEFORE_APPOINTMENT_HOURS)),
+        ("1h", "alert_1h_sent", timedelta(minutes=settings.REMINDER_BEFORE_APPOINTMENT_MINUTES)),
+    ]
+
+
+def reminder_window(kind: str, now: datetime) -> Tuple[datetime, datetime, str]:
+    """
+    Retorna (início, fim, flag) da janela de um tipo de lembrete
+
+    A janela vai da antecedência do próximo lembrete até a do próprio:
+    quem agenda em cima da hora recebe só o lembrete mais próximo.
+    """
+    kinds = reminder_kinds()
+    for position, (name, flag, lead) in enumerate(kinds):
+        if name == kind:
+            floor = kinds[position + 1][2] if position + 1 < len(kinds) else timedelta(0)
+            return now + floor, now + lead, flag
+
+    raise ValueError(f"Tipo de lembrete inválido: {kind}")
+
+
+class ReminderService:
+    """Serviço para lembretes de agendamentos"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_due_reminders(
+        self,
+        kind: str,
+        now: Optional[datetime] = None,
+        limit: int = 200,
+        appointment_ids: Optional[List[int]] = None
+    ) -> List[Dict]:
+        """
+        Retorna os lembretes pendentes do tipo, já com os dados da mensagem
+
+        appointment_ids restringe a consulta aos agendamentos retirados da
+        fila de prazos; a janela e a flag continuam sendo conferidas, o que
+        descarta entradas que ficaram obsoletas.
+        """
+        start, end, flag = reminder_window(kind, now or datetime.now())
+
+        client_user = aliased(User)
+        professional_user = aliased(User)
+
+        rows = self.db.query(
+            Appointment.id,
+            Appointment.scheduled_date,
+            client_user.telegram_id,
+            client_user.name,
+            Service.name,
+            professional_user.name
+        ).join(
+            ClientProfile, Appointment.client_id == ClientProfile.id
+        ).join(
+            client_user, ClientProfile.user_id == client_user.id
+        ).join(
+            Service, Appointment.service_id == Service.id
+        ).join(
+            ProfessionalProfile, Appointment.professional_id == ProfessionalProfile.id
+        ).join(
+            professional_user, ProfessionalProfile.user_id == professional_user.id
+        ).filter(
+            and_(
+                Appointment.id.in_(appointment_ids) if appointment_ids is not None else true(),
+                Appointment.status.in_(ACTIVE_STATUSES),
+                Appointment.scheduled_date > start,
+                Appointment.scheduled_date <= end,
+                getattr(Appointment, flag).isnot(True)
+            )
+        ).order_by(
+            Appointment.scheduled_date
+        ).limit(limit).all()
+
+        return [
+            {
+                "appointment_id": appointment_id,
+                "scheduled_date": scheduled_date,
+                "telegram_id": telegram_id,
+                "client_name": client_name,
+                "service_name": service_name,
+                "professional_name": professional_name
+            }
+            for (
+                appointment_id, scheduled_date, telegram_id,
+                client_name, service_name, professional_name
+            ) in rows
+        ]
+
+    def claim(self, kind: str, appointment_ids: List[int]) -> List[int]:
+        """
+        Marca os lembretes como enviados antes do envio; retorna os reivindicados
+
+        O UPDATE só altera linhas cuja flag ainda não foi marcada, então um
+        lembrete reivindicado por outra instância não é enviado de novo.
+        """
+        if not appointment_ids:
+            return []
+
+        _, _, flag = reminder_window(kind, datetime.now())
+        column = getattr(Appointment, flag)
+
+        claimed = self.db.execute(
+            update(Appointment)
+            .where(Appointment.id.in_(appointment_ids), column.isnot(True))
+            .values({flag: True})
+            .returning(Appointment.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        self.db.commit()
+
+        return list(claimed)
+
+    def release(self, kind: str, appointment_ids: List[int]) -> int:
+        """Desfaz a reivindicação de lembretes que falharam temporariamente"""
+        if not appointment_ids:
+            return 0
+
+        _, _, flag = reminder_window(kind, datetime.now())
+
+        updated = self.db.query(Appointment).filter(
+            Appointment.id.in_(appointment_ids)
+        ).update({flag: False}, synchronize_session=False)
+        self.db.commit()
+
+        return updated
+
+    def acquire_lease(self, owner: str, ttl_seconds: int, name: str = REMINDER_LEASE) -> bool:
+        """
+        Adquire ou renova a lease da tarefa
+
+        O UPDATE condicional é atômico: só assume quem já é dono ou
+        encontra a lease expirada. Retorna se a instância é a líder.
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl_seconds)
+
+        updated = self.db.query(SchedulerLease).filter(
+            SchedulerLease.name == name,
+            or_(SchedulerLease.owner == owner, SchedulerLease.expires_at < now)
+        ).update({"owner": owner, "expires_at": expires_at}, synchronize_session=False)
+
+        if updated:
+            self.db.commit()
+            return True
+
+        if self.db.query(SchedulerLease.name).filter(SchedulerLease.name == name).first():
+            self.db.rollback()
+            return False
+
+        try:
+            self.db.add(SchedulerLease(name=name, owner=owner, expires_at=expires_at))
+            self.db.commit()
+        except IntegrityError:
+            # Outra instância criou a lease ao mesmo tempo
+            self.db.rollback()
+            return False
+
+        return True
+
+    def release_lease(self, owner: str, name: str = REMINDER_LEASE):
+        """Libera a lease para que outra instância assuma imediatamente"""
+        self.db.query(SchedulerLease).filter(
+            SchedulerLease.name == name,
+            SchedulerLease.owner == owner
+        ).delete(synchronize_session=False)
+        self.db.commit()
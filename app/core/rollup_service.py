@@ -0,0 +1,238 @@
+"""
+Rollup diário de agendamentos e faturamento
+
+A tabela appointment_daily_rollups guarda, por (data, profissional,
+serviço, status), a quantidade de agendamentos e a soma dos preços
+gravados na reserva (Appointment.service_price), de modo que mudar o
+preço de um serviço não altera os totais já contabilizados.
+O AppointmentService atualiza os contadores na mesma transação de cada
+mudança de status, então relatórios de meses inteiros leem algumas
+centenas de linhas em vez de varrer appointments.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import (
+    Appointment, AppointmentDailyRollup, AppointmentStatus,
+    ProfessionalProfile, User
+)
+
+
+def summarize_status_totals(totals: Dict) -> Dict:
+    """Monta o resumo de estatísticas a partir de {status: (quantidade, soma dos preços)}"""
+
+    def count(status: AppointmentStatus) -> int:
+        return totals.get(status, (0, 0.0))[0]
+
+    total = sum(status_count for status_count, _ in totals.values())
+    completed = count(AppointmentStatus.COMPLETED)
+
+    return {
+        "total_appointments": total,
+        "completed": completed,
+        "cancelled": count(AppointmentStatus.CANCELLED),
+        "no_shows": count(AppointmentStatus.NO_SHOW),
+        "scheduled": count(AppointmentStatus.SCHEDULED),
+        "revenue": float(totals.get(AppointmentStatus.COMPLETED, (0, 0.0))[1]),
+        "completion_rate": (completed / total * 100) if total > 0 else 0
+    }
+
+
+def build_statistics(rows, by_professional: bool = False) -> Dict:
+    """
+    Monta as estatísticas a partir de linhas agregadas por status
+
+    Linhas no formato (status, quantidade, soma dos preços) ou, com
+    by_professional, (professional_id, nome, status, quantidade, soma).
+    """
+    if not by_professional:
+        return summarize_status_totals({
+            row_status: (count, price_sum) for row_status, count, price_sum in rows
+        })
+
+    totals = {}
+    per_professional = defaultdict(dict)
+    names = {}
+
+    for prof_id, prof_name, row_status, count, price_sum in rows:
+        names[prof_id] = prof_name
+        per_professional[prof_id][row_status] = (count, price_sum)
+        total_count, total_sum = totals.get(row_status, (0, 0.0))
+        totals[row_status] = (total_count + count, total_sum + price_sum)
+
+    stats = summarize_status_totals(totals)
+    stats["professionals"] = [
+        {
+            "professional_id": prof_id,
+            "professional_name": names[prof_id],
+            **summarize_status_totals(per_professional[prof_id])
+        }
+        for prof_id in sorted(per_professional)
+    ]
+
+    return stats
+
+
+class RollupService:
+    """Manutenção e consulta do rollup diário de agendamentos"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_transition(
+        self,
+        appointment: Appointment,
+        old_status: Optional[AppointmentStatus],
+        new_status: Optional[AppointmentStatus]
+    ):
+        """
+        Move um agendamento de um status para outro no rollup
+
+        old_status None indica agendamento novo; new_status None, remoção.
+        Não faz commit: roda na transação de quem alterou o agendamento.
+        """
+        if old_status == new_status:
+            return
+
+        price = appointment.service_price
+        day = appointment.scheduled_date.date()
+
+        if old_status is not None:
+            self._bump(day, appointment.professional_id, appointment.service_id, old_status, -1, -price)
+        if new_status is not None:
+            self._bump(day, appointment.professional_id, appointment.service_id, new_status, 1, price)
+
+    def _bump(
+        self,
+        day: date,
+        professional_id: int,
+        service_id: int,
+        status: AppointmentStatus,
+        count_delta: int,
+        price_delta: float
+    ):
+        """Soma deltas a uma linha do rollup, criando-a se necessário"""
+        values = {
+            "date": day,
+            "professional_id": professional_id,
+            "service_id": service_id,
+            "status": status,
+            "appointment_count": count_delta,
+            "total_price": price_delta
+        }
+
+        dialect = self.db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            # Upsert atômico: seguro com atualizações concorrentes da mesma linha
+            dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+            stmt = dialect_insert(AppointmentDailyRollup).values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["date", "professional_id", "service_id", "status"],
+                set_={
+                    "appointment_count": AppointmentDailyRollup.appointment_count + stmt.excluded.appointment_count,
+                    "total_price": AppointmentDailyRollup.total_price + stmt.excluded.total_price
+                }
+            )
+            self.db.execute(stmt)
+            return
+
+        row = self.db.get(AppointmentDailyRollup, (day, professional_id, service_id, status))
+        if row is None:
+            self.db.add(AppointmentDailyRollup(**values))
+        else:
+            row.appointment_count += count_delta
+            row.total_price += price_delta
+
+    def rebuild(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """
+        Recalcula o rollup a partir de appointments (backfill)
+
+        Apaga e recria, com um INSERT ... SELECT agrupado, as linhas dos dias
+        em [start, end]; sem datas, recria a tabela inteira. Faz commit.
+        Retorna a quantidade de linhas geradas.
+        """
+        day = func.date(Appointment.scheduled_date)
+
+        delete_query = self.db.query(AppointmentDailyRollup)
+        if start is not None:
+            delete_query = delete_query.filter(AppointmentDailyRollup.date >= start)
+        if end is not None:
+            delete_query = delete_query.filter(AppointmentDailyRollup.date <= end)
+        delete_query.delete(synchronize_session=False)
+
+        select_query = self.db.query(
+            day,
+            Appointment.professional_id,
+            Appointment.service_id,
+            Appointment.status,
+            func.count(Appointment.id),
+            func.coalesce(func.sum(Appointment.service_price), 0.0)
+        )
+        if start is not None:
+            select_query = select_query.filter(
+                Appointment.scheduled_date >= datetime.combine(start, time.min)
+            )
+        if end is not None:
+            select_query = select_query.filter(
+                Appointment.scheduled_date < datetime.combine(end + timedelta(days=1), time.min)
+            )
+        select_query = select_query.group_by(
+            day, Appointment.professional_id, Appointment.service_id, Appointment.status
+        )
+
+        result = self.db.execute(
+            insert(AppointmentDailyRollup).from_select(
+                ["date", "professional_id", "service_id", "status", "appointment_count", "total_price"],
+                select_query.statement
+            )
+        )
+        self.db.commit()
+
+        return result.rowcount
+
+    def get_statistics(
+        self,
+        start: date,
+        end: date,
+        professional_id: Optional[int] = None,
+        by_professional: bool = False
+    ) -> Dict:
+        """
+        Retorna estatísticas dos dias em [start, end) a partir do rollup
+
+        Mesmo formato de AppointmentService.get_statistics.
+        """
+        columns = [
+            AppointmentDailyRollup.status,
+            func.sum(AppointmentDailyRollup.appointment_count),
+            func.sum(AppointmentDailyRollup.total_price)
+        ]
+        if by_professional:
+            columns = [AppointmentDailyRollup.professional_id, User.name] + columns
+
+        query = self.db.query(*columns).filter(
+            AppointmentDailyRollup.date >= start,
+            AppointmentDailyRollup.date < end
+        )
+
+        if professional_id is not None:
+            query = query.filter(AppointmentDailyRollup.professional_id == professional_id)
+
+        if by_professional:
+            query = query.join(
+                ProfessionalProfile, AppointmentDailyRollup.professional_id == ProfessionalProfile.id
+            ).join(
+                User, ProfessionalProfile.user_id == User.id
+            ).group_by(
+                AppointmentDailyRollup.professional_id, User.name, AppointmentDailyRollup.status
+            )
+        else:
+            query = query.group_by(AppointmentDailyRollup.status)
+
+        return build_statistics(query.all(), by_professional)
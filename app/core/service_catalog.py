@@ -0,0 +1,103 @@
+"""
+Catálogo de serviços ativos
+
+Mantém em cache a lista de serviços ativos usada no prompt da IA e no
+pré-classificador de intenção, com um número de versão que muda sempre
+que algum serviço é inserido, alterado ou removido. Quem deriva dados do
+catálogo (como o prompt do sistema) pode guardá-los pela versão.
+
+Os eventos do ORM só disparam no processo que grava; o catálogo também
+expira após SERVICE_CATALOG_TTL_SECONDS, então as alterações feitas por
+outros workers chegam a este em pouco tempo.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.db.models import Service
+
+# (versão, serviços ativos)
+CatalogSnapshot = Tuple[int, Tuple[Dict, ...]]
+
+
+class ServiceCatalog:
+    """Cache versionado dos serviços ativos"""
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or settings.SERVICE_CATALOG_TTL_SECONDS
+        # (validade, catálogo)
+        self._entry: Optional[Tuple[float, CatalogSnapshot]] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        """Retorna (versão, serviços) atuais, carregando em uma consulta se necessário"""
+        entry = self._entry
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        with self._lock:
+            if self._entry is not None and self._entry[0] <= time.monotonic():
+                # Vencido: o catálogo relido pode ter mudado em outro processo
+                self._version += 1
+                self._entry = None
+            version = self._version
+
+        rows = db.query(
+            Service.id, Service.name, Service.price, Service.duration_minutes
+        ).filter(
+            Service.is_active == True
+        ).order_by(Service.id).all()
+
+        snapshot = (version, tuple(
+            {"id": service_id, "name": name, "price": price, "duration_minutes": duration}
+            for service_id, name, price, duration in rows
+        ))
+
+        with self._lock:
+            # Só guarda se nada mudou durante a consulta
+            if self._version == version:
+                self._entry = (time.monotonic() + self.ttl_seconds, snapshot)
+
+        return snapshot
+
+    def invalidate(self):
+        """Descarta o catálogo e avança a versão"""
+        with self._lock:
+            self._version += 1
+            self._entry = None
+
+
+# Instância global do catálogo de serviços
+service_catalog = ServiceCatalog()
+
+
+def _service_changed(mapper, connection, target: Service):
+    service_catalog.invalidate()
+
+    # Invalida de novo após o commit: outra sessão pode ter recarregado
+    # o catálogo antigo entre o flush e o commit
+    session = object_session(target)
+    if session is not None:
+        session.info["service_catalog_changed"] = True
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Service, _event, _service_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    if session.info.pop("service_catalog_changed", False):
+        service_catalog.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    if session.info.pop("service_catalog_changed", False):
+        service_catalog.invalidate()
@@ -0,0 +1,181 @@
+"""
+Expediente semanal dos profissionais
+
+Compila as linhas de ProfessionalSchedule (HH:MM em texto) uma única vez
+em intervalos de minutos por dia da semana e mantém o resultado em cache
+por profissional. O cache é invalidado automaticamente quando algum
+horário do profissional é inserido, alterado ou removido, e cada entrada
+expira após WORKING_HOURS_TTL_SECONDS para refletir alterações feitas por
+outros processos.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.db.models import ProfessionalSchedule
+
+Interval = Tuple[int, int]
+WeeklyHours = Dict[int, Tuple[Interval, ...]]  # dia da semana (0=segunda) -> intervalos
+
+
+def parse_hhmm(value: str) -> int:
+    """Converte 'HH:MM' em minutos desde a meia-noite"""
+    hours, minutes = value.strip().split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def compile_weekly_hours(rows: Iterable[Tuple[int, str, str]]) -> WeeklyHours:
+    """Compila linhas (dia, início, fim) em intervalos ordenados e fundidos"""
+    per_day: Dict[int, List[Interval]] = defaultdict(list)
+
+    for day_of_week, start_time, end_time in rows:
+        start, end = parse_hhmm(start_time), parse_hhmm(end_time)
+        if end > start:
+            per_day[day_of_week].append((start, end))
+
+    compiled = {}
+    for day_of_week, intervals in per_day.items():
+        merged: List[Interval] = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        compiled[day_of_week] = tuple(merged)
+
+    return compiled
+
+
+def default_weekly_hours() -> WeeklyHours:
+    """Expediente padrão do estabelecimento, todos os dias"""
+    return compile_weekly_hours(
+        (day, settings.BUSINESS_HOURS_START, settings.BUSINESS_HOURS_END)
+        for day in range(7)
+    )
+
+
+class WorkingHoursCache:
+    """Cache do expediente semanal compilado de cada profissional"""
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or settings.WORKING_HOURS_TTL_SECONDS
+        # professional_id -> (validade, expediente)
+        self._hours: Dict[int, Tuple[float, WeeklyHours]] = {}
+        self._default: Optional[WeeklyHours] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, professional_id: int) -> WeeklyHours:
+        """Retorna expediente de um profissional"""
+        return self.get_many(db, [professional_id])[professional_id]
+
+    def get_many(self, db: Session, professional_ids: Iterable[int]) -> Dict[int, WeeklyHours]:
+        """
+        Retorna expediente de vários profissionais
+
+        Os que não estão em cache são carregados em uma única consulta.
+        Profissionais sem nenhum horário ativo cadastrado usam o expediente
+        padrão do estabelecimento.
+        """
+        professional_ids = list(professional_ids)
+        result = {}
+        missing = []
+        now = time.monotonic()
+
+        with self._lock:
+            version = self._version
+            for professional_id in professional_ids:
+                entry = self._hours.get(professional_id)
+                if entry is None or entry[0] <= now:
+                    missing.append(professional_id)
+                else:
+                    result[professional_id] = entry[1]
+
+        if missing:
+            rows = db.query(
+                ProfessionalSchedule.professional_id,
+                ProfessionalSchedule.day_of_week,
+                ProfessionalSchedule.start_time,
+                ProfessionalSchedule.end_time
+            ).filter(
+                ProfessionalSchedule.professional_id.in_(missing),
+                ProfessionalSchedule.is_active == True
+            ).all()
+
+            per_professional = defaultdict(list)
+            for professional_id, day_of_week, start_time, end_time in rows:
+                per_professional[professional_id].append((day_of_week, start_time, end_time))
+
+            with self._lock:
+                # Só guarda se nada mudou durante a consulta: um commit
+                # concorrente pode ter invalidado antes de os dados chegarem
+                store = self._version == version
+                for professional_id in missing:
+                    if professional_id in per_professional:
+                        hours = compile_weekly_hours(per_professional[professional_id])
+                    else:
+                        hours = self._default_hours()
+                    if store:
+                        self._hours[professional_id] = (now + self.ttl_seconds, hours)
+                    result[professional_id] = hours
+
+        return result
+
+    def invalidate(self, professional_id: Optional[int] = None):
+        """Descarta expediente em cache (de um profissional ou de todos)"""
+        with self._lock:
+            self._version += 1
+            if professional_id is None:
+                self._hours.clear()
+                self._default = None
+            else:
+                self._hours.pop(professional_id, None)
+
+    def _default_hours(self) -> WeeklyHours:
+        if self._default is None:
+            self._default = default_weekly_hours()
+        return self._default
+
+
+# Instância global do cache de expediente
+working_hours_cache = WorkingHoursCache()
+
+
+def _schedule_changed(mapper, connection, target: ProfessionalSchedule):
+    """Marca profissionais cujo expediente mudou"""
+    affected = {target.professional_id}
+
+    # Se o horário trocou de profissional, o anterior também muda
+    history = inspect(target).attrs.professional_id.history
+    affected.update(history.deleted or ())
+
+    for professional_id in affected:
+        working_hours_cache.invalidate(professional_id)
+
+    # Invalida de novo após o commit: outra sessão pode ter recarregado
+    # o expediente antigo entre o flush e o commit
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("working_hours_changed", set()).update(affected)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(ProfessionalSchedule, _event, _schedule_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    for professional_id in session.info.pop("working_hours_changed", ()):
+        working_hours_cache.invalidate(professional_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    for professional_id in session.info.pop("working_hours_changed", ()):
+        working_hours_cache.invalidate(professional_id)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Enum, Text, Index, DDL, event
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import enum
@@ -105,6 +105,8 @@ class Appointment(Base):
     service_id = Column(Integer, ForeignKey("services.id"), nullable=False)
     
     scheduled_date = Column(DateTime, nullable=False, index=True)
+    scheduled_end = Column(DateTime, nullable=False)  # Início + duração do serviço
+    service_price = Column(Float, nullable=False)  # Preço do serviço no momento da reserva
     status = Column(Enum(AppointmentStatus), default=AppointmentStatus.SCHEDULED)
     
     # Detalhes
@@ -125,6 +127,38 @@ class Appointment(Base):
     client = relationship("ClientProfile", back_populates="appointments")
     professional = relationship("ProfessionalProfile", back_populates="appointments")
     service = relationship("Service", back_populates="appointments")
+    
+    __table_args__ = (
+        # Cobre a checagem de conflito e a montagem da agenda sem ler a tabela
+        Index(
+            "ix_appointments_professional_status_date",
+            "professional_id", "status", "scheduled_date", "scheduled_end"
+        ),
+        # Janela de lembretes: agendamentos ativos em um intervalo de datas
+        Index("ix_appointments_status_date", "status", "scheduled_date"),
+    )
+
+# PostgreSQL: impede no banco dois agendamentos ativos sobrepostos
+# para o mesmo profissional (garantia final contra double booking)
+BTREE_GIST_EXTENSION = DDL("CREATE EXTENSION IF NOT EXISTS btree_gist")
+OVERLAP_CONSTRAINT = "ex_appointments_professional_overlap"
+OVERLAP_CONSTRAINT_DDL = DDL(
+    f"ALTER TABLE appointments ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+    "EXCLUDE USING gist ("
+    "professional_id WITH =, "
+    "tsrange(scheduled_date, scheduled_end) WITH &&"
+    ") WHERE (status IN ('SCHEDULED', 'CONFIRMED'))"
+)
+event.listen(
+    Appointment.__table__,
+    "after_create",
+    BTREE_GIST_EXTENSION.execute_if(dialect="postgresql")
+)
+event.listen(
+    Appointment.__table__,
+    "after_create",
+    OVERLAP_CONSTRAINT_DDL.execute_if(dialect="postgresql")
+)
 
 class ProfessionalSchedule(Base):
     __tablename__ = "professional_schedules"
@@ -156,7 +190,7 @@ class FinancialRecord(Base):
     __tablename__ = "financial_records"
     
     id = Column(Integer, primary_key=True, index=True)
-    appointment_id = Column(Integer, ForeignKey("appointments.id"))
+    appointment_id = Column(Integer, ForeignKey("appointments.id"), unique=True)  # Um lançamento por atendimento
     professional_id = Column(Integer, ForeignKey("professional_profiles.id"))
     
     service_price = Column(Float, nullable=False)
@@ -164,4 +198,33 @@ class FinancialRecord(Base):
     business_revenue = Column(Float, nullable=False)
     
     date = Column(DateTime, default=datetime.utcnow, index=True)
-    notes = Column(Text)
\ No newline at end of file
+    notes = Column(Text)
+
+# Totais diários por (data, profissional, serviço, status), mantidos
+# incrementalmente pelo AppointmentService para relatórios de período
+class AppointmentDailyRollup(Base):
+    __tablename__ = "appointment_daily_rollups"
+    
+    date = Column(Date, primary_key=True)
+    professional_id = Column(Integer, ForeignKey("professional_profiles.id"), primary_key=True)
+    service_id = Column(Integer, ForeignKey("services.id"), primary_key=True)
+    status = Column(Enum(AppointmentStatus), primary_key=True)
+    
+    appointment_count = Column(Integer, nullable=False, default=0)
+    total_price = Column(Float, nullable=False, default=0.0)  # Soma dos preços dos serviços
+
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+    
+    name = Column(String, primary_key=True)  # Tarefa protegida (ex: "reminders")
+    owner = Column(String, nullable=False)  # Instância que detém a tarefa
+    expires_at = Column(DateTime, nullable=False)
+
+# Estado das conversas do bot (fluxos de cadastro e agendamento), compartilhado
+# entre réplicas quando CONVERSATION_STATE_BACKEND=sql
+class ConversationState(Base):
+    __tablename__ = "conversation_states"
+    
+    user_id = Column(String, primary_key=True)  # ID do Telegram
+    data = Column(Text, nullable=False)  # JSON
+    expires_at = Column(DateTime, nullable=False, index=True)
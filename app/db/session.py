@@ -1,15 +1,99 @@
-from sqlalchemy import create_engine
+from typing import AsyncIterator
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
 from app.db.models import Base
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+SQLITE_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+def _async_database_url(url: str) -> str:
+    """Converte a URL do banco para o driver assíncrono equivalente"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+def _engine_options(url: str, is_async: bool = False) -> dict:
+    """Opções de pool e conexão conforme o banco configurado"""
+    parsed = make_url(url)
+    
+    if parsed.get_backend_name() == "sqlite":
+        options = {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+            }
+        }
+        # Banco em memória usa pool próprio do SQLAlchemy, sem dimensionamento
+        if parsed.database in (None, "", ":memory:"):
+            return options
+        # aiosqlite usa NullPool por padrão: abriria uma conexão por sessão
+        if is_async:
+            options["poolclass"] = AsyncAdaptedQueuePool
+    else:
+        options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE
+    )
+    return options
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """Aplica os PRAGMAs de desempenho a cada nova conexão SQLite"""
+    synchronous = settings.SQLITE_SYNCHRONOUS.upper()
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"SQLITE_SYNCHRONOUS inválido: {settings.SQLITE_SYNCHRONOUS}")
+    
+    cursor = dbapi_connection.cursor()
+    try:
+        if settings.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    finally:
+        cursor.close()
+
+def create_db_engine(url: str) -> Engine:
+    """Cria engine síncrono com pool e ajustes definidos em Settings"""
+    db_engine = create_engine(url, **_engine_options(url))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine, "connect", _configure_sqlite)
+    return db_engine
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    """Cria engine assíncrono com pool e ajustes definidos em Settings"""
+    db_engine = create_async_engine(url, **_engine_options(url, is_async=True))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", _configure_sqlite)
+    return db_engine
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_database_url(settings.DATABASE_URL)
+
+engine = create_db_engine(settings.DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrono (aiosqlite / asyncpg) usado pelas rotas da API
+async_engine = create_async_db_engine(ASYNC_DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 def init_db():
     """Inicializa o banco de dados criando todas as tabelas"""
     Base.metadata.create_all(bind=engine)
@@ -20,4 +104,9 @@ def get_db() -> Session:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency para obter sessão assíncrona do banco"""
+    async with AsyncSessionLocal() as db:
+        yield db
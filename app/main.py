@@ -8,8 +8,10 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.config import settings
-from app.db.session import init_db
-from app.telegram.bot import start_bot
+from app.db.session import init_db, async_engine
+from app.api.routes import appointments, telegram
+from app.telegram.bot import SchedulingBot, start_bot
+from app.telegram.reminders import reminder_scheduler
 
 # Configurar logging
 logging.basicConfig(
@@ -29,9 +31,18 @@ async def lifespan(app: FastAPI):
     init_db()
     logger.info("✅ Banco de dados inicializado!")
     
-    # Inicia bot do Telegram em background
+    # Inicia bot do Telegram: webhook no próprio event loop ou polling em background
     logger.info("🤖 Iniciando bot do Telegram...")
-    bot_task = asyncio.create_task(asyncio.to_thread(start_bot))
+    bot_task = None
+    if settings.TELEGRAM_WEBHOOK_URL:
+        app.state.telegram_bot = SchedulingBot()
+        await app.state.telegram_bot.start_webhook()
+    else:
+        bot_task = asyncio.create_task(asyncio.to_thread(start_bot))
+    
+    # Inicia agendador de lembretes
+    if settings.REMINDERS_ENABLED:
+        await reminder_scheduler.start()
     
     logger.info("✅ Sistema inicializado com sucesso!")
     
@@ -39,7 +50,13 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🛑 Encerrando sistema...")
-    bot_task.cancel()
+    if settings.REMINDERS_ENABLED:
+        await reminder_scheduler.stop()
+    if bot_task:
+        bot_task.cancel()
+    else:
+        await app.state.telegram_bot.stop_webhook()
+    await async_engine.dispose()
     logger.info("👋 Sistema encerrado!")
 
 # Criar aplicação FastAPI
@@ -50,6 +67,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Rotas da API REST
+app.include_router(appointments.router)
+app.include_router(telegram.router)
+
 @app.get("/")
 async def root():
     """Endpoint raiz"""
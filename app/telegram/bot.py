@@ -10,6 +10,8 @@ from telegram.ext import (
 )
 from app.config import settings
 from app.telegram.handlers import TelegramHandlers
+from app.telegram.outbox import outbox
+from app.telegram.update_processor import PerUserUpdateProcessor
 
 # Configurar logging
 logging.basicConfig(
@@ -22,7 +24,14 @@ class SchedulingBot:
     """Bot principal de agendamento"""
     
     def __init__(self):
-        self.application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+        # Chats diferentes em paralelo; os updates de cada usuário seguem em ordem
+        self.update_processor = PerUserUpdateProcessor()
+        self.application = (
+            Application.builder()
+            .token(settings.TELEGRAM_BOT_TOKEN)
+            .concurrent_updates(self.update_processor)
+            .build()
+        )
         self.handlers = TelegramHandlers()
         self._setup_handlers()
     
@@ -54,15 +63,68 @@ class SchedulingBot:
         logger.error(f"Erro ao processar update: {context.error}")
         
         if update and update.effective_message:
-            await update.effective_message.reply_text(
+            message = update.effective_message
+            await outbox.send_message(
+                message.get_bot(),
+                message.chat_id,
                 "❌ Desculpe, ocorreu um erro inesperado. "
                 "Por favor, tente novamente ou entre em contato com o suporte."
             )
     
     def run(self):
-        """Inicia o bot"""
+        """Inicia o bot em modo polling (loop próprio, bloqueante)"""
         logger.info("🤖 Bot iniciado! Aguardando mensagens...")
         self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+    
+    async def start_webhook(self):
+        """
+        Inicia o bot em modo webhook no event loop atual
+        
+        Os updates chegam pela rota da API (ver process_update), então várias
+        instâncias podem atender atrás de um balanceador. Registrar o webhook
+        é idempotente: cada instância repete a chamada ao iniciar.
+        """
+        # Sem o segredo qualquer um poderia forjar updates em nome de outros usuários
+        if not settings.TELEGRAM_WEBHOOK_SECRET:
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET é obrigatório quando TELEGRAM_WEBHOOK_URL está configurada")
+        
+        await self.application.initialize()
+        await self.application.start()
+        
+        await self.application.bot.set_webhook(
+            url=webhook_url(),
+            secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"🤖 Bot iniciado em modo webhook: {webhook_url()}")
+    
+    async def stop_webhook(self):
+        """Encerra o processamento de updates (o webhook continua registrado para as demais instâncias)"""
+        await self.application.stop()
+        await self.application.shutdown()
+    
+    async def process_update(self, data: dict):
+        """
+        Enfileira um update recebido pelo webhook
+        
+        A fila da Application entrega os updates ao PerUserUpdateProcessor,
+        como no polling, e a requisição responde sem aguardar os handlers
+        (chamadas à IA podem passar do timeout do Telegram). Com o processador
+        saturado o update é recusado e o Telegram o reenvia mais tarde.
+        """
+        if self.update_processor.saturated:
+            raise BotSaturatedError("Muitos updates em processamento")
+        
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
+
+class BotSaturatedError(Exception):
+    """Updates pendentes acima de TELEGRAM_MAX_PENDING_UPDATES"""
+    pass
+
+def webhook_url() -> str:
+    """URL pública do webhook do Telegram"""
+    return settings.TELEGRAM_WEBHOOK_URL.rstrip("/") + settings.TELEGRAM_WEBHOOK_PATH
 
 # Função para criar e executar o bot
 def start_bot():
@@ -1,107 +1,158 @@
+import asyncio
+import functools
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 from datetime import datetime
+from typing import Optional
 from sqlalchemy.orm import Session
 
 from app.db.session import SessionLocal
-from app.db.models import User, UserRole, ClientProfile, ProfessionalProfile, Service
+from app.db.models import User, UserRole, ClientProfile, ProfessionalProfile, ReliabilityLevel, Service
 from app.telegram.keyboards import Keyboards
+from app.telegram.identity import Identity, identity_cache
+from app.telegram.outbox import outbox
+from app.telegram.state_store import create_state_store
 from app.core.ai_service import ai_service
-from app.core.appointment_service import AppointmentService
+from app.core.appointment_service import AppointmentService, SlotUnavailableError
+from app.core.service_catalog import service_catalog
 
 logger = logging.getLogger(__name__)
 
+def per_update(handler):
+    """
+    Middleware dos handlers: resolve o usuário uma única vez por update,
+    pelo cache de identidade
+
+    O handler recebe (update, context, identity); identity é None para quem
+    ainda não tem cadastro. Cliques resolvidos pelo cache não tocam o banco.
+    """
+    @functools.wraps(handler)
+    async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        identity = None
+        if update.effective_user:
+            telegram_id = update.effective_user.id
+            identity = identity_cache.cached(telegram_id)
+            if identity is None:
+                identity = await self._run_db(identity_cache.resolve, telegram_id)
+        return await handler(self, update, context, identity)
+
+    return wrapper
+
 class TelegramHandlers:
     """Handlers para mensagens e callbacks do Telegram"""
 
     def __init__(self):
         self.keyboards = Keyboards()
-        self.user_states = {}  # Armazena estado da conversa de cada usuário
+        self.user_states = create_state_store()  # Estado da conversa de cada usuário (com validade)
 
     def get_db(self) -> Session:
         """Retorna sessão do banco de dados"""
         return SessionLocal()
 
-    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def _run_db(self, fn, *args):
+        """
+        Executa fn(db, *args) numa thread, com uma sessão só para a chamada
+
+        Os handlers rodam no event loop (no webhook, o mesmo da API), onde
+        consultas síncronas e a trava de reserva bloqueariam tudo. A conexão
+        do pool fica presa apenas enquanto fn executa, nunca durante chamadas
+        à IA ou envios pela fila de saída.
+        """
+        def work():
+            db = self.get_db()
+            try:
+                return fn(db, *args)
+            finally:
+                db.close()
+
+        return await asyncio.to_thread(work)
+
+    async def _reply(self, message, text: str, **kwargs):
+        """Responde no chat da mensagem pela fila de saída"""
+        return await outbox.send_message(message.get_bot(), message.chat_id, text, **kwargs)
+
+    async def _edit(self, query, text: str, **kwargs):
+        """Edita a mensagem do botão pela fila de saída (edições seguidas são fundidas)"""
+        message = query.message
+        return await outbox.edit_message_text(
+            message.get_bot(), message.chat_id, message.message_id, text, **kwargs
+        )
+
+    @per_update
+    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE, identity: Identity):
         """Handler para comando /start"""
         user = update.effective_user
-        db = self.get_db()
 
-        try:
-            # Busca ou cria usuário
-            db_user = db.query(User).filter_by(telegram_id=str(user.id)).first()
-
-            if not db_user:
-                # Novo usuário - processo de cadastro
-                await update.message.reply_text(
-                    f"👋 Olá! Seja bem-vindo(a) ao nosso sistema de agendamento!\n\n"
-                    f"Vejo que é sua primeira vez aqui. "
-                    f"Vou precisar de algumas informações para criar seu cadastro.\n\n"
-                    f"Por favor, me informe seu nome completo:"
-                )
-
-                # Define estado para cadastro
-                self.user_states[user.id] = {"state": "awaiting_name"}
-            else:
-                # Usuário existente
-                await self._show_welcome_back(update, db_user, db)
-
-        finally:
-            db.close()
-
-    async def _show_welcome_back(self, update: Update, db_user: User, db: Session):
+        if not identity:
+            # Novo usuário - processo de cadastro
+            await self._reply(update.message,
+                f"👋 Olá! Seja bem-vindo(a) ao nosso sistema de agendamento!\n\n"
+                f"Vejo que é sua primeira vez aqui. "
+                f"Vou precisar de algumas informações para criar seu cadastro.\n\n"
+                f"Por favor, me informe seu nome completo:"
+            )
+
+            # Define estado para cadastro
+            await self.user_states.aset(user.id, {"state": "awaiting_name"})
+        else:
+            # Usuário existente
+            await self._show_welcome_back(update, identity)
+
+    async def _show_welcome_back(self, update: Update, identity: Identity):
         """Mostra boas-vindas para usuário existente"""
 
         # Busca próximos agendamentos se for cliente
         next_appointments_text = ""
-        if db_user.role == UserRole.CLIENT and db_user.client_profile:
-            apt_service = AppointmentService(db)
-            appointments = apt_service.get_client_appointments(
-                db_user.client_profile.id,
-                include_past=False
+        if identity.role == UserRole.CLIENT and identity.client_profile_id:
+            next_appointments_text = await self._run_db(
+                self._next_appointment_text, identity.client_profile_id
             )
 
-            if appointments:
-                next_apt = appointments[0]
-                next_appointments_text = (
-                    f"\n\n📅 Seu próximo agendamento:\n"
-                    f"• {next_apt.service.name}\n"
-                    f"• {next_apt.scheduled_date.strftime('%d/%m/%Y às %H:%M')}\n"
-                    f"• Com: {next_apt.professional.user.name}"
-                )
-
         welcome_message = (
-            f"👋 Olá, {db_user.name}!\n"
+            f"👋 Olá, {identity.name}!\n"
             f"É um prazer ter você de volta!{next_appointments_text}\n\n"
             f"Como posso ajudá-lo(a) hoje?"
         )
 
-        await update.message.reply_text(
+        await self._reply(update.message,
             welcome_message,
-            reply_markup=self.keyboards.main_menu(db_user.role.value)
+            reply_markup=self.keyboards.main_menu(identity.role.value)
         )
 
-    async def show_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Mostra menu principal"""
-        user = update.effective_user
-        db = self.get_db()
-
-        try:
-            db_user = db.query(User).filter_by(telegram_id=str(user.id)).first()
+    @staticmethod
+    def _next_appointment_text(db: Session, client_profile_id: int) -> str:
+        apt_service = AppointmentService(db)
+        appointments = apt_service.get_client_appointments(
+            client_profile_id,
+            include_past=False,
+            profile="summary"
+        )
 
-            if not db_user:
-                await update.message.reply_text(
-                    "❌ Você precisa se cadastrar primeiro. Use /start"
-                )
-                return
+        if not appointments:
+            return ""
+
+        next_apt = appointments[0]
+        return (
+            f"\n\n📅 Seu próximo agendamento:\n"
+            f"• {next_apt.service.name}\n"
+            f"• {next_apt.scheduled_date.strftime('%d/%m/%Y às %H:%M')}\n"
+            f"• Com: {next_apt.professional.user.name}"
+        )
 
-            await update.message.reply_text(
-                "📋 Menu Principal:",
-                reply_markup=self.keyboards.main_menu(db_user.role.value)
+    @per_update
+    async def show_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, identity: Identity):
+        """Mostra menu principal"""
+        if not identity:
+            await self._reply(update.message,
+                "❌ Você precisa se cadastrar primeiro. Use /start"
             )
-        finally:
-            db.close()
+            return
+
+        await self._reply(update.message,
+            "📋 Menu Principal:",
+            reply_markup=self.keyboards.main_menu(identity.role.value)
+        )
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handler para comando /help"""
@@ -120,252 +171,260 @@ class TelegramHandlers:
             "Estou aqui para ajudar! 😊"
         )
 
-        await update.message.reply_text(help_text, parse_mode='Markdown')
+        await self._reply(update.message, help_text, parse_mode='Markdown')
 
     async def cancel_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Cancela operação atual"""
         user = update.effective_user
 
-        if user.id in self.user_states:
-            del self.user_states[user.id]
+        await self.user_states.adelete(user.id)
 
-        await update.message.reply_text(
+        await self._reply(update.message,
             "✅ Operação cancelada. Use /menu para voltar ao menu principal."
         )
 
-    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    @per_update
+    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE, identity: Identity):
         """Handler para mensagens de texto (conversação com IA)"""
         user = update.effective_user
         message_text = update.message.text
-        db = self.get_db()
-
-        try:
-            # Verifica se usuário existe
-            db_user = db.query(User).filter_by(telegram_id=str(user.id)).first()
 
-            if not db_user:
-                await update.message.reply_text(
-                    "❌ Você precisa se cadastrar primeiro. Use /start"
-                )
-                return
+        # Verifica se está em processo de cadastro ou outra operação
+        state_data = await self.user_states.aget(user.id)
 
-            # Verifica se está em processo de cadastro ou outra operação
-            if user.id in self.user_states:
-                await self._handle_state_based_message(update, db_user, db)
-                return
+        # Sem cadastro, só o fluxo de cadastro é aceito
+        if not identity and (state_data or {}).get("state") != "awaiting_name":
+            await self._reply(update.message,
+                "❌ Você precisa se cadastrar primeiro. Use /start"
+            )
+            return
 
-            # Processamento normal com IA
-            await self._process_with_ai(update, db_user, db, message_text)
+        if state_data is not None:
+            await self._handle_state_based_message(update, identity, state_data)
+            return
 
-        finally:
-            db.close()
+        # Processamento normal com IA
+        await self._process_with_ai(update, identity, message_text)
 
-    async def _handle_state_based_message(self, update: Update, db_user: User, db: Session):
+    async def _handle_state_based_message(self, update: Update, identity: Optional[Identity], state_data: dict):
         """Processa mensagem baseada no estado atual do usuário"""
         user = update.effective_user
-        state_data = self.user_states.get(user.id, {})
         current_state = state_data.get("state")
 
         if current_state == "awaiting_name":
             # Cadastrando nome
             name = update.message.text.strip()
 
-            # Cria usuário
-            new_user = User(
-                telegram_id=str(user.id),
-                name=name,
-                role=UserRole.CLIENT
-            )
-            db.add(new_user)
-            db.flush()
-
-            # Cria perfil de cliente
-            client_profile = ClientProfile(user_id=new_user.id)
-            db.add(client_profile)
-            db.commit()
+            await self._run_db(self._register_client, str(user.id), name)
 
-            await update.message.reply_text(
+            await self._reply(update.message,
                 f"✅ Perfeito, {name}! Cadastro concluído com sucesso!\n\n"
                 f"Agora você já pode usar todos os recursos do sistema. 🎉"
             )
 
             # Remove estado
-            del self.user_states[user.id]
+            await self.user_states.adelete(user.id)
 
             # Mostra menu
-            await update.message.reply_text(
+            await self._reply(update.message,
                 "📋 Veja o que você pode fazer:",
                 reply_markup=self.keyboards.main_menu("client")
             )
 
         elif current_state == "awaiting_message_to_management":
             # Enviando mensagem para gerência
-            from app.db.models import Message
-
-            message = Message(
-                client_id=db_user.client_profile.id,
-                subject="Mensagem do cliente",
-                content=update.message.text
+            await self._run_db(
+                self._save_management_message, identity.client_profile_id, update.message.text
             )
-            db.add(message)
-            db.commit()
 
-            await update.message.reply_text(
+            await self._reply(update.message,
                 "✅ Mensagem enviada para a gerência com sucesso!\n"
                 "Retornaremos em breve. Obrigado!"
             )
 
-            del self.user_states[user.id]
+            await self.user_states.adelete(user.id)
 
-    async def _process_with_ai(self, update: Update, db_user: User, db: Session, message: str):
-        """Processa mensagem usando IA Claude"""
-
-        # Prepara contexto
-        context = {
-            "user_name": db_user.name,
-            "user_role": db_user.role.value
-        }
+    @staticmethod
+    def _register_client(db: Session, telegram_id: str, name: str):
+        # Cria usuário
+        new_user = User(
+            telegram_id=telegram_id,
+            name=name,
+            role=UserRole.CLIENT
+        )
+        db.add(new_user)
+        db.flush()
+
+        # Cria perfil de cliente
+        client_profile = ClientProfile(user_id=new_user.id)
+        db.add(client_profile)
+        db.commit()
+
+    @staticmethod
+    def _save_management_message(db: Session, client_profile_id: int, content: str):
+        from app.db.models import Message
+
+        message = Message(
+            client_id=client_profile_id,
+            subject="Mensagem do cliente",
+            content=content
+        )
+        db.add(message)
+        db.commit()
 
-        # Busca serviços disponíveis
-        services = db.query(Service).filter_by(is_active=True).all()
-        context["available_services"] = [
-            {
-                "name": s.name,
-                "price": s.price,
-                "duration_minutes": s.duration_minutes
-            }
-            for s in services
-        ]
+    async def _process_with_ai(self, update: Update, identity: Identity, message: str):
+        """Processa mensagem usando IA Claude"""
 
-        # Se for cliente, adiciona info de agendamentos
-        if db_user.client_profile:
-            apt_service = AppointmentService(db)
-            appointments = apt_service.get_client_appointments(
-                db_user.client_profile.id,
-                include_past=False
-            )
-            context["user_appointments"] = len(appointments)
-            context["reliability_level"] = db_user.client_profile.reliability_level.value
+        # Prepara contexto (a sessão já está fechada quando a IA é chamada)
+        context = await self._run_db(self._ai_context, identity)
 
         # Envia "digitando..."
         await update.message.chat.send_action("typing")
 
-        # Processa com IA
-        response = await ai_service.chat(message, context=context)
-
-        # Analisa intenção para ações específicas
-        intent_data = await ai_service.analyze_appointment_request(message)
+        # Processa com IA: resposta e intenção (para ações específicas) em paralelo
+        response, intent_data = await ai_service.chat_with_intent(message, context=context)
 
         # Responde
-        await update.message.reply_text(response)
+        await self._reply(update.message, response)
 
         # Se detectou intenção de agendamento, oferece menu
         if intent_data.get("intent") == "schedule":
-            await update.message.reply_text(
+            await self._reply(update.message,
                 "📅 Gostaria de fazer o agendamento agora?",
-                reply_markup=self.keyboards.main_menu(db_user.role.value)
+                reply_markup=self.keyboards.main_menu(identity.role.value)
+            )
+
+    @staticmethod
+    def _ai_context(db: Session, identity: Identity) -> dict:
+        context = {
+            "user_name": identity.name,
+            "user_role": identity.role.value
+        }
+
+        # Serviços disponíveis (catálogo em cache; a versão identifica o prompt já montado)
+        catalog_version, services = service_catalog.get(db)
+        context["catalog_version"] = catalog_version
+        context["available_services"] = services
+
+        # Se for cliente, adiciona info de agendamentos
+        if identity.client_profile_id:
+            apt_service = AppointmentService(db)
+            appointments = apt_service.get_client_appointments(
+                identity.client_profile_id,
+                include_past=False
             )
+            context["user_appointments"] = len(appointments)
+            context["reliability_level"] = identity.reliability_level.value
+
+        return context
 
-    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    @per_update
+    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, identity: Identity):
         """Handler para callbacks de botões inline"""
         query = update.callback_query
         await query.answer()
 
         callback_data = query.data
-        db = self.get_db()
+        user = query.from_user
 
-        try:
-            user = query.from_user
-            db_user = db.query(User).filter_by(telegram_id=str(user.id)).first()
-
-            if not db_user:
-                await query.message.reply_text("❌ Erro: usuário não encontrado")
-                return
-
-            # Roteamento de callbacks
-            if callback_data == "back_to_menu":
-                await self._handle_back_to_menu(query, db_user)
-
-            elif callback_data == "new_appointment":
-                await self._handle_new_appointment(query, db)
-
-            elif callback_data == "my_appointments":
-                await self._handle_my_appointments(query, db_user, db)
-
-            elif callback_data == "view_services":
-                await self._handle_view_services(query, db)
-
-            elif callback_data == "contact_management":
-                await self._handle_contact_management(query, user)
-
-            # Adicione mais handlers conforme necessário...
-            elif callback_data == "view_professionals":
-                await self._handle_view_professionals(query, db)
-            elif callback_data == "my_profile":
-                await self._handle_my_profile(query, db_user, db)
-            # Callback para seleção de serviço
-            elif callback_data.startswith("service_"):
-                service_id = int(callback_data.split("_")[1])
-                await self._handle_service_selected(query, service_id, db)
-            elif callback_data.startswith("professional_"):
-                professional_id = int(callback_data.split("_")[1])
-                await self._handle_professional_selected(query, professional_id, db)
-            elif callback_data.startswith("date:"):
-                date_str = callback_data.split("date:")[1]
-                await self._handle_date_selected(query, date_str, db)
-            elif callback_data.startswith("date_"):
-                date_str = callback_data.split("_", 1)[1]
-                await self._handle_date_selected(query, date_str, db)
-
-            elif callback_data.startswith("time_"):
-                time_str = callback_data.split("_", 1)[1]
-                await self._handle_time_selected(query, time_str, db)
-
-
-        finally:
-            db.close()
-
-    async def _handle_back_to_menu(self, query, db_user):
+        if not identity:
+            await self._reply(query.message, "❌ Erro: usuário não encontrado")
+            return
+
+        # Roteamento de callbacks
+        if callback_data == "back_to_menu":
+            await self._handle_back_to_menu(query, identity)
+
+        elif callback_data == "new_appointment":
+            await self._handle_new_appointment(query)
+
+        elif callback_data == "my_appointments":
+            await self._handle_my_appointments(query, identity)
+
+        elif callback_data == "view_services":
+            await self._handle_view_services(query)
+
+        elif callback_data == "contact_management":
+            await self._handle_contact_management(query, user)
+
+        # Adicione mais handlers conforme necessário...
+        elif callback_data == "view_professionals":
+            await self._handle_view_professionals(query)
+        elif callback_data == "my_profile":
+            await self._handle_my_profile(query, identity)
+        # Callback para seleção de serviço
+        elif callback_data.startswith("service_"):
+            service_id = int(callback_data.split("_")[1])
+            await self._handle_service_selected(query, service_id)
+        elif callback_data.startswith("professional_"):
+            professional_id = int(callback_data.split("_")[1])
+            await self._handle_professional_selected(query, professional_id, identity)
+        elif callback_data.startswith("date:"):
+            date_str = callback_data.split("date:")[1]
+            await self._handle_date_selected(query, date_str, identity)
+        elif callback_data.startswith("date_"):
+            date_str = callback_data.split("_", 1)[1]
+            await self._handle_date_selected(query, date_str, identity)
+
+        elif callback_data.startswith("time_"):
+            time_str = callback_data.split("_", 1)[1]
+            await self._handle_time_selected(query, time_str, identity)
+
+    async def _handle_back_to_menu(self, query, identity: Identity):
         """Volta ao menu principal"""
-        await query.edit_message_text(
+        await self._edit(query,
             "📋 Menu Principal:",
-            reply_markup=self.keyboards.main_menu(db_user.role.value)
+            reply_markup=self.keyboards.main_menu(identity.role.value)
         )
 
-    async def _handle_new_appointment(self, query, db: Session):
+    async def _handle_new_appointment(self, query):
         """Inicia processo de novo agendamento"""
-        services = db.query(Service).filter_by(is_active=True).all()
+        _, services = await self._run_db(service_catalog.get)
 
         services_data = [
-            {"id": s.id, "name": s.name, "price": s.price}
+            {"id": s["id"], "name": s["name"], "price": s["price"]}
             for s in services
         ]
 
-        await query.edit_message_text(
+        await self._edit(query,
             "💼 Escolha o serviço desejado:",
             reply_markup=self.keyboards.service_selection(services_data)
         )
 
-    async def _handle_my_appointments(self, query, db_user, db: Session):
+    async def _handle_my_appointments(self, query, identity: Identity):
         """Mostra agendamentos do cliente"""
-        if not db_user.client_profile:
-            await query.edit_message_text("❌ Erro: perfil de cliente não encontrado")
+        if not identity.client_profile_id:
+            await self._edit(query, "❌ Erro: perfil de cliente não encontrado")
             return
 
-        apt_service = AppointmentService(db)
-        appointments = apt_service.get_client_appointments(
-            db_user.client_profile.id,
-            include_past=False
-        )
+        message = await self._run_db(self._appointments_text, identity.client_profile_id)
 
-        if not appointments:
-            await query.edit_message_text(
+        if not message:
+            await self._edit(query,
                 "📅 Você não possui agendamentos futuros.\n\n"
                 "Gostaria de fazer um novo agendamento?",
                 reply_markup=self.keyboards.main_menu("client")
             )
             return
 
+        await self._edit(query,
+            message,
+            parse_mode='Markdown',
+            reply_markup=self.keyboards.back_button()
+        )
+
+    @staticmethod
+    def _appointments_text(db: Session, client_profile_id: int) -> str:
+        apt_service = AppointmentService(db)
+        appointments = apt_service.get_client_appointments(
+            client_profile_id,
+            include_past=False,
+            profile="summary"
+        )
+
+        if not appointments:
+            return ""
+
         message = "📅 *Seus Agendamentos:*\n\n"
 
         for apt in appointments:
@@ -380,17 +439,23 @@ class TelegramHandlers:
                 f"{status_emoji} *{apt.service.name}*\n"
                 f"📅 {apt.scheduled_date.strftime('%d/%m/%Y às %H:%M')}\n"
                 f"👤 Com: {apt.professional.user.name}\n"
-                f"💰 R$ {apt.service.price:.2f}\n\n"
+                f"💰 R$ {apt.service_price:.2f}\n\n"
             )
 
-        await query.edit_message_text(
+        return message
+
+    async def _handle_view_services(self, query):
+        """Mostra lista de serviços"""
+        message = await self._run_db(self._services_text)
+
+        await self._edit(query,
             message,
             parse_mode='Markdown',
             reply_markup=self.keyboards.back_button()
         )
 
-    async def _handle_view_services(self, query, db: Session):
-        """Mostra lista de serviços"""
+    @staticmethod
+    def _services_text(db: Session) -> str:
         services = db.query(Service).filter_by(is_active=True).all()
 
         message = "💼 *Nossos Serviços:*\n\n"
@@ -405,35 +470,44 @@ class TelegramHandlers:
                 message += f"📝 {service.description}\n"
             message += "\n"
 
-        await query.edit_message_text(
-            message,
-            parse_mode='Markdown',
-            reply_markup=self.keyboards.back_button()
-        )
+        return message
 
     async def _handle_contact_management(self, query, user):
         """Inicia processo de envio de mensagem à gerência"""
-        self.user_states[user.id] = {"state": "awaiting_message_to_management"}
+        await self.user_states.aset(user.id, {"state": "awaiting_message_to_management"})
 
-        await query.edit_message_text(
+        await self._edit(query,
             "💬 *Falar com a Gerência*\n\n"
             "Por favor, digite sua mensagem e enviarei para nossa equipe.\n"
             "Retornaremos o mais breve possível!",
             parse_mode='Markdown'
         )
 
-    async def _handle_view_professionals(self, query, db: Session):
+    async def _handle_view_professionals(self, query):
 
         """Mostra lista de profissionais"""
-        professionals = db.query(ProfessionalProfile).filter_by(is_available=True).all()
+        message = await self._run_db(self._professionals_text)
 
-        if not professionals:
-            await query.edit_message_text(
+        if not message:
+            await self._edit(query,
                 "❌ Nenhum profissional disponível no momento.",
                 reply_markup=self.keyboards.back_button()
             )
             return
 
+        await self._edit(query,
+            message,
+            parse_mode='Markdown',
+            reply_markup=self.keyboards.back_button()
+        )
+
+    @staticmethod
+    def _professionals_text(db: Session) -> str:
+        professionals = db.query(ProfessionalProfile).filter_by(is_available=True).all()
+
+        if not professionals:
+            return ""
+
         message = "👨‍💼 *Nossos Profissionais:*\n\n"
 
         for prof in professionals:
@@ -444,20 +518,31 @@ class TelegramHandlers:
                 f"📊 {status}\n\n"
             )
 
-        await query.edit_message_text(
-            message,
-            parse_mode='Markdown',
-            reply_markup=self.keyboards.back_button()
-        )
+        return message
 
-    async def _handle_my_profile(self, query, db_user, db: Session):
+    async def _handle_my_profile(self, query, identity: Identity):
 
         """Mostra perfil do usuário"""
-        if not db_user.client_profile:
-            await query.edit_message_text("❌ Perfil não encontrado")
+        message = None
+        if identity.client_profile_id:
+            message = await self._run_db(self._profile_text, identity)
+
+        if not message:
+            await self._edit(query, "❌ Perfil não encontrado")
             return
 
-        profile = db_user.client_profile
+        await self._edit(query,
+            message,
+            parse_mode='Markdown',
+            reply_markup=self.keyboards.back_button()
+        )
+
+    @staticmethod
+    def _profile_text(db: Session, identity: Identity) -> Optional[str]:
+        # Contadores sempre atuais: lidos do banco, não do cache de identidade
+        profile = db.get(ClientProfile, identity.client_profile_id)
+        if not profile:
+            return None
 
         # Calcula taxa de comparecimento
         total = profile.total_appointments
@@ -471,7 +556,7 @@ class TelegramHandlers:
 
         message = (
             f"👤 *Seu Perfil*\n\n"
-            f"📝 Nome: {db_user.name}\n"
+            f"📝 Nome: {identity.name}\n"
             f"📊 Confiabilidade: {reliability_emoji} {profile.reliability_level.value.title()}\n"
             f"📅 Total de agendamentos: {total}\n"
             f"❌ Faltas: {profile.no_show_count}\n"
@@ -481,32 +566,14 @@ class TelegramHandlers:
         if profile.reliability_level.value == "low":
             message += "⚠️ *Atenção:* Devido ao histórico, você não pode agendar em horários de pico.\n"
 
-        await query.edit_message_text(
-            message,
-            parse_mode='Markdown',
-            reply_markup=self.keyboards.back_button()
-        )
+        return message
 
-    async def _handle_service_selected(self, query, service_id: int, db: Session):
+    async def _handle_service_selected(self, query, service_id: int):
         """Processa seleção de serviço e mostra profissionais"""
-        # Busca profissionais disponíveis para este serviço
-        professionals = db.query(ProfessionalProfile).filter(
-            ProfessionalProfile.is_available == True
-        ).all()
-
-        # Filtra profissionais que oferecem este serviço
-        available_profs = []
-        for prof in professionals:
-            if any(s.id == service_id for s in prof.services):
-                available_profs.append({
-                    "id": prof.id,
-                    "name": prof.user.name,
-                    "specialty": prof.specialty,
-                    "is_available": prof.is_available
-                })
+        available_profs = await self._run_db(self._professionals_for_service, service_id)
 
         if not available_profs:
-            await query.edit_message_text(
+            await self._edit(query,
                 "❌ Nenhum profissional disponível para este serviço no momento.\n\n"
                 "Por favor, escolha outro serviço ou tente mais tarde.",
                 reply_markup=self.keyboards.back_button()
@@ -515,50 +582,103 @@ class TelegramHandlers:
 
         # Salva serviço selecionado no estado do usuário
         user_id = query.from_user.id
-        self.user_states[user_id] = {
+        await self.user_states.aset(user_id, {
             "state": "selecting_professional",
             "service_id": service_id
-        }
+        })
 
-        await query.edit_message_text(
+        await self._edit(query,
             "👨‍💼 Escolha o profissional:",
             reply_markup=self.keyboards.professional_selection(available_profs)
         )
 
-    async def _handle_professional_selected(self, query, professional_id: int, db: Session):
+    @staticmethod
+    def _professionals_for_service(db: Session, service_id: int) -> list:
+        # Busca profissionais disponíveis para este serviço
+        professionals = db.query(ProfessionalProfile).filter(
+            ProfessionalProfile.is_available == True
+        ).all()
+
+        # Filtra profissionais que oferecem este serviço
+        available_profs = []
+        for prof in professionals:
+            if any(s.id == service_id for s in prof.services):
+                available_profs.append({
+                    "id": prof.id,
+                    "name": prof.user.name,
+                    "specialty": prof.specialty,
+                    "is_available": prof.is_available
+                })
+
+        return available_profs
+
+    async def _handle_professional_selected(self, query, professional_id: int, identity: Identity):
         """Processa seleção de profissional e mostra datas disponíveis"""
         user_id = query.from_user.id
 
         # Recupera dados do estado
-        state = self.user_states.get(user_id, {})
+        state = await self.user_states.aget(user_id) or {}
         service_id = state.get("service_id")
 
         if not service_id:
-            await query.edit_message_text(
+            await self._edit(query,
                 "❌ Erro: serviço não encontrado. Por favor, comece novamente.",
                 reply_markup=self.keyboards.back_button()
             )
             return
 
         # Busca informações do serviço e profissional
-        service = db.query(Service).filter_by(id=service_id).first()
-        professional = db.query(ProfessionalProfile).filter_by(id=professional_id).first()
+        selection = await self._run_db(
+            self._selection_summary, professional_id, service_id, self._excludes_peak(identity)
+        )
 
-        if not service or not professional:
-            await query.edit_message_text(
+        if not selection:
+            await self._edit(query,
                 "❌ Erro ao carregar informações. Tente novamente.",
                 reply_markup=self.keyboards.back_button()
             )
             return
 
+        professional_name, message, free_slots_by_day = selection
+
         # Atualiza estado
-        self.user_states[user_id] = {
+        await self.user_states.aset(user_id, {
             "state": "selecting_date",
             "service_id": service_id,
             "professional_id": professional_id
+        })
+
+        if not any(free_slots_by_day.values()):
+            await self._edit(query,
+                f"❌ {professional_name} não tem horários livres nos próximos 7 dias.\n\n"
+                "Por favor, escolha outro profissional.",
+                reply_markup=self.keyboards.back_button()
+            )
+            return
+
+        # Mostra seleção de data (só dias com horário livre)
+        await self._edit(query,
+            message,
+            reply_markup=self.keyboards.date_selection(free_slots_by_day)
+        )
+
+    @staticmethod
+    def _selection_summary(db: Session, professional_id: int, service_id: int, exclude_peak: bool):
+        service = db.query(Service).filter_by(id=service_id).first()
+        professional = db.query(ProfessionalProfile).filter_by(id=professional_id).first()
+
+        if not service or not professional:
+            return None
+
+        # Horários livres dos próximos 7 dias em uma única consulta de agendamentos
+        slots_by_day = AppointmentService(db).get_available_slots_range(
+            professional_id, datetime.now(), 7, service_id
+        )
+        free_slots_by_day = {
+            day: sum(1 for slot in slots if not (exclude_peak and slot["is_peak"]))
+            for day, slots in slots_by_day.items()
         }
 
-        # Mostra seleção de data
         message = (
             f"✅ Você selecionou:\n\n"
             f"💼 Serviço: {service.name}\n"
@@ -568,21 +688,18 @@ class TelegramHandlers:
             f"📅 Escolha uma data:"
         )
 
-        await query.edit_message_text(
-            message,
-            reply_markup=self.keyboards.date_selection()
-        )
+        return professional.user.name, message, free_slots_by_day
 
-    async def _handle_time_selected(self, query, time_str: str, db: Session):
+    async def _handle_time_selected(self, query, time_str: str, identity: Identity):
         user_id = query.from_user.id
-        state = self.user_states.get(user_id, {})
+        state = await self.user_states.aget(user_id) or {}
 
         service_id = state.get("service_id")
         professional_id = state.get("professional_id")
         date_str = state.get("date")
 
         if not all([service_id, professional_id, date_str]):
-            await query.edit_message_text(
+            await self._edit(query,
                 "❌ Erro: dados incompletos. Inicie novamente.",
                 reply_markup=self.keyboards.back_button()
             )
@@ -592,45 +709,93 @@ class TelegramHandlers:
             f"{date_str} {time_str}", "%Y-%m-%d %H:%M"
         )
 
-        apt_service = AppointmentService(db)
-        appointment = apt_service.create_appointment(
-            client_id=db.query(User)
-                .filter_by(telegram_id=str(user_id))
-                .first()
-                .client_profile.id,
-            professional_id=professional_id,
-            service_id=service_id,
-            scheduled_date=scheduled_datetime
-        )
+        try:
+            # Numa thread: a trava de reserva pode esperar por outra reserva em curso
+            await self._run_db(
+                self._book,
+                identity.client_profile_id,
+                professional_id,
+                service_id,
+                scheduled_datetime
+            )
+        except SlotUnavailableError:
+            # Outro cliente reservou entre a listagem e a confirmação: mostra os horários atualizados
+            await self._show_free_times(
+                query, professional_id, service_id, date_str, self._excludes_peak(identity),
+                "⚠️ Esse horário acabou de ser reservado.\n\n"
+            )
+            return
+        except ValueError as e:
+            await self._edit(query,
+                f"❌ {e}",
+                reply_markup=self.keyboards.back_button()
+            )
+            return
 
-        del self.user_states[user_id]
+        await self.user_states.adelete(user_id)
 
-        await query.edit_message_text(
+        await self._edit(query,
             "✅ *Agendamento confirmado!*\n\n"
             f"📅 {scheduled_datetime.strftime('%d/%m/%Y às %H:%M')}",
             parse_mode="Markdown",
             reply_markup=self.keyboards.main_menu("client")
         )
 
-    async def _handle_date_selected(self, query, date_str: str, db: Session):
+    @staticmethod
+    def _book(db: Session, client_id: int, professional_id: int, service_id: int, scheduled_date: datetime):
+        AppointmentService(db).create_appointment(
+            client_id=client_id,
+            professional_id=professional_id,
+            service_id=service_id,
+            scheduled_date=scheduled_date
+        )
+
+    @staticmethod
+    def _excludes_peak(identity: Identity) -> bool:
+        """Clientes de baixa confiabilidade não podem reservar horários de pico"""
+        return identity.reliability_level == ReliabilityLevel.LOW
+
+    async def _handle_date_selected(self, query, date_str: str, identity: Identity):
         user_id = query.from_user.id
 
-        # Garante estado
-        if user_id not in self.user_states:
-            self.user_states[user_id] = {}
+        # Salva a data escolhida (cria o estado se necessário)
+        await self.user_states.aupdate(user_id, date=date_str)
+        state = await self.user_states.aget(user_id) or {}
+
+        if not state.get("service_id") or not state.get("professional_id"):
+            await self._edit(query,
+                "❌ Erro: dados incompletos. Inicie novamente.",
+                reply_markup=self.keyboards.back_button()
+            )
+            return
 
-        # Salva a data escolhida
-        self.user_states[user_id]["date"] = date_str
+        await self._show_free_times(
+            query, state["professional_id"], state["service_id"], date_str,
+            self._excludes_peak(identity)
+        )
 
-        # Aqui você pode depois filtrar horários ocupados
+    async def _show_free_times(
+        self,
+        query,
+        professional_id: int,
+        service_id: int,
+        date_str: str,
+        exclude_peak: bool = False,
+        prefix: str = ""
+    ):
+        """Mostra apenas os horários realmente livres (e permitidos ao cliente) no dia"""
+        day = datetime.strptime(date_str, "%Y-%m-%d")
+        slots = await self._run_db(
+            lambda db: AppointmentService(db).get_available_slots(professional_id, day, service_id)
+        )
         available_times = [
-            "08:00", "09:00", "10:00",
-            "14:00", "15:00", "16:00"
+            slot["time"] for slot in slots
+            if not (exclude_peak and slot["is_peak"])
         ]
 
         if not available_times:
-            await query.edit_message_text(
-                "❌ Não há horários disponíveis para esta data.",
+            await self._edit(query,
+                f"{prefix}❌ Não há horários disponíveis para esta data.",
                 reply_markup=self.keyboards.back_button()
             )
             return
@@ -638,10 +803,9 @@ class TelegramHandlers:
         # Monta teclado de horários
         keyboard = self.keyboards.time_selection(available_times)
 
-        await query.edit_message_text(
-            f"📅 *Data selecionada:* {date_str}\n\n"
+        await self._edit(query,
+            f"{prefix}📅 *Data selecionada:* {day.strftime('%d/%m/%Y')}\n\n"
             "⏰ Agora escolha um horário:",
             parse_mode="Markdown",
             reply_markup=keyboard
         )
-
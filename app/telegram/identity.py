@@ -0,0 +1,159 @@
+"""
+Identidade dos usuários do bot
+
+Resolve o usuário do Telegram (dados básicos e ids dos perfis de cliente e
+profissional) em uma única consulta e guarda o resultado por
+TELEGRAM_IDENTITY_TTL_SECONDS, então cliques seguidos em botões não
+repetem a busca. Alterações em User ou nos perfis descartam a entrada no
+commit, pelos eventos do ORM; a validade curta cobre as mudanças feitas
+por outros processos.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.db.models import ClientProfile, ProfessionalProfile, ReliabilityLevel, User, UserRole
+
+
+class Identity:
+    """Dados do usuário usados pelos handlers, desacoplados da sessão"""
+    __slots__ = (
+        "user_id", "telegram_id", "name", "role",
+        "client_profile_id", "reliability_level", "professional_profile_id"
+    )
+
+    def __init__(
+        self,
+        user_id: int,
+        telegram_id: str,
+        name: str,
+        role: UserRole,
+        client_profile_id: Optional[int],
+        reliability_level: Optional[ReliabilityLevel],
+        professional_profile_id: Optional[int]
+    ):
+        self.user_id = user_id
+        self.telegram_id = telegram_id
+        self.name = name
+        self.role = role
+        self.client_profile_id = client_profile_id
+        self.reliability_level = reliability_level
+        self.professional_profile_id = professional_profile_id
+
+
+class IdentityCache:
+    """Cache de identidades por telegram_id, com validade curta"""
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or settings.TELEGRAM_IDENTITY_TTL_SECONDS
+        self._entries: Dict[str, Tuple[float, Identity]] = {}
+        self._by_user_id: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def cached(self, telegram_id) -> Optional[Identity]:
+        """Identidade em cache e ainda válida, sem consultar o banco"""
+        with self._lock:
+            entry = self._entries.get(str(telegram_id))
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+        return None
+
+    def resolve(self, db: Session, telegram_id) -> Optional[Identity]:
+        """Retorna a identidade do usuário ou None se ele não tem cadastro"""
+        identity = self.cached(telegram_id)
+        if identity is not None:
+            return identity
+
+        telegram_id = str(telegram_id)
+        now = time.monotonic()
+        row = db.query(
+            User.id,
+            User.name,
+            User.role,
+            ClientProfile.id,
+            ClientProfile.reliability_level,
+            ProfessionalProfile.id
+        ).outerjoin(
+            ClientProfile, ClientProfile.user_id == User.id
+        ).outerjoin(
+            ProfessionalProfile, ProfessionalProfile.user_id == User.id
+        ).filter(
+            User.telegram_id == telegram_id
+        ).first()
+
+        # Usuários sem cadastro não ficam em cache: o cadastro é imediato
+        if row is None:
+            return None
+
+        user_id, name, role, client_profile_id, reliability_level, professional_profile_id = row
+        identity = Identity(
+            user_id, telegram_id, name, role,
+            client_profile_id, reliability_level, professional_profile_id
+        )
+
+        with self._lock:
+            self._entries[telegram_id] = (now + self.ttl_seconds, identity)
+            self._by_user_id[user_id] = telegram_id
+            self._purge(now)
+
+        return identity
+
+    def invalidate_user(self, user_id: int):
+        """Descarta a identidade de um usuário pelo id interno"""
+        with self._lock:
+            telegram_id = self._by_user_id.pop(user_id, None)
+            if telegram_id is not None:
+                self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user_id.clear()
+
+    def _purge(self, now: float):
+        """Remove entradas vencidas quando o cache cresce"""
+        if len(self._entries) < settings.TELEGRAM_IDENTITY_MAX_ENTRIES:
+            return
+
+        for telegram_id, (expires_at, identity) in list(self._entries.items()):
+            if expires_at <= now:
+                del self._entries[telegram_id]
+                self._by_user_id.pop(identity.user_id, None)
+
+
+# Instância global do cache de identidades
+identity_cache = IdentityCache()
+
+
+def _user_changed(mapper, connection, target):
+    """Marca o usuário cuja identidade mudou"""
+    user_id = target.id if isinstance(target, User) else target.user_id
+    identity_cache.invalidate_user(user_id)
+
+    # Invalida de novo após o commit: outra sessão pode ter recarregado
+    # a identidade antiga entre o flush e o commit
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("identities_changed", set()).add(user_id)
+
+
+for _model in (User, ClientProfile, ProfessionalProfile):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _user_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    for user_id in session.info.pop("identities_changed", ()):
+        identity_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    for user_id in session.info.pop("identities_changed", ()):
+        identity_cache.invalidate_user(user_id)
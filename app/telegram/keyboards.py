@@ -66,21 +66,33 @@ class Keyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
-    def date_selection():
-        """Teclado para seleção de data (próximos 7 dias)"""
+    def date_selection(free_slots_by_day: dict = None):
+        """
+        Teclado para seleção de data (próximos 7 dias)
+        
+        free_slots_by_day: quantidade de horários livres por dia (meia-noite
+        -> total); quando informado, dias lotados não aparecem e cada botão
+        mostra quantos horários restam.
+        """
         from datetime import datetime, timedelta
         
         keyboard = []
-        today = datetime.now()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         
         for i in range(7):
             date = today + timedelta(days=i)
             day_name = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"][date.weekday()]
-            date_str = date.strftime("%d/%m")
+            label = f"{day_name} {date.strftime('%d/%m')}"
+            
+            if free_slots_by_day is not None:
+                free = free_slots_by_day.get(date, 0)
+                if not free:
+                    continue
+                label += f" ({free} {'horário' if free == 1 else 'horários'})"
             
             keyboard.append([
                 InlineKeyboardButton(
-                    f"{day_name} {date_str}",
+                    label,
                     callback_data=f"date_{date.strftime('%Y-%m-%d')}"
                 )
             ])
@@ -0,0 +1,242 @@
+"""
+Fila de saída de mensagens do Telegram
+
+Todas as mensagens do bot (respostas dos handlers, lembretes e futuros
+envios em massa) passam por aqui para respeitar os limites do Telegram:
+
+- token bucket global (TELEGRAM_GLOBAL_RATE mensagens por segundo) e um
+  por chat (TELEGRAM_PER_CHAT_RATE, com rajada de TELEGRAM_PER_CHAT_BURST);
+- cada chat tem sua própria fila, esvaziada em ordem por uma tarefa: um
+  chat no limite não atrasa os demais;
+- RetryAfter pausa os envios pelo tempo pedido e a mensagem é reenviada;
+- edições pendentes da mesma mensagem são fundidas: só a última é enviada.
+
+Os buckets medem o tempo com time.monotonic sob uma trava de thread, então
+são compartilhados mesmo entre event loops diferentes (bot em polling numa
+thread e agendador de lembretes no loop da aplicação). As filas são por
+event loop e chat. Contadores ficam disponíveis em stats().
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from telegram.error import RetryAfter
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket com reserva: quem chega tarde recebe o tempo de espera"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Reserva uma ficha; retorna quantos segundos esperar antes de usá-la"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    @property
+    def idle(self) -> bool:
+        """Bucket cheio: pode ser descartado sem perder informação"""
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return self._tokens + elapsed * self.rate >= self.capacity
+
+
+class _Job:
+    __slots__ = ("method", "kwargs", "future", "edit_key")
+
+    def __init__(self, method: Callable[..., Awaitable[Any]], kwargs: Dict, future: asyncio.Future, edit_key):
+        self.method = method
+        self.kwargs = kwargs
+        self.future = future
+        self.edit_key = edit_key
+
+
+class Outbox:
+    """Fila de saída com limite de taxa global e por chat"""
+
+    def __init__(
+        self,
+        global_rate: Optional[float] = None,
+        per_chat_rate: Optional[float] = None,
+        per_chat_burst: Optional[int] = None,
+        max_retries: Optional[int] = None
+    ):
+        self._global = TokenBucket(global_rate or settings.TELEGRAM_GLOBAL_RATE)
+        self.per_chat_rate = per_chat_rate or settings.TELEGRAM_PER_CHAT_RATE
+        self.per_chat_burst = per_chat_burst or settings.TELEGRAM_PER_CHAT_BURST
+        self.max_retries = settings.TELEGRAM_SEND_MAX_RETRIES if max_retries is None else max_retries
+
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._queues: Dict[Tuple[int, Any], Deque[_Job]] = {}
+        self._pending_edits: Dict[Tuple, _Job] = {}
+        self._workers = set()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"sent": 0, "failed": 0, "retried": 0, "coalesced": 0}
+
+    async def send_message(self, bot, chat_id, text: str, **kwargs):
+        """Envia uma mensagem; retorna a Message enviada"""
+        return await self._enqueue(chat_id, bot.send_message, dict(chat_id=chat_id, text=text, **kwargs))
+
+    async def edit_message_text(self, bot, chat_id, message_id: int, text: str, **kwargs):
+        """Edita uma mensagem; edições ainda pendentes da mesma mensagem são substituídas"""
+        return await self._enqueue(
+            chat_id,
+            bot.edit_message_text,
+            dict(chat_id=chat_id, message_id=message_id, text=text, **kwargs),
+            edit_key=(chat_id, message_id)
+        )
+
+    def submit(self, bot, chat_id, text: str, **kwargs) -> asyncio.Future:
+        """Enfileira uma mensagem sem aguardar o envio (falhas vão para o log)"""
+        future = self._enqueue(chat_id, bot.send_message, dict(chat_id=chat_id, text=text, **kwargs))
+        future.add_done_callback(_log_failure)
+        return future
+
+    def stats(self) -> Dict:
+        """Mensagens enviadas, com falha, reenviadas, edições fundidas e pendentes"""
+        with self._lock:
+            return {
+                **self._counters,
+                "pending": sum(len(queue) for queue in self._queues.values()),
+                "active_chats": len(self._queues)
+            }
+
+    def _enqueue(self, chat_id, method, kwargs: Dict, edit_key=None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        queue_key = (id(loop), chat_id)
+
+        with self._lock:
+            if edit_key is not None:
+                pending = self._pending_edits.get((id(loop),) + edit_key)
+                if pending is not None:
+                    pending.kwargs = kwargs
+                    self._counters["coalesced"] += 1
+                    return pending.future
+
+            job = _Job(method, kwargs, loop.create_future(), edit_key)
+
+            queue = self._queues.get(queue_key)
+            start_worker = queue is None
+            if start_worker:
+                queue = self._queues[queue_key] = deque()
+            queue.append(job)
+
+            if edit_key is not None:
+                self._pending_edits[(id(loop),) + edit_key] = job
+
+        if start_worker:
+            # Guarda a referência: o event loop mantém só referências fracas às tarefas
+            task = loop.create_task(self._drain(queue_key, chat_id))
+            self._workers.add(task)
+            task.add_done_callback(self._workers.discard)
+
+        return job.future
+
+    async def _drain(self, queue_key: Tuple[int, Any], chat_id):
+        """Esvazia a fila de um chat, em ordem"""
+        try:
+            while True:
+                with self._lock:
+                    queue = self._queues[queue_key]
+                    if not queue:
+                        del self._queues[queue_key]
+                        bucket = self._chat_buckets.get(chat_id)
+                        if bucket is not None and bucket.idle:
+                            del self._chat_buckets[chat_id]
+                        return
+
+                    job = queue.popleft()
+                    if job.edit_key is not None:
+                        # A partir daqui novas edições formam outro envio
+                        self._pending_edits.pop((queue_key[0],) + job.edit_key, None)
+
+                await self._send(job, chat_id)
+        finally:
+            # Tarefa cancelada (encerramento do loop): descarta o que sobrou
+            with self._lock:
+                leftover = self._queues.pop(queue_key, None) or ()
+                for job in leftover:
+                    if job.edit_key is not None:
+                        self._pending_edits.pop((queue_key[0],) + job.edit_key, None)
+                    job.future.cancel()
+
+    async def _send(self, job: _Job, chat_id):
+        """Envia respeitando os limites; RetryAfter pausa e tenta de novo"""
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(chat_id)
+            try:
+                result = await job.method(**job.kwargs)
+            except RetryAfter as e:
+                self._count("retried")
+                self._pause(e.retry_after)
+                logger.warning(f"Limite do Telegram atingido, pausando envios por {e.retry_after}s")
+                error = e
+                continue
+            except Exception as e:
+                self._count("failed")
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+
+            self._count("sent")
+            if not job.future.done():
+                job.future.set_result(result)
+            return
+
+        self._count("failed")
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    async def _wait_turn(self, chat_id):
+        """Aguarda pausa por RetryAfter, a vez do chat e uma ficha global"""
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+
+        paused = self._paused_until - time.monotonic()
+        if paused > 0:
+            await asyncio.sleep(paused)
+
+        wait = bucket.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+        wait = self._global.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def _pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + float(seconds))
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+
+def _log_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Falha ao enviar mensagem pela fila: {future.exception()}")
+
+
+# Instância global da fila de saída
+outbox = Outbox()
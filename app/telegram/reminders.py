@@ -0,0 +1,237 @@
+"""
+Agendador de lembretes do Telegram
+
+Tarefa asyncio iniciada no lifespan da aplicação. A instância tenta
+adquirir a lease "reminders"; só a líder mantém a fila de prazos em
+memória (reminder_queue) e retira dela os lembretes vencidos. Cada lote é
+reivindicado no banco antes do envio (um UPDATE condicional), enviado a
+até REMINDER_SEND_RATE mensagens por segundo, e as falhas temporárias são
+devolvidas. Assim nenhum lembrete sai duas vezes, mesmo que a lease
+expire durante esperas por RetryAfter. A próxima verificação acontece
+no prazo mais próximo da fila, no máximo após REMINDER_POLL_SECONDS.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from app.config import settings
+from app.core.reminder_queue import reminder_queue
+from app.core.reminder_service import ReminderService
+from app.db.session import AsyncSessionLocal
+from app.telegram.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+SendFunction = Callable[[str, str], Awaitable[None]]
+
+
+def format_reminder(kind: str, reminder: Dict) -> str:
+    """Monta o texto do lembrete"""
+    when = reminder["scheduled_date"].strftime('%d/%m/%Y às %H:%M')
+    header = "⏰ *Seu horário é daqui a pouco!*" if kind == "1h" else "🔔 *Lembrete de agendamento*"
+
+    return (
+        f"{header}\n\n"
+        f"Olá, {reminder['client_name']}!\n\n"
+        f"✂️ {reminder['service_name']}\n"
+        f"👤 Com: {reminder['professional_name']}\n"
+        f"📅 {when}\n\n"
+        f"Se não puder comparecer, cancele pelo /menu."
+    )
+
+
+class ReminderScheduler:
+    """Envia os lembretes de agendamento em segundo plano"""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        send: Optional[SendFunction] = None
+    ):
+        self.session_factory = session_factory
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._send = send
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._synced_at: Optional[datetime] = None
+
+    async def start(self):
+        """Inicia a tarefa periódica"""
+        if self._send is None:
+            if not settings.TELEGRAM_BOT_TOKEN:
+                logger.warning("TELEGRAM_BOT_TOKEN não configurado: lembretes desativados")
+                return
+            self._bot = Bot(settings.TELEGRAM_BOT_TOKEN)
+            await self._bot.initialize()
+            self._send = self._send_telegram
+
+        self._task = asyncio.create_task(self._run_forever())
+        logger.info(f"⏰ Agendador de lembretes iniciado ({self.owner})")
+
+    async def stop(self):
+        """Encerra a tarefa e libera a lease para outra instância"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            async with self.session_factory() as db:
+                await db.run_sync(lambda session: ReminderService(session).release_lease(self.owner))
+        except Exception as e:
+            logger.warning(f"Não foi possível liberar a lease de lembretes: {e}")
+
+        if self._bot:
+            await self._bot.shutdown()
+            self._bot = None
+
+    async def _run_forever(self):
+        """Laço principal: verifica no prazo mais próximo da fila"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro ao enviar lembretes: {e}")
+
+            await asyncio.sleep(self._next_wait())
+
+    def _next_wait(self) -> float:
+        """Segundos até o próximo prazo da fila, limitado a REMINDER_POLL_SECONDS"""
+        wait = float(settings.REMINDER_POLL_SECONDS)
+        deadline = reminder_queue.next_deadline()
+        if deadline is not None:
+            wait = min(wait, max(1.0, (deadline - datetime.now()).total_seconds()))
+        return wait
+
+    def _refill_queue(self, session, now: datetime):
+        """Estende a fila; recarrega do zero a cada REMINDER_QUEUE_RESYNC_SECONDS"""
+        resync = timedelta(seconds=settings.REMINDER_QUEUE_RESYNC_SECONDS)
+        if self._synced_at is None or now - self._synced_at >= resync:
+            reminder_queue.reset()
+            self._synced_at = now
+
+        reminder_queue.refill(session, now)
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        """Envia os lembretes vencidos se esta instância for a líder; retorna quantos foram enviados"""
+        now = now or datetime.now()
+        sent = 0
+
+        async with self.session_factory() as db:
+            first_batch = True
+            while True:
+                # Renova a lease a cada lote: se outra instância assumiu, para
+                is_leader = await db.run_sync(lambda session: ReminderService(session).acquire_lease(
+                    self.owner, settings.REMINDER_LEASE_SECONDS
+                ))
+                if not is_leader:
+                    # A fila deixa de receber as mudanças da líder: recarrega ao assumir
+                    self._synced_at = None
+                    reminder_queue.reset()
+                    return sent
+
+                if first_batch:
+                    await db.run_sync(lambda session: self._refill_queue(session, now))
+                    first_batch = False
+
+                due = reminder_queue.pop_due(now, settings.REMINDER_BATCH_SIZE)
+                if not due:
+                    break
+
+                for kind, appointment_ids in due.items():
+                    reminders = await db.run_sync(lambda session: ReminderService(session).get_due_reminders(
+                        kind, now, len(appointment_ids), appointment_ids
+                    ))
+                    if not reminders:
+                        continue
+
+                    # Reivindica antes de enviar: outra instância não envia os mesmos
+                    claimed = set(await db.run_sync(lambda session: ReminderService(session).claim(
+                        kind, [reminder["appointment_id"] for reminder in reminders]
+                    )))
+                    reminders = [r for r in reminders if r["appointment_id"] in claimed]
+                    if not reminders:
+                        continue
+
+                    delivered = set(await self._send_batch(kind, reminders))
+                    sent += len(delivered)
+
+                    # Falhas temporárias são devolvidas e voltam para a fila até a próxima verificação
+                    failed = [r for r in reminders if r["appointment_id"] not in delivered]
+                    if failed:
+                        await db.run_sync(lambda session: ReminderService(session).release(
+                            kind, [reminder["appointment_id"] for reminder in failed]
+                        ))
+                        reminder_queue.retry(
+                            kind,
+                            [(reminder["appointment_id"], reminder["scheduled_date"]) for reminder in failed],
+                            now + timedelta(seconds=settings.REMINDER_POLL_SECONDS)
+                        )
+
+        if sent:
+            logger.info(f"⏰ {sent} lembrete(s) enviado(s)")
+
+        return sent
+
+    async def _send_batch(self, kind: str, reminders: List[Dict]) -> List[int]:
+        """Envia os lembretes respeitando REMINDER_SEND_RATE; retorna os agendamentos tratados"""
+        loop = asyncio.get_running_loop()
+        rate = max(1, settings.REMINDER_SEND_RATE)
+        delivered: List[int] = []
+
+        for position in range(0, len(reminders), rate):
+            window_start = loop.time()
+            chunk = reminders[position:position + rate]
+
+            results = await asyncio.gather(*(self._deliver(kind, reminder) for reminder in chunk))
+            delivered.extend(
+                reminder["appointment_id"]
+                for reminder, handled in zip(chunk, results)
+                if handled
+            )
+
+            if position + rate < len(reminders):
+                await asyncio.sleep(max(0.0, 1.0 - (loop.time() - window_start)))
+
+        return delivered
+
+    async def _deliver(self, kind: str, reminder: Dict) -> bool:
+        """
+        Envia um lembrete
+
+        Retorna False apenas em falhas temporárias (nova tentativa na próxima
+        verificação); chats bloqueados ou inexistentes contam como tratados.
+        """
+        try:
+            await self._send(reminder["telegram_id"], format_reminder(kind, reminder))
+            return True
+        except (Forbidden, BadRequest) as e:
+            logger.warning(f"Lembrete do agendamento {reminder['appointment_id']} descartado: {e}")
+            return True
+        except RetryAfter as e:
+            logger.warning(f"Limite do Telegram atingido, aguardando {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+            return False
+        except TelegramError as e:
+            logger.error(f"Erro ao enviar lembrete do agendamento {reminder['appointment_id']}: {e}")
+            return False
+
+    async def _send_telegram(self, chat_id: str, text: str):
+        """Envia a mensagem pelo bot, via fila de saída (limites compartilhados com os handlers)"""
+        await outbox.send_message(self._bot, chat_id, text, parse_mode='Markdown')
+
+
+reminder_scheduler = ReminderScheduler()
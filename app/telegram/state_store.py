@@ -0,0 +1,180 @@
+"""
+Estado das conversas do bot
+
+Guarda o passo atual de cada usuário nos fluxos de cadastro e agendamento
+(ex.: {"state": "selecting_date", "service_id": 1}). Estados expiram após
+CONVERSATION_STATE_TTL_SECONDS sem alteração, então fluxos abandonados não
+se acumulam.
+
+- MemoryStateStore: LRU em memória limitada a CONVERSATION_STATE_MAX_ENTRIES;
+- SQLStateStore: tabela conversation_states, compartilhada por todas as
+  réplicas do bot (webhook com vários workers) e preservada em reinícios.
+
+Os handlers usam os métodos assíncronos (aget, aset, ...): backends com I/O
+bloqueante rodam numa thread, sem travar o event loop.
+"""
+
+import asyncio
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from app.config import settings
+from app.db.models import ConversationState
+from app.db.session import SessionLocal
+
+# Gravações entre limpezas dos estados vencidos na tabela
+PURGE_EVERY = 500
+
+
+class StateStore:
+    """Interface dos backends de estado de conversa"""
+
+    # Backend faz I/O bloqueante: os métodos assíncronos usam uma thread
+    blocking = False
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        """Retorna o estado do usuário ou None"""
+        raise NotImplementedError
+
+    def set(self, user_id: int, state: Dict):
+        """Substitui o estado do usuário, renovando a validade"""
+        raise NotImplementedError
+
+    def delete(self, user_id: int):
+        """Remove o estado do usuário (se existir)"""
+        raise NotImplementedError
+
+    def update(self, user_id: int, **values):
+        """Acrescenta valores ao estado do usuário, criando-o se necessário"""
+        state = self.get(user_id) or {}
+        state.update(values)
+        self.set(user_id, state)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id) is not None
+
+    async def aget(self, user_id: int) -> Optional[Dict]:
+        return await self._run(self.get, user_id)
+
+    async def aset(self, user_id: int, state: Dict):
+        await self._run(self.set, user_id, state)
+
+    async def adelete(self, user_id: int):
+        await self._run(self.delete, user_id)
+
+    async def aupdate(self, user_id: int, **values):
+        await self._run(functools.partial(self.update, user_id, **values))
+
+    async def _run(self, fn, *args):
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+
+class _Entry:
+    __slots__ = ("state", "expires_at")
+
+    def __init__(self, state: Dict, expires_at: float):
+        self.state = state
+        self.expires_at = expires_at
+
+
+class MemoryStateStore(StateStore):
+    """Estados em memória, com LRU e validade"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        self.max_entries = max_entries or settings.CONVERSATION_STATE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or settings.CONVERSATION_STATE_TTL_SECONDS
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            return dict(entry.state)
+
+    def set(self, user_id: int, state: Dict):
+        with self._lock:
+            self._entries[user_id] = _Entry(dict(state), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class SQLStateStore(StateStore):
+    """Estados na tabela conversation_states (um JSON por usuário)"""
+
+    blocking = True
+
+    def __init__(self, session_factory=SessionLocal, ttl_seconds: Optional[int] = None):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds or settings.CONVERSATION_STATE_TTL_SECONDS
+        self._writes = 0
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        db = self.session_factory()
+        try:
+            row = db.query(ConversationState.data).filter(
+                ConversationState.user_id == str(user_id),
+                ConversationState.expires_at > datetime.utcnow()
+            ).first()
+            return json.loads(row[0]) if row else None
+        finally:
+            db.close()
+
+    def set(self, user_id: int, state: Dict):
+        db = self.session_factory()
+        try:
+            db.merge(ConversationState(
+                user_id=str(user_id),
+                data=json.dumps(state),
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+            ))
+
+            # Limpa estados vencidos de tempos em tempos, pelo índice de expires_at
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                db.query(ConversationState).filter(
+                    ConversationState.expires_at <= datetime.utcnow()
+                ).delete(synchronize_session=False)
+
+            db.commit()
+        finally:
+            db.close()
+
+    def delete(self, user_id: int):
+        db = self.session_factory()
+        try:
+            db.query(ConversationState).filter(
+                ConversationState.user_id == str(user_id)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+def create_state_store() -> StateStore:
+    """Cria o backend configurado em CONVERSATION_STATE_BACKEND"""
+    backend = settings.CONVERSATION_STATE_BACKEND
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend == "sql":
+        return SQLStateStore()
+    raise ValueError(f"Backend de estado de conversa desconhecido: {backend}")
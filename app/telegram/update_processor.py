@@ -0,0 +1,91 @@
+"""
+Processamento concorrente de updates do bot
+
+Updates de usuários diferentes rodam em paralelo (até
+TELEGRAM_MAX_CONCURRENT_UPDATES ao mesmo tempo, nunca mais que as conexões
+do pool do banco), então uma resposta lenta da IA não atrasa os outros
+chats. Updates do mesmo usuário continuam em
+ordem: cada um espera a trava do usuário antes de ocupar uma vaga, e assim
+os cliques aplicam-se em sequência sobre o estado da conversa.
+
+Quando mais de TELEGRAM_MAX_PENDING_UPDATES updates estão em andamento ou
+esperando (banco ou IA saturados), saturated fica verdadeiro e o webhook
+recusa novos updates com 503; o Telegram os reenvia depois.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from app.config import settings
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Concorrência entre usuários, ordem garantida para cada usuário"""
+
+    def __init__(self, max_concurrent_updates: Optional[int] = None):
+        # Cada update usa uma conexão do pool síncrono enquanto consulta o
+        # banco: mais updates simultâneos que conexões só gerariam espera
+        pool_limit = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        limit = min(max_concurrent_updates or settings.TELEGRAM_MAX_CONCURRENT_UPDATES, pool_limit)
+
+        # O semáforo da classe base só limita os pendentes: a vaga de
+        # concorrência é tomada depois da trava do usuário, em do_process_update
+        super().__init__(max(limit, settings.TELEGRAM_MAX_PENDING_UPDATES))
+        self.limit = limit
+        self._slots = asyncio.BoundedSemaphore(limit)
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._waiting: Dict[int, int] = {}
+        self.pending = 0
+
+    @property
+    def saturated(self) -> bool:
+        """Muitos updates em andamento: hora de recusar novos"""
+        return self.pending >= settings.TELEGRAM_MAX_PENDING_UPDATES
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Espera a vez do usuário e só então ocupa uma vaga de concorrência"""
+        key = self._user_key(update)
+        self.pending += 1
+        try:
+            if key is None:
+                async with self._slots:
+                    await coroutine
+                return
+
+            lock = self._user_locks.get(key)
+            if lock is None:
+                lock = self._user_locks[key] = asyncio.Lock()
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+
+            try:
+                async with lock:
+                    async with self._slots:
+                        await coroutine
+            finally:
+                # Último update do usuário: descarta a trava
+                self._waiting[key] -= 1
+                if not self._waiting[key]:
+                    del self._waiting[key]
+                    del self._user_locks[key]
+        finally:
+            self.pending -= 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @staticmethod
+    def _user_key(update: object) -> Optional[int]:
+        """Usuário (ou chat) que define a ordem do update"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
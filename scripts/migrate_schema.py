@@ -0,0 +1,201 @@
+"""
+Script para atualizar bancos criados antes das mudanças de esquema dos agendamentos
+Execute: python scripts/migrate_schema.py
+
+create_all só cria tabelas que não existem; este script aplica às tabelas
+antigas o que faltou:
+
+- appointments.scheduled_end, preenchida com início + duração do serviço;
+- appointments.service_price, preenchida com o preço atual do serviço;
+- índices compostos de appointments;
+- PostgreSQL: constraint de exclusão contra agendamentos sobrepostos;
+- unicidade de financial_records.appointment_id.
+
+Pode ser executado mais de uma vez: só aplica o que ainda não existe.
+"""
+
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import bindparam, inspect, select, text, update
+
+from app.db.session import engine, init_db
+from app.db.models import (
+    Appointment, FinancialRecord, Service,
+    BTREE_GIST_EXTENSION, OVERLAP_CONSTRAINT, OVERLAP_CONSTRAINT_DDL
+)
+
+BATCH_SIZE = 1000
+
+FINANCIAL_UNIQUE_INDEX = "ux_financial_records_appointment_id"
+
+def add_scheduled_end(conn) -> int:
+    """Cria a coluna scheduled_end e preenche com início + duração do serviço"""
+    columns = {column["name"] for column in inspect(conn).get_columns("appointments")}
+    if "scheduled_end" in columns:
+        return 0
+
+    # SQLite não aceita ADD COLUMN NOT NULL sem default: a coluna nasce
+    # anulável e o NOT NULL fica só no PostgreSQL
+    conn.execute(text("ALTER TABLE appointments ADD COLUMN scheduled_end TIMESTAMP"))
+
+    # Calculado em Python para gravar no mesmo formato de data do SQLAlchemy
+    # (no SQLite as datas são texto e comparadas como texto)
+    rows = conn.execute(
+        select(Appointment.id, Appointment.scheduled_date, Service.duration_minutes)
+        .join(Service, Appointment.service_id == Service.id)
+    ).all()
+
+    statement = (
+        update(Appointment.__table__)
+        .where(Appointment.__table__.c.id == bindparam("appointment_id"))
+        .values(scheduled_end=bindparam("end"))
+    )
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(statement, [
+            {
+                "appointment_id": appointment_id,
+                "end": scheduled_date + timedelta(minutes=duration_minutes)
+            }
+            for appointment_id, scheduled_date, duration_minutes in rows[start:start + BATCH_SIZE]
+        ])
+
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE appointments ALTER COLUMN scheduled_end SET NOT NULL"))
+
+    return len(rows)
+
+def add_service_price(conn) -> int:
+    """Cria a coluna service_price e preenche com o preço atual do serviço"""
+    columns = {column["name"] for column in inspect(conn).get_columns("appointments")}
+    if "service_price" in columns:
+        return 0
+
+    conn.execute(text("ALTER TABLE appointments ADD COLUMN service_price FLOAT"))
+
+    # O preço da época da reserva não foi guardado: o atual é a melhor aproximação
+    prices = select(Service.price).where(Service.id == Appointment.__table__.c.service_id)
+    result = conn.execute(
+        update(Appointment.__table__).values(service_price=prices.scalar_subquery())
+    )
+
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE appointments ALTER COLUMN service_price SET NOT NULL"))
+
+    return result.rowcount
+
+def create_indexes(conn) -> list:
+    """Cria os índices de appointments que ainda não existem"""
+    existing = {index["name"] for index in inspect(conn).get_indexes("appointments")}
+
+    created = []
+    for index in Appointment.__table__.indexes:
+        if index.name not in existing:
+            index.create(conn)
+            created.append(index.name)
+
+    return created
+
+def add_overlap_constraint(conn) -> bool:
+    """PostgreSQL: cria a constraint de exclusão de sobreposição"""
+    if conn.dialect.name != "postgresql":
+        return False
+
+    exists = conn.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+        {"name": OVERLAP_CONSTRAINT}
+    ).first()
+    if exists:
+        return False
+
+    overlaps = conn.execute(text(
+        "SELECT a.id, b.id FROM appointments a JOIN appointments b "
+        "ON a.professional_id = b.professional_id AND a.id < b.id "
+        "AND a.scheduled_date < b.scheduled_end AND b.scheduled_date < a.scheduled_end "
+        "WHERE a.status IN ('SCHEDULED', 'CONFIRMED') AND b.status IN ('SCHEDULED', 'CONFIRMED') "
+        "LIMIT 20"
+    )).all()
+    if overlaps:
+        pairs = ", ".join(f"{a}/{b}" for a, b in overlaps)
+        raise RuntimeError(
+            f"Agendamentos ativos sobrepostos impedem a constraint (ids: {pairs}). "
+            "Cancele ou remarque-os e execute o script novamente."
+        )
+
+    conn.execute(BTREE_GIST_EXTENSION)
+    conn.execute(OVERLAP_CONSTRAINT_DDL)
+    return True
+
+def add_financial_unique(conn) -> bool:
+    """Garante um lançamento por atendimento em financial_records"""
+    inspector = inspect(conn)
+    unique_columns = [
+        constraint["column_names"]
+        for constraint in inspector.get_unique_constraints("financial_records")
+    ] + [
+        index["column_names"]
+        for index in inspector.get_indexes("financial_records")
+        if index["unique"]
+    ]
+    if ["appointment_id"] in unique_columns:
+        return False
+
+    duplicates = conn.execute(
+        select(FinancialRecord.appointment_id)
+        .where(FinancialRecord.appointment_id.isnot(None))
+        .group_by(FinancialRecord.appointment_id)
+        .having(text("COUNT(*) > 1"))
+        .limit(20)
+    ).scalars().all()
+    if duplicates:
+        ids = ", ".join(str(appointment_id) for appointment_id in duplicates)
+        raise RuntimeError(
+            f"Atendimentos com mais de um lançamento financeiro (ids: {ids}). "
+            "Remova os lançamentos duplicados e execute o script novamente."
+        )
+
+    # Índice único: mesmo efeito da constraint e suportado pelo SQLite sem recriar a tabela
+    conn.execute(text(
+        f"CREATE UNIQUE INDEX {FINANCIAL_UNIQUE_INDEX} ON financial_records (appointment_id)"
+    ))
+    return True
+
+def migrate_schema():
+    """Aplica as mudanças de esquema pendentes em uma única transação"""
+
+    # Tabelas novas (rollup, lease, estados de conversa)
+    init_db()
+
+    print("🔄 Atualizando esquema do banco...")
+
+    try:
+        with engine.begin() as conn:
+            filled = add_scheduled_end(conn)
+            if filled:
+                print(f"✅ scheduled_end criada e preenchida em {filled} agendamentos")
+
+            priced = add_service_price(conn)
+            if priced:
+                print(f"✅ service_price criada e preenchida em {priced} agendamentos")
+
+            for name in create_indexes(conn):
+                print(f"✅ Índice criado: {name}")
+
+            if add_overlap_constraint(conn):
+                print(f"✅ Constraint criada: {OVERLAP_CONSTRAINT}")
+
+            if add_financial_unique(conn):
+                print(f"✅ Índice único criado: {FINANCIAL_UNIQUE_INDEX}")
+    except Exception as e:
+        print(f"\n❌ Erro ao atualizar esquema: {e}")
+        raise
+
+    print("✅ Esquema atualizado!")
+    print("ℹ️  Para preencher o rollup diário com o histórico: python scripts/rebuild_rollups.py")
+
+if __name__ == "__main__":
+    migrate_schema()
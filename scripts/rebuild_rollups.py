@@ -0,0 +1,46 @@
+"""
+Script para recalcular o rollup diário de agendamentos (backfill)
+Execute: python scripts/rebuild_rollups.py [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db.session import SessionLocal, init_db
+from app.core.rollup_service import RollupService
+
+def parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def rebuild_rollups(start=None, end=None):
+    """Recria as linhas do rollup no período (ou todas)"""
+    
+    init_db()
+    db = SessionLocal()
+    
+    try:
+        period = f"{start or 'início'} até {end or 'hoje'}"
+        print(f"🔄 Recalculando rollup diário ({period})...")
+        
+        rows = RollupService(db).rebuild(start, end)
+        
+        print(f"✅ Rollup recalculado: {rows} linhas geradas")
+    except Exception as e:
+        print(f"\n❌ Erro ao recalcular rollup: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula o rollup diário de agendamentos")
+    parser.add_argument("--start", type=parse_date, help="Data inicial (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_date, help="Data final, inclusive (YYYY-MM-DD)")
+    args = parser.parse_args()
+    
+    rebuild_rollups(args.start, args.end)
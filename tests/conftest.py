@@ -0,0 +1,60 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import create_db_engine
+from app.db.models import (
+    Base, User, UserRole, ClientProfile, ProfessionalProfile,
+    ProfessionalService, Service
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Banco SQLite em arquivo, compartilhável entre threads"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def seed(db):
+    """Cria um cliente, um profissional e um serviço de 30 minutos"""
+    client_user = User(telegram_id="100", name="Cliente Teste", role=UserRole.CLIENT)
+    professional_user = User(telegram_id="200", name="Profissional Teste", role=UserRole.PROFESSIONAL)
+    db.add_all([client_user, professional_user])
+    db.flush()
+
+    client = ClientProfile(user_id=client_user.id)
+    professional = ProfessionalProfile(user_id=professional_user.id, specialty="Cabelo")
+    service = Service(name="Corte", price=35.0, duration_minutes=30)
+    db.add_all([client, professional, service])
+    db.flush()
+
+    db.add(ProfessionalService(professional_id=professional.id, service_id=service.id))
+    db.commit()
+
+    return {
+        "client_id": client.id,
+        "professional_id": professional.id,
+        "service_id": service.id,
+    }
+
+
+@pytest.fixture
+def tomorrow_at_ten():
+    tomorrow = datetime.now() + timedelta(days=1)
+    return tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
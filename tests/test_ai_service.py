@@ -0,0 +1,103 @@
+import asyncio
+
+import anthropic
+import httpx
+import pytest
+
+import app.core.ai_service as ai_module
+from app.config import settings
+from app.core.ai_service import AIService
+from app.core.intent_cache import IntentCache
+
+CHAT_FALLBACK = "Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente."
+
+
+@pytest.fixture(autouse=True)
+def isolated_intent_cache(monkeypatch):
+    monkeypatch.setattr(ai_module, "intent_cache", IntentCache(path=""))
+
+
+@pytest.fixture
+def ai():
+    service = AIService(backend="stub")
+    calls = []
+    create = service.client.messages.create
+
+    async def counting_create(**kwargs):
+        calls.append(kwargs)
+        return await create(**kwargs)
+
+    service.client.messages.create = counting_create
+    service.calls = calls
+    return service
+
+
+def _timeout_error():
+    return anthropic.APITimeoutError(request=httpx.Request("POST", "https://api.anthropic.com"))
+
+
+@pytest.mark.asyncio
+async def test_chat_with_intent_skips_the_analysis_call_on_a_rule_hit(ai):
+    response, intent = await ai.chat_with_intent("quero cancelar meu agendamento")
+
+    assert response == "Olá! Como posso ajudar com o seu agendamento?"
+    assert intent["intent"] == "cancel"
+    assert intent["source"] == "rules"
+    assert len(ai.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_chat_with_intent_asks_the_model_for_ambiguous_messages(ai):
+    response, intent = await ai.chat_with_intent("meu agendamento está confirmado?")
+
+    assert response == "Olá! Como posso ajudar com o seu agendamento?"
+    assert intent["intent"] == "other"
+    assert "source" not in intent
+    assert len(ai.calls) == 2
+
+    # A análise repetida vem do cache de intenções
+    await ai.chat_with_intent("Meu agendamento está confirmado")
+    assert len(ai.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_slow_api_falls_back_within_the_total_timeout(ai, monkeypatch):
+    monkeypatch.setattr(settings, "AI_TIMEOUT_SECONDS", 0.2)
+
+    async def hang(**kwargs):
+        await asyncio.sleep(5)
+
+    ai.client.messages.create = hang
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    response, intent = await ai.chat_with_intent("meu agendamento está confirmado?")
+
+    assert loop.time() - started < 1
+    assert response == CHAT_FALLBACK
+    assert intent["intent"] == "other"
+    assert "error" in intent
+
+
+@pytest.mark.asyncio
+async def test_retry_after_a_timeout_fits_in_the_total_budget(ai, monkeypatch):
+    monkeypatch.setattr(settings, "AI_TIMEOUT_SECONDS", 1.0)
+    monkeypatch.setattr(settings, "AI_MAX_RETRIES", 1)
+    monkeypatch.setattr(ai_module, "RETRY_DELAY_SECONDS", 0.05)
+    create = ai.client.messages.create
+    timeouts = []
+
+    async def first_try_times_out(timeout, **kwargs):
+        # Como o SDK: a tentativa dura no máximo o timeout recebido
+        timeouts.append(timeout)
+        if len(timeouts) == 1:
+            await asyncio.sleep(timeout)
+            raise _timeout_error()
+        return await create(timeout=timeout, **kwargs)
+
+    ai.client.messages.create = first_try_times_out
+
+    assert await ai.chat("Olá") == "Olá! Como posso ajudar com o seu agendamento?"
+    assert len(timeouts) == 2
+    assert timeouts[0] == pytest.approx(0.5, abs=0.05)
+    assert sum(timeouts) <= 1.0
@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.appointment_service import AppointmentService
+from app.core.async_appointment_service import AsyncAppointmentService
+from app.core.availability import AvailabilityIndex
+from app.core.booking_lock import _process_lock
+from app.db.models import Appointment, AppointmentStatus, Service
+from app.db.session import create_async_db_engine
+
+
+def test_concurrent_bookings_for_same_slot_create_a_single_appointment(
+    session_factory, seed, tomorrow_at_ten
+):
+    attempts = 200
+
+    def book(_):
+        db = session_factory()
+        try:
+            AppointmentService(db).create_appointment(
+                client_id=seed["client_id"],
+                professional_id=seed["professional_id"],
+                service_id=seed["service_id"],
+                scheduled_date=tomorrow_at_ten
+            )
+            return "booked"
+        except ValueError:
+            return "conflict"
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        results = list(pool.map(book, range(attempts)))
+
+    assert results.count("booked") == 1
+    assert results.count("conflict") == attempts - 1
+
+    db = session_factory()
+    try:
+        assert db.query(Appointment).filter_by(
+            professional_id=seed["professional_id"]
+        ).count() == 1
+    finally:
+        db.close()
+
+
+def _count_queries(engine, action):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        action()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements)
+
+
+def _book_many(session_factory, seed, first_slot, count):
+    db = session_factory()
+    try:
+        service = AppointmentService(db)
+        for i in range(count):
+            service.create_appointment(
+                client_id=seed["client_id"],
+                professional_id=seed["professional_id"],
+                service_id=seed["service_id"],
+                scheduled_date=first_slot + timedelta(minutes=30 * i)
+            )
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("list_size", [1, 10])
+def test_list_endpoints_issue_a_fixed_number_of_queries(
+    engine, session_factory, seed, tomorrow_at_ten, list_size
+):
+    _book_many(session_factory, seed, tomorrow_at_ten, list_size)
+
+    def render_client_list():
+        db = session_factory()
+        try:
+            appointments = AppointmentService(db).get_client_appointments(
+                seed["client_id"], profile="detail"
+            )
+            rendered = [
+                (apt.client.user.name, apt.professional.user.name,
+                 apt.service.name, apt.service.price)
+                for apt in appointments
+            ]
+            assert len(rendered) == list_size
+        finally:
+            db.close()
+
+    def render_professional_list():
+        db = session_factory()
+        try:
+            appointments = AppointmentService(db).get_professional_appointments(
+                seed["professional_id"], profile="detail"
+            )
+            rendered = [
+                (apt.client.user.name, apt.professional.user.name,
+                 apt.service.name, apt.service.price)
+                for apt in appointments
+            ]
+            assert len(rendered) == list_size
+        finally:
+            db.close()
+
+    assert _count_queries(engine, render_client_list) == 1
+    assert _count_queries(engine, render_professional_list) == 1
+
+
+def test_free_slots_merge_adjacent_blocks(tomorrow_at_ten):
+    index = AvailabilityIndex(tomorrow_at_ten, [(600, 630), (630, 660)])
+
+    assert len(index) == 1
+    assert index.free_slots(open_start=540, open_end=720, duration=30, step=30) == [540, 570, 660, 690]
+
+
+def test_free_slots_merge_overlapping_blocks_and_realign_after_them(tomorrow_at_ten):
+    index = AvailabilityIndex(tomorrow_at_ten, [(600, 650), (620, 640)])
+
+    assert len(index) == 1
+    # O bloco termina às 10:50: o próximo slot alinhado é 11:00
+    assert index.free_slots(open_start=540, open_end=720, duration=30, step=30) == [540, 570, 660, 690]
+
+
+def test_free_slots_align_not_before_to_the_slot_grid(tomorrow_at_ten):
+    index = AvailabilityIndex(tomorrow_at_ten)
+
+    assert index.free_slots(
+        open_start=480, open_end=600, duration=30, step=30, not_before=491
+    ) == [510, 540, 570]
+
+
+def test_free_slots_never_run_past_closing_time(tomorrow_at_ten):
+    assert AvailabilityIndex(tomorrow_at_ten).free_slots(
+        open_start=480, open_end=600, duration=45, step=30
+    ) == [480, 510, 540]
+
+    # 08:30 colidiria com o bloco; depois dele, 09:30 + 45 min passa do fechamento
+    busy = AvailabilityIndex(tomorrow_at_ten, [(540, 560)])
+    assert busy.free_slots(open_start=480, open_end=600, duration=45, step=30) == [480]
+
+
+@pytest.mark.asyncio
+async def test_async_booking_waits_for_the_professional_lock_off_the_event_loop(
+    tmp_path, engine, seed, tomorrow_at_ten
+):
+    async_engine = create_async_db_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        # Reserva do bot (numa thread) segurando a trava do profissional
+        with _process_lock(seed["professional_id"]):
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    held.wait(5)
+
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            booking = asyncio.ensure_future(AsyncAppointmentService(session).create_appointment(
+                client_id=seed["client_id"],
+                professional_id=seed["professional_id"],
+                service_id=seed["service_id"],
+                scheduled_date=tomorrow_at_ten
+            ))
+
+            # O event loop continua livre enquanto a reserva espera a trava
+            started = time.monotonic()
+            await asyncio.sleep(0.1)
+            assert time.monotonic() - started < 1
+            assert not booking.done()
+
+            release.set()
+            appointment = await asyncio.wait_for(booking, 5)
+            assert appointment.status == AppointmentStatus.SCHEDULED
+    finally:
+        release.set()
+        holder.join()
+        await async_engine.dispose()
+
+
+def test_slot_check_sees_long_bookings_that_started_earlier(db, seed, tomorrow_at_ten):
+    long_service = Service(name="Coloração", price=120.0, duration_minutes=150)
+    db.add(long_service)
+    db.commit()
+
+    service = AppointmentService(db)
+    service.create_appointment(
+        client_id=seed["client_id"],
+        professional_id=seed["professional_id"],
+        service_id=long_service.id,
+        scheduled_date=tomorrow_at_ten
+    )
+
+    # 10:00-12:30 ocupado: o limite inferior da consulta ainda alcança o início
+    for minutes, available in [(-30, True), (0, False), (120, False), (150, True)]:
+        assert service.is_time_slot_available(
+            seed["professional_id"], tomorrow_at_ten + timedelta(minutes=minutes), 30
+        ) is available
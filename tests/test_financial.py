@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+import pytest
+
+from app.core.appointment_service import AppointmentService
+from app.core.financial_service import SETTLEMENT_NOTE, FinancialService
+from app.db.models import (
+    Appointment, AppointmentStatus, FinancialRecord, ProfessionalProfile, Service
+)
+
+
+def _book(service, seed, scheduled_date):
+    return service.create_appointment(
+        client_id=seed["client_id"],
+        professional_id=seed["professional_id"],
+        service_id=seed["service_id"],
+        scheduled_date=scheduled_date
+    ).id
+
+
+def _set_commission(db, seed, percentage):
+    db.query(ProfessionalProfile).filter_by(id=seed["professional_id"]).update(
+        {"commission_percentage": percentage}
+    )
+    db.commit()
+
+
+def _records(db):
+    return db.query(FinancialRecord).order_by(FinancialRecord.appointment_id).all()
+
+
+def test_completion_splits_the_booked_price_between_commission_and_revenue(
+    db, seed, tomorrow_at_ten
+):
+    _set_commission(db, seed, 33.33)
+    service = AppointmentService(db)
+    appointment_id = _book(service, seed, tomorrow_at_ten)
+
+    # Preço alterado depois da reserva não muda o lançamento
+    db.query(Service).filter_by(id=seed["service_id"]).update({"price": 99.0})
+    db.commit()
+    service.complete_appointment(appointment_id)
+
+    [record] = _records(db)
+    assert record.appointment_id == appointment_id
+    assert record.service_price == 35.0
+    assert record.professional_commission == 11.67
+    assert record.business_revenue == 23.33
+    assert record.date == tomorrow_at_ten
+
+
+def test_record_completion_is_idempotent(db, seed, tomorrow_at_ten):
+    service = AppointmentService(db)
+    appointment_id = _book(service, seed, tomorrow_at_ten)
+    service.complete_appointment(appointment_id)
+
+    appointment = db.get(Appointment, appointment_id)
+    again = FinancialService(db).record_completion(appointment)
+    db.commit()
+
+    assert [record.id for record in _records(db)] == [again.id]
+
+
+@pytest.mark.parametrize("close", ["cancel_appointment", "mark_no_show"])
+def test_inactive_appointments_cannot_be_completed(db, seed, tomorrow_at_ten, close):
+    service = AppointmentService(db)
+    appointment_id = _book(service, seed, tomorrow_at_ten)
+    if close == "cancel_appointment":
+        service.cancel_appointment(appointment_id, "Imprevisto")
+    else:
+        service.mark_no_show(appointment_id)
+
+    with pytest.raises(ValueError):
+        service.complete_appointment(appointment_id)
+
+    assert db.get(Appointment, appointment_id).status != AppointmentStatus.COMPLETED
+    assert _records(db) == []
+
+
+def test_close_day_settles_only_appointments_without_a_record(db, seed, tomorrow_at_ten):
+    _set_commission(db, seed, 40.0)
+    service = AppointmentService(db)
+    recorded = _book(service, seed, tomorrow_at_ten)
+    pending = _book(service, seed, tomorrow_at_ten + timedelta(hours=1))
+    other_day = _book(service, seed, tomorrow_at_ten + timedelta(days=1))
+
+    service.complete_appointment(recorded)
+    # Completados sem lançamento (ex.: anteriores ao lançamento automático)
+    db.query(Appointment).filter(Appointment.id.in_([pending, other_day])).update(
+        {"status": AppointmentStatus.COMPLETED}, synchronize_session=False
+    )
+    db.commit()
+
+    financial = FinancialService(db)
+    assert financial.close_day(tomorrow_at_ten.date()) == 1
+    assert financial.close_day(tomorrow_at_ten.date()) == 0
+
+    records = _records(db)
+    assert [record.appointment_id for record in records] == [recorded, pending]
+    assert records[1].notes == SETTLEMENT_NOTE
+    # Fechamento em lote e lançamento individual fazem a mesma conta
+    for record in records:
+        assert record.service_price == 35.0
+        assert float(record.professional_commission) == 14.0
+        assert float(record.business_revenue) == 21.0
+
+
+def test_payouts_group_records_by_professional_within_the_period(db, seed, tomorrow_at_ten):
+    service = AppointmentService(db)
+    for offset in (timedelta(0), timedelta(hours=1), timedelta(days=1)):
+        service.complete_appointment(_book(service, seed, tomorrow_at_ten + offset))
+
+    day = tomorrow_at_ten.date()
+    payouts = FinancialService(db).get_payouts(day, day + timedelta(days=1))
+
+    assert payouts == [{
+        "professional_id": seed["professional_id"],
+        "professional_name": "Profissional Teste",
+        "appointments": 2,
+        "gross_revenue": 70.0,
+        "professional_commission": 35.0,
+        "business_revenue": 35.0
+    }]
+    assert FinancialService(db).get_payouts(day - timedelta(days=1), day) == []
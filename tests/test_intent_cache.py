@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.core.intent_cache import IntentCache
+
+ANALYSIS = {"intent": "schedule", "service_mentioned": "Corte"}
+
+
+@pytest.mark.asyncio
+async def test_entries_persist_across_instances_sharing_the_file(tmp_path):
+    path = str(tmp_path / "intents.db")
+
+    await IntentCache(path=path).aset("Quero marcar um horário!", ANALYSIS)
+
+    other_worker = IntentCache(path=path)
+    assert await other_worker.aget("quero marcar um horario") == ANALYSIS
+    assert other_worker.stats()["hits"] == 1
+    assert other_worker.stats()["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_locked_file_counts_as_a_miss_without_a_long_wait(tmp_path):
+    path = str(tmp_path / "intents.db")
+    cache = IntentCache(path=path)
+
+    # Outro worker segurando o arquivo
+    holder = sqlite3.connect(path)
+    holder.execute("BEGIN EXCLUSIVE")
+    try:
+        started = time.monotonic()
+        assert await cache.aget("quero marcar um horario") is None
+        await cache.aset("quero marcar um horario", ANALYSIS)
+        assert time.monotonic() - started < 2
+    finally:
+        holder.rollback()
+        holder.close()
+
+    # A gravação foi descartada no arquivo, mas a memória atende o próprio worker
+    assert await cache.aget("quero marcar um horario") == ANALYSIS
+    assert await IntentCache(path=path).aget("quero marcar um horario") is None
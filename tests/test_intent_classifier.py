@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.intent_classifier import IntentClassifier, normalize, parse_date
+
+# Quarta-feira, véspera da virada do ano
+NOW = datetime(2026, 12, 30, 9, 0)
+
+SERVICES = ["Corte", "Corte e Barba", "Manicure"]
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("Quero agendar corte amanhã às 15h", ("schedule", "Corte", "2026-12-31", "15:00")),
+    ("agendar corte e barba dia 05/01 às 10:30", ("schedule", "Corte e Barba", "2027-01-05", "10:30")),
+    ("marca um corte pra sexta", ("schedule", "Corte", "2027-01-01", None)),
+    ("agenda uma manicure hoje", ("schedule", "Manicure", "2026-12-30", None)),
+    ("quero agendar corte amanhã às 3 da tarde", ("schedule", "Corte", "2026-12-31", "15:00")),
+    ("quero manicure", ("schedule", "Manicure", None, None)),
+    ("quero cancelar meu agendamento", ("cancel", None, None, None)),
+    ("quanto custa o corte?", ("info", None, None, None)),
+    ("quais serviços posso agendar?", ("info", None, None, None)),
+    ("Oi, tudo bem?", ("other", None, None, None)),
+    # Substantivos não são pedido de agendamento
+    ("qual marca de shampoo vocês usam?", None),
+    ("meu agendamento está confirmado?", None),
+    ("qual o horário do meu agendamento?", None),
+    # "às 3" sem período: 3h ou 15h fica com a IA
+    ("quero agendar corte amanhã às 3", None),
+    ("quero remarcar meu corte", None),
+    ("", None),
+])
+def test_classify(message, expected):
+    result = IntentClassifier().classify(message, SERVICES, now=NOW)
+
+    if expected is None:
+        assert result is None
+        return
+
+    intent, service, date, time = expected
+    assert result == {
+        "intent": intent,
+        "service_mentioned": service,
+        "professional_mentioned": None,
+        "date_mentioned": date,
+        "time_mentioned": time,
+        "source": "rules"
+    }
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("amanha", "2026-12-31"),
+    ("depois de amanha", "2027-01-01"),
+    ("hoje", "2026-12-30"),
+    ("dia 31/12", "2026-12-31"),
+    ("dia 30/12", "2026-12-30"),
+    # Sem ano e já passou: próximo ano
+    ("dia 05/01", "2027-01-05"),
+    ("dia 29/12", "2027-12-29"),
+    ("dia 05/01/27", "2027-01-05"),
+    ("dia 05/01/2028", "2028-01-05"),
+    ("dia 31/02", None),
+    ("dia 29/02/2027", None),
+    ("dia 29/02/2028", "2028-02-29"),
+    ("sexta", "2027-01-01"),
+    ("segunda-feira", "2027-01-04"),
+    # Mesmo dia da semana de hoje: a próxima, não hoje
+    ("quarta", "2027-01-06"),
+    ("sem data", None),
+])
+def test_parse_date(text, expected):
+    assert parse_date(normalize(text), NOW) == expected
+
+
+def test_stats_count_hits_per_intent_and_misses():
+    classifier = IntentClassifier()
+    for message in ("quero cancelar", "oi", "meu agendamento está confirmado?"):
+        classifier.classify(message, SERVICES, now=NOW)
+
+    assert classifier.stats() == {
+        "total": 3,
+        "hits": {"cancel": 1, "other": 1},
+        "misses": 1,
+        "hit_rate": 2 / 3
+    }
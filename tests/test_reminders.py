@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from app.core.reminder_queue import ReminderQueue
+from app.db.models import Appointment, AppointmentStatus
+
+
+def _add_appointment(db, seed, scheduled_date):
+    appointment = Appointment(
+        client_id=seed["client_id"],
+        professional_id=seed["professional_id"],
+        service_id=seed["service_id"],
+        scheduled_date=scheduled_date,
+        scheduled_end=scheduled_date + timedelta(minutes=30),
+        service_price=35.0
+    )
+    db.add(appointment)
+    db.commit()
+    return appointment.id
+
+
+def test_pop_due_hands_off_from_24h_to_1h_window(db, seed):
+    now = datetime.now().replace(second=0, microsecond=0)
+    soon = _add_appointment(db, seed, now + timedelta(hours=2))
+    last_minute = _add_appointment(db, seed, now + timedelta(minutes=30))
+
+    queue = ReminderQueue()
+    queue.refill(db, now)
+
+    # Agendado em cima da hora: só o lembrete de 1h, o de 24h é descartado
+    assert queue.pop_due(now, limit=10) == {"24h": [soon], "1h": [last_minute]}
+    assert queue.pop_due(now + timedelta(minutes=59), limit=10) == {}
+    assert queue.pop_due(now + timedelta(minutes=61), limit=10) == {"1h": [soon]}
+    assert len(queue) == 0
+
+
+def test_pop_due_discards_stale_entries(db, seed):
+    now = datetime.now().replace(second=0, microsecond=0)
+    moved = _add_appointment(db, seed, now + timedelta(hours=2))
+    cancelled = _add_appointment(db, seed, now + timedelta(hours=3))
+
+    queue = ReminderQueue()
+    queue.refill(db, now)
+    assert queue.pop_due(now, limit=10) == {"24h": [moved, cancelled]}
+
+    queue.apply_changes([
+        (moved, now + timedelta(hours=5), AppointmentStatus.SCHEDULED, True, False),
+        (cancelled, now + timedelta(hours=3), AppointmentStatus.CANCELLED, True, False),
+    ])
+
+    # Os prazos de 1h antigos (em 1h e 2h) ficaram obsoletos no heap
+    assert queue.pop_due(now + timedelta(hours=2, minutes=1), limit=10) == {}
+    assert queue.pop_due(now + timedelta(hours=4, minutes=1), limit=10) == {"1h": [moved]}
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from app.core.appointment_service import AppointmentService
+from app.core.rollup_service import RollupService
+from app.db.models import AppointmentDailyRollup, AppointmentStatus, Service
+
+
+def _rollup_rows(db):
+    """Linhas do rollup com agendamentos; linhas zeradas não contam"""
+    rows = {}
+    for row in db.query(AppointmentDailyRollup).all():
+        if row.appointment_count == 0:
+            assert row.total_price == 0
+            continue
+        key = (row.date, row.professional_id, row.service_id, row.status)
+        rows[key] = (row.appointment_count, row.total_price)
+    return rows
+
+
+def _book(service, seed, scheduled_date):
+    return service.create_appointment(
+        client_id=seed["client_id"],
+        professional_id=seed["professional_id"],
+        service_id=seed["service_id"],
+        scheduled_date=scheduled_date
+    ).id
+
+
+def _change_price(db, seed, price):
+    db.query(Service).filter_by(id=seed["service_id"]).update({"price": price})
+    db.commit()
+
+
+def test_each_transition_moves_the_booked_price_between_statuses(db, seed, tomorrow_at_ten):
+    service = AppointmentService(db)
+    day = tomorrow_at_ten.date()
+    key = (day, seed["professional_id"], seed["service_id"])
+
+    cancelled = _book(service, seed, tomorrow_at_ten)
+    completed = _book(service, seed, tomorrow_at_ten + timedelta(hours=1))
+    no_show = _book(service, seed, tomorrow_at_ten + timedelta(hours=2))
+    assert _rollup_rows(db) == {(*key, AppointmentStatus.SCHEDULED): (3, 105.0)}
+
+    service.cancel_appointment(cancelled, "Imprevisto")
+    service.complete_appointment(completed)
+    service.mark_no_show(no_show)
+
+    assert _rollup_rows(db) == {
+        (*key, AppointmentStatus.CANCELLED): (1, 35.0),
+        (*key, AppointmentStatus.COMPLETED): (1, 35.0),
+        (*key, AppointmentStatus.NO_SHOW): (1, 35.0),
+    }
+
+
+def test_price_change_after_booking_does_not_skew_the_rollup(db, seed, tomorrow_at_ten):
+    service = AppointmentService(db)
+    day = tomorrow_at_ten.date()
+    key = (day, seed["professional_id"], seed["service_id"])
+
+    cancelled = _book(service, seed, tomorrow_at_ten)
+    completed = _book(service, seed, tomorrow_at_ten + timedelta(hours=1))
+
+    _change_price(db, seed, 50.0)
+    kept = _book(service, seed, tomorrow_at_ten + timedelta(hours=2))
+    service.cancel_appointment(cancelled, "Imprevisto")
+    service.complete_appointment(completed)
+
+    assert _rollup_rows(db) == {
+        (*key, AppointmentStatus.SCHEDULED): (1, 50.0),
+        (*key, AppointmentStatus.CANCELLED): (1, 35.0),
+        (*key, AppointmentStatus.COMPLETED): (1, 35.0),
+    }
+    assert service.get_appointment(kept).service_price == 50.0
+
+    # Rollup e estatística ao vivo somam os mesmos preços
+    live = service.get_daily_statistics(tomorrow_at_ten)
+    rolled_up = RollupService(db).get_statistics(day, day + timedelta(days=1))
+    assert live["revenue"] == rolled_up["revenue"] == 35.0
+    assert {k: v for k, v in live.items() if k != "date"} == rolled_up
+
+
+def test_incremental_rollup_matches_rebuild(db, seed, tomorrow_at_ten):
+    service = AppointmentService(db)
+
+    ids = [_book(service, seed, tomorrow_at_ten + timedelta(minutes=30 * i)) for i in range(6)]
+    _change_price(db, seed, 42.5)
+    ids += [_book(service, seed, tomorrow_at_ten + timedelta(days=1, minutes=30 * i)) for i in range(3)]
+    _change_price(db, seed, 20.0)
+
+    service.cancel_appointment(ids[0], "Imprevisto")
+    service.cancel_appointment(ids[6], "Imprevisto")
+    service.complete_appointment(ids[1])
+    service.complete_appointment(ids[7])
+    service.mark_no_show(ids[2])
+    service.mark_no_show(ids[8])
+
+    incremental = _rollup_rows(db)
+    RollupService(db).rebuild()
+
+    assert _rollup_rows(db) == incremental